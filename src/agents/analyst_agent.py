@@ -1,8 +1,9 @@
-from dotenv import load_dotenv
 from typing import List, Optional
 from pydantic import BaseModel, Field
 from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
+from src.tools.llm_cache import llm_cache
+from src.tools.telemetry import log_event
+from src.tools.llm_registry import get_llm
 import json
 
 # ───────────────────────────────────────────────────────────────
@@ -11,6 +12,8 @@ import json
 
 class AnalystDependencies(BaseModel):
     user_request: str
+    sql_query: Optional[str] = None  # The query that produced the data
+    data_profile: Optional[str] = None  # Compact statistical profile of the results (see result_profile)
 
 class AnalystResponse(BaseModel):
     insights: str = Field(description="A human-readable summary of the data.")
@@ -30,6 +33,10 @@ Your job is to:
 - Identify trends, patterns, or summaries based on their intent
 - Propose next steps if helpful
 
+When a data profile is provided, base your findings on its statistics (counts,
+ranges, quantiles, most common values, trends) and cite the numbers. Do not
+invent values that are not in the profile.
+
 Always return a JSON object in this format:
 {{
   "insights": "A short summary of what the user is asking about.",
@@ -38,18 +45,12 @@ Always return a JSON object in this format:
 }}
 
 User Request: {user_request}
-""")
-
-# ───────────────────────────────────────────────────────────────
-# LLM config
-# ───────────────────────────────────────────────────────────────
 
-load_dotenv()
+SQL Query: {sql_query}
 
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0,
-)
+Data Profile:
+{data_profile}
+""")
 
 # ───────────────────────────────────────────────────────────────
 # Output parser
@@ -68,19 +69,45 @@ def parse_analyst_response(ai_message) -> AnalystResponse:
 # Chain pipeline
 # ───────────────────────────────────────────────────────────────
 
-analyst_agent = prompt_template | llm | parse_analyst_response
+def analyst_agent():
+    return prompt_template | get_llm("analyst") | parse_analyst_response
 
 # ───────────────────────────────────────────────────────────────
 # Callable function (can be used with LangGraph or directly)
 # ───────────────────────────────────────────────────────────────
 
+def _analyst_inputs(deps: AnalystDependencies) -> dict:
+    return {
+        "user_request": deps.user_request,
+        "sql_query": deps.sql_query or "None",
+        "data_profile": deps.data_profile or "No query results available.",
+    }
+
 def analyze_request(deps: AnalystDependencies) -> AnalystResponse:
     """
     Provides user structured insights.
+    Identical requests over identical data profiles are served from the response cache.
+    """
+    inputs = _analyst_inputs(deps)
+    result = llm_cache.cached(
+        "analyst", inputs, get_llm("analyst"), AnalystResponse,
+        lambda: analyst_agent().invoke(inputs),
+    )
+
+    log_event("agent_output", agent="analyst", key_findings=len(result.key_findings))
+
+    return result
+
+async def aanalyze_request(deps: AnalystDependencies) -> AnalystResponse:
+    """
+    Async variant of analyze_request.
     """
-    result = analyst_agent.invoke({"user_request": deps.user_request})
+    inputs = _analyst_inputs(deps)
+    result = await llm_cache.acached(
+        "analyst", inputs, get_llm("analyst"), AnalystResponse,
+        lambda: analyst_agent().ainvoke(inputs),
+    )
 
-    print("\n[Analyst Agent Output]")
-    print(result)
+    log_event("agent_output", agent="analyst", key_findings=len(result.key_findings))
 
-    return result
\ No newline at end of file
+    return result
@@ -1,7 +1,23 @@
 import os
-import psycopg
-from typing import List, Optional
+import time
+import logging
+import threading
+from uuid import uuid4
+from typing import List, Optional, Iterator, AsyncIterator, Union, Literal
 from pydantic import BaseModel, Field
+from src.tools.db import get_read_connection, get_async_read_connection
+from src.tools.result_cache import result_cache
+from src.tools.columnar import ColumnarResult
+from src.tools.telemetry import timed, observe, log_event
+from src.tools.sql_validation import explain_on, aexplain_on, strip_statement
+from src.tools.pagination import (
+    RESULT_PAGE_SIZE, RESULT_PAGE_MAX_SIZE, PRIMARY_KEY_SQL, choose_sort_key, page_sql, describe_sql,
+    encode_cursor, decode_cursor, query_fingerprint, sort_key_cache,
+)
+from src.tools.guardrails import (
+    ExecutionBudget, AdmissionResult, default_budget, export_budget, is_modifying_query,
+    check_admission, apply_guardrails, aapply_guardrails,
+)
 
 # ───────────────────────────────────────────────────────────────
 # Define input/output schemas
@@ -9,44 +25,500 @@ from pydantic import BaseModel, Field
 
 class ExecutorDependencies(BaseModel):
     sql_query: str  # The SQL query to be executed
+    stream: bool = False  # Defer execution so rows can be streamed to the client
+    budget: Optional[ExecutionBudget] = None  # Defaults to the EXEC_* environment budget
+    columnar: bool = False  # Return results as a ColumnarResult instead of a list of dicts
+    export_format: Optional[Literal["csv", "binary"]] = None  # Admit only; rows are exported later with COPY
 
 class ExecutorResponse(BaseModel):
     success: bool = Field(description="Indicates if the query executed successfully.")
-    results: Optional[List[dict]] = Field(default=None, description="The query results as a list of dictionaries.")
+    results: Optional[Union[ColumnarResult, List[dict]]] = Field(
+        default=None, description="The query results as a list of dictionaries, or column-major when requested."
+    )
     error_message: Optional[str] = Field(default=None, description="Error message if execution fails.")
+    streamed: bool = Field(default=False, description="Rows are delivered through stream_query instead of results.")
+    truncated: bool = Field(default=False, description="Results were cut off at the budget's max_rows.")
+    admission: Optional[AdmissionResult] = Field(default=None, description="Planner-estimate admission check.")
+
+# Rows fetched per round-trip from a server-side cursor in streaming mode
+DEFAULT_FETCH_SIZE = int(os.getenv("DB_STREAM_FETCH_SIZE", "1000"))
+
+MODIFICATION_NOT_ALLOWED = "Query modification not allowed; send a single read-only statement."
 
 # ───────────────────────────────────────────────────────────────
 # Query Execution Logic (non-LLM)
 # ───────────────────────────────────────────────────────────────
 
-def run_query(query: str) -> ExecutorResponse:
+def _rejected(admission: AdmissionResult) -> ExecutorResponse:
+    return ExecutorResponse(success=False, error_message=admission.reason, admission=admission)
+
+def run_query(query: str, budget: Optional[ExecutionBudget] = None, columnar: bool = False) -> ExecutorResponse:
     """
     Executes a read-only PostgreSQL query and returns results.
+    The query runs in a READ ONLY transaction with a statement_timeout and
+    work_mem, is admitted only if its planner estimates fit the budget, and
+    is truncated at budget.max_rows. With `columnar` the rows are returned
+    as a ColumnarResult.
     """
-    DB_HOST = os.getenv("DB_HOST")
-    DB_PORT = os.getenv("DB_PORT")
-    DB_NAME = os.getenv("DB_NAME")
-    DB_USER = os.getenv("DB_USER")
-    DB_PASSWORD = os.getenv("DB_PASSWORD")
-
+    budget = budget or default_budget()
     try:
         # Disallow modifying queries
-        disallowed = ["insert", "update", "delete", "drop", "alter"]
-        if any(word in query.lower() for word in disallowed):
-            return ExecutorResponse(success=False, error_message="Query modification not allowed.")
+        if is_modifying_query(query):
+            return ExecutorResponse(success=False, error_message=MODIFICATION_NOT_ALLOWED)
 
-        with psycopg.connect(
-            host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
-        ) as conn:
-            with conn.cursor(row_factory=psycopg.rows.dict_row) as cur:
-                cur.execute(query)
-                rows = cur.fetchall()
+        with get_read_connection() as conn:
+            with conn.transaction(force_rollback=True):
+                apply_guardrails(conn, budget)
+                plan = explain_on(conn, query)
+                admission = check_admission(plan, budget)
+                if not admission.admitted:
+                    return _rejected(admission)
 
-        return ExecutorResponse(success=True, results=rows)
+                # Served from the result cache while the tables it reads are unchanged
+                with timed("db", operation="fetch") as span:
+                    rows, truncated = result_cache.fetch(conn, query, budget.max_rows, plan.relations, columnar)
+                    span["rows"] = len(rows)
+
+        return ExecutorResponse(success=True, results=rows, truncated=truncated, admission=admission)
 
     except Exception as e:
         return ExecutorResponse(success=False, error_message=str(e))
 
+async def arun_query(query: str, budget: Optional[ExecutionBudget] = None, columnar: bool = False) -> ExecutorResponse:
+    """
+    Async variant of run_query using the shared AsyncConnection pool.
+    """
+    budget = budget or default_budget()
+    try:
+        if is_modifying_query(query):
+            return ExecutorResponse(success=False, error_message=MODIFICATION_NOT_ALLOWED)
+
+        async with get_async_read_connection() as conn:
+            async with conn.transaction(force_rollback=True):
+                await aapply_guardrails(conn, budget)
+                plan = await aexplain_on(conn, query)
+                admission = check_admission(plan, budget)
+                if not admission.admitted:
+                    return _rejected(admission)
+
+                with timed("db", operation="fetch") as span:
+                    rows, truncated = await result_cache.afetch(conn, query, budget.max_rows, plan.relations, columnar)
+                    span["rows"] = len(rows)
+
+        return ExecutorResponse(success=True, results=rows, truncated=truncated, admission=admission)
+
+    except Exception as e:
+        return ExecutorResponse(success=False, error_message=str(e))
+
+# ───────────────────────────────────────────────────────────────
+# Streaming execution (server-side cursor, bounded memory)
+# ───────────────────────────────────────────────────────────────
+
+def _cursor_name() -> str:
+    return f"executor_{uuid4().hex}"
+
+def stream_query(query: str, fetch_size: Optional[int] = None, budget: Optional[ExecutionBudget] = None) -> Iterator[List[dict]]:
+    """
+    Executes a read-only query on a named server-side cursor and yields the
+    rows in batches of `fetch_size`, so only one batch is held in memory.
+    Runs under the same READ ONLY / statement_timeout / work_mem guardrails
+    as run_query; the row cap does not apply.
+    """
+    if is_modifying_query(query):
+        raise ValueError(MODIFICATION_NOT_ALLOWED)
+
+    budget = budget or default_budget()
+    size = fetch_size or DEFAULT_FETCH_SIZE
+    with get_read_connection() as conn:
+        with conn.transaction(force_rollback=True):
+            apply_guardrails(conn, budget)
+            with conn.cursor(name=_cursor_name()) as cur:
+                cur.itersize = size
+                cur.execute(strip_statement(query))
+                while True:
+                    rows = cur.fetchmany(size)
+                    if not rows:
+                        break
+                    yield rows
+
+async def astream_query(query: str, fetch_size: Optional[int] = None, budget: Optional[ExecutionBudget] = None) -> AsyncIterator[List[dict]]:
+    """
+    Async variant of stream_query.
+    """
+    if is_modifying_query(query):
+        raise ValueError(MODIFICATION_NOT_ALLOWED)
+
+    budget = budget or default_budget()
+    size = fetch_size or DEFAULT_FETCH_SIZE
+    async with get_async_read_connection() as conn:
+        async with conn.transaction(force_rollback=True):
+            await aapply_guardrails(conn, budget)
+            async with conn.cursor(name=_cursor_name()) as cur:
+                cur.itersize = size
+                await cur.execute(strip_statement(query))
+                while True:
+                    rows = await cur.fetchmany(size)
+                    if not rows:
+                        break
+                    yield rows
+
+def admit_query(query: str, budget: Optional[ExecutionBudget] = None) -> ExecutorResponse:
+    """
+    Runs only the admission checks (keyword screen, EXPLAIN against the
+    budget) without fetching rows. Used before streaming or exporting.
+    """
+    budget = budget or default_budget()
+    if is_modifying_query(query):
+        return ExecutorResponse(success=False, error_message=MODIFICATION_NOT_ALLOWED)
+    try:
+        with get_read_connection() as conn:
+            with conn.transaction(force_rollback=True):
+                apply_guardrails(conn, budget)
+                admission = check_admission(explain_on(conn, query), budget)
+    except Exception as e:
+        return ExecutorResponse(success=False, error_message=str(e))
+    if not admission.admitted:
+        return _rejected(admission)
+    return ExecutorResponse(success=True, streamed=True, admission=admission)
+
+async def aadmit_query(query: str, budget: Optional[ExecutionBudget] = None) -> ExecutorResponse:
+    """
+    Async variant of admit_query.
+    """
+    budget = budget or default_budget()
+    if is_modifying_query(query):
+        return ExecutorResponse(success=False, error_message=MODIFICATION_NOT_ALLOWED)
+    try:
+        async with get_async_read_connection() as conn:
+            async with conn.transaction(force_rollback=True):
+                await aapply_guardrails(conn, budget)
+                admission = check_admission(await aexplain_on(conn, query), budget)
+    except Exception as e:
+        return ExecutorResponse(success=False, error_message=str(e))
+    if not admission.admitted:
+        return _rejected(admission)
+    return ExecutorResponse(success=True, streamed=True, admission=admission)
+
+# ───────────────────────────────────────────────────────────────
+# Bulk export (COPY ... TO STDOUT, no Python row objects)
+# ───────────────────────────────────────────────────────────────
+
+# Bytes per chunk written to the file or HTTP response
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", str(1024 * 1024)))
+
+ExportFormat = Literal["csv", "binary"]
+
+class ExportStats(BaseModel):
+    format: str
+    rows: Optional[int] = None  # From the COPY command tag, known once the export finishes
+    bytes: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    bytes_per_second: float = 0.0
+    rows_per_second: Optional[float] = None
+
+    def finish(self, started: float, rowcount: int) -> None:
+        self.seconds = time.perf_counter() - started
+        self.rows = rowcount if rowcount >= 0 else None
+        if self.seconds > 0:
+            self.bytes_per_second = self.bytes / self.seconds
+            if self.rows is not None:
+                self.rows_per_second = self.rows / self.seconds
+
+class ExportTotals:
+    """Process-wide export counters reported by the API."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.exports = 0
+        self.failures = 0
+        self.rows = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def record(self, stats: ExportStats, failed: bool = False) -> None:
+        observe("db", stats.seconds, stats.rows, operation="export")
+        log_event("export", logging.WARNING if failed else logging.INFO, failed=failed, **stats.model_dump())
+        with self._lock:
+            self.exports += 1
+            self.failures += int(failed)
+            self.rows += stats.rows or 0
+            self.bytes += stats.bytes
+            self.seconds += stats.seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "exports": self.exports,
+                "failures": self.failures,
+                "rows": self.rows,
+                "bytes": self.bytes,
+                "bytes_per_second": self.bytes / self.seconds if self.seconds else 0.0,
+            }
+
+export_totals = ExportTotals()
+
+def copy_sql(query: str, fmt: ExportFormat = "csv") -> str:
+    options = "FORMAT csv, HEADER true" if fmt == "csv" else "FORMAT binary"
+    return f"COPY ({strip_statement(query)}) TO STDOUT ({options})"
+
+def _check_export(query: str, fmt: str) -> None:
+    if fmt not in ("csv", "binary"):
+        raise ValueError(f"Unsupported export format: {fmt}")
+    # Screen the user query before it is wrapped in COPY
+    if is_modifying_query(query):
+        raise ValueError(MODIFICATION_NOT_ALLOWED)
+
+def _admit_export(plan, budget: ExecutionBudget) -> None:
+    admission = check_admission(plan, budget)
+    if not admission.admitted:
+        raise ValueError(admission.reason)
+
+def iter_export(
+    query: str,
+    fmt: ExportFormat = "csv",
+    chunk_size: Optional[int] = None,
+    budget: Optional[ExecutionBudget] = None,
+    stats: Optional[ExportStats] = None,
+) -> Iterator[bytes]:
+    """
+    Streams the query's rows as COPY output (CSV with a header, or
+    PostgreSQL binary) in chunks of `chunk_size` bytes; the last chunk may
+    be shorter. Postgres formats the rows, so no Python row objects are
+    created. Runs under the export budget's guardrails and admission
+    check. Pass `stats` to receive bytes/rows/throughput when done.
+    """
+    _check_export(query, fmt)
+    budget = budget or export_budget()
+    size = chunk_size or EXPORT_CHUNK_SIZE
+    stats = stats if stats is not None else ExportStats(format=fmt)
+    started = time.perf_counter()
+    buffer = bytearray()
+
+    with get_read_connection() as conn:
+        with conn.transaction(force_rollback=True):
+            apply_guardrails(conn, budget)
+            _admit_export(explain_on(conn, query), budget)
+            with conn.cursor() as cur:
+                with cur.copy(copy_sql(query, fmt)) as copy:
+                    # libpq hands COPY data over roughly a row at a time; re-chunk it
+                    for data in copy:
+                        buffer += data
+                        while len(buffer) >= size:
+                            chunk = bytes(buffer[:size])
+                            del buffer[:size]
+                            stats.bytes += len(chunk)
+                            stats.chunks += 1
+                            yield chunk
+                if buffer:
+                    stats.bytes += len(buffer)
+                    stats.chunks += 1
+                    yield bytes(buffer)
+                stats.finish(started, cur.rowcount)
+
+async def aiter_export(
+    query: str,
+    fmt: ExportFormat = "csv",
+    chunk_size: Optional[int] = None,
+    budget: Optional[ExecutionBudget] = None,
+    stats: Optional[ExportStats] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Async variant of iter_export.
+    """
+    _check_export(query, fmt)
+    budget = budget or export_budget()
+    size = chunk_size or EXPORT_CHUNK_SIZE
+    stats = stats if stats is not None else ExportStats(format=fmt)
+    started = time.perf_counter()
+    buffer = bytearray()
+
+    async with get_async_read_connection() as conn:
+        async with conn.transaction(force_rollback=True):
+            await aapply_guardrails(conn, budget)
+            _admit_export(await aexplain_on(conn, query), budget)
+            async with conn.cursor() as cur:
+                async with cur.copy(copy_sql(query, fmt)) as copy:
+                    async for data in copy:
+                        buffer += data
+                        while len(buffer) >= size:
+                            chunk = bytes(buffer[:size])
+                            del buffer[:size]
+                            stats.bytes += len(chunk)
+                            stats.chunks += 1
+                            yield chunk
+                if buffer:
+                    stats.bytes += len(buffer)
+                    stats.chunks += 1
+                    yield bytes(buffer)
+                stats.finish(started, cur.rowcount)
+
+def export_to_file(
+    query: str,
+    path: str,
+    fmt: ExportFormat = "csv",
+    chunk_size: Optional[int] = None,
+    budget: Optional[ExecutionBudget] = None,
+) -> ExportStats:
+    """
+    Writes the query's COPY output to `path` chunk by chunk and returns the
+    export statistics. A partially written file is removed on failure.
+    """
+    stats = ExportStats(format=fmt)
+    try:
+        with open(path, "wb") as f:
+            for chunk in iter_export(query, fmt, chunk_size, budget, stats):
+                f.write(chunk)
+    except Exception:
+        export_totals.record(stats, failed=True)
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    export_totals.record(stats)
+    return stats
+
+# ───────────────────────────────────────────────────────────────
+# Keyset pagination (pages served without the agents)
+# ───────────────────────────────────────────────────────────────
+
+class ResultPage(BaseModel):
+    success: bool
+    rows: List[dict] = Field(default_factory=list)
+    sort_key: List[str] = Field(default_factory=list, description="Columns the pages are ordered and seeked on.")
+    next_cursor: Optional[str] = Field(default=None, description="Pass back to get the following page; None on the last page.")
+    error_message: Optional[str] = None
+    admission: Optional[AdmissionResult] = None
+
+def _primary_key(rows: List[dict]) -> List[str]:
+    return [row["attname"] for row in rows]
+
+def sort_key_for(query: str, budget: Optional[ExecutionBudget] = None) -> List[str]:
+    """
+    Chooses a stable keyset for paging through `query`'s result (see
+    choose_sort_key), remembered per query in sort_key_cache. Raises
+    ValueError if the query cannot be paginated.
+    """
+    if is_modifying_query(query):
+        raise ValueError(MODIFICATION_NOT_ALLOWED)
+    cached = sort_key_cache.get(query_fingerprint(query))
+    if cached is not None:
+        return list(cached)
+    with get_read_connection() as conn:
+        with conn.transaction(force_rollback=True):
+            apply_guardrails(conn, budget or default_budget())
+            plan = explain_on(conn, query)
+            if not plan.ok:
+                raise ValueError(plan.error)
+            columns = [(c.name, c.type_code) for c in conn.execute(describe_sql(query)).description]
+            primary_key = _primary_key(conn.execute(PRIMARY_KEY_SQL, (plan.relations[0],)).fetchall()) if len(plan.relations) == 1 else []
+    sort_key = choose_sort_key(columns, primary_key)
+    sort_key_cache.set(query_fingerprint(query), sort_key)
+    return list(sort_key)
+
+async def asort_key_for(query: str, budget: Optional[ExecutionBudget] = None) -> List[str]:
+    """
+    Async variant of sort_key_for.
+    """
+    if is_modifying_query(query):
+        raise ValueError(MODIFICATION_NOT_ALLOWED)
+    cached = sort_key_cache.get(query_fingerprint(query))
+    if cached is not None:
+        return list(cached)
+    async with get_async_read_connection() as conn:
+        async with conn.transaction(force_rollback=True):
+            await aapply_guardrails(conn, budget or default_budget())
+            plan = await aexplain_on(conn, query)
+            if not plan.ok:
+                raise ValueError(plan.error)
+            columns = [(c.name, c.type_code) for c in (await conn.execute(describe_sql(query))).description]
+            primary_key = []
+            if len(plan.relations) == 1:
+                cur = await conn.execute(PRIMARY_KEY_SQL, (plan.relations[0],))
+                primary_key = _primary_key(await cur.fetchall())
+    sort_key = choose_sort_key(columns, primary_key)
+    sort_key_cache.set(query_fingerprint(query), sort_key)
+    return list(sort_key)
+
+def _page(query: str, sort_key: List[str], rows: List[dict], limit: int, admission: AdmissionResult) -> ResultPage:
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return ResultPage(
+        success=True,
+        rows=rows,
+        sort_key=sort_key,
+        next_cursor=encode_cursor(query, sort_key, rows[-1]) if more else None,
+        admission=admission,
+    )
+
+def fetch_page(
+    query: str,
+    sort_key: List[str],
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    budget: Optional[ExecutionBudget] = None,
+) -> ResultPage:
+    """
+    Returns up to `limit` rows of `query` following `cursor`, using a keyset
+    (seek) predicate on `sort_key` rather than OFFSET, under the usual READ
+    ONLY / statement_timeout guardrails and admission check.
+    """
+    budget = budget or default_budget()
+    limit = min(limit or RESULT_PAGE_SIZE, RESULT_PAGE_MAX_SIZE)
+    try:
+        if is_modifying_query(query):
+            return ResultPage(success=False, error_message=MODIFICATION_NOT_ALLOWED)
+        after = decode_cursor(cursor, query, sort_key) if cursor else None
+        statement, params = page_sql(query, sort_key, after, limit)
+
+        with get_read_connection() as conn:
+            with conn.transaction(force_rollback=True):
+                apply_guardrails(conn, budget)
+                admission = check_admission(explain_on(conn, query), budget)
+                if not admission.admitted:
+                    return ResultPage(success=False, error_message=admission.reason, admission=admission)
+                with timed("db", operation="page") as span:
+                    rows = conn.execute(statement, params).fetchall()
+                    span["rows"] = len(rows)
+
+        return _page(query, sort_key, rows, limit, admission)
+
+    except Exception as e:
+        return ResultPage(success=False, sort_key=sort_key, error_message=str(e))
+
+async def afetch_page(
+    query: str,
+    sort_key: List[str],
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    budget: Optional[ExecutionBudget] = None,
+) -> ResultPage:
+    """
+    Async variant of fetch_page.
+    """
+    budget = budget or default_budget()
+    limit = min(limit or RESULT_PAGE_SIZE, RESULT_PAGE_MAX_SIZE)
+    try:
+        if is_modifying_query(query):
+            return ResultPage(success=False, error_message=MODIFICATION_NOT_ALLOWED)
+        after = decode_cursor(cursor, query, sort_key) if cursor else None
+        statement, params = page_sql(query, sort_key, after, limit)
+
+        async with get_async_read_connection() as conn:
+            async with conn.transaction(force_rollback=True):
+                await aapply_guardrails(conn, budget)
+                admission = check_admission(await aexplain_on(conn, query), budget)
+                if not admission.admitted:
+                    return ResultPage(success=False, error_message=admission.reason, admission=admission)
+                with timed("db", operation="page") as span:
+                    cur = await conn.execute(statement, params)
+                    rows = await cur.fetchall()
+                    span["rows"] = len(rows)
+
+        return _page(query, sort_key, rows, limit, admission)
+
+    except Exception as e:
+        return ResultPage(success=False, sort_key=sort_key, error_message=str(e))
+
 # ───────────────────────────────────────────────────────────────
 # Callable function for LangGraph
 # ───────────────────────────────────────────────────────────────
@@ -54,5 +526,21 @@ def run_query(query: str) -> ExecutorResponse:
 def execute_query(deps: ExecutorDependencies) -> ExecutorResponse:
     """
     LangChain-compatible function for executing SQL queries safely.
+    In streaming and export mode the query is only admitted here; rows are
+    fetched later by stream_query / iter_export while the response is sent.
+    """
+    if deps.export_format:
+        return admit_query(deps.sql_query, deps.budget or export_budget())
+    if deps.stream:
+        return admit_query(deps.sql_query, deps.budget)
+    return run_query(deps.sql_query, deps.budget, deps.columnar)
+
+async def aexecute_query(deps: ExecutorDependencies) -> ExecutorResponse:
+    """
+    Async variant of execute_query.
     """
-    return run_query(deps.sql_query)
+    if deps.export_format:
+        return await aadmit_query(deps.sql_query, deps.budget or export_budget())
+    if deps.stream:
+        return await aadmit_query(deps.sql_query, deps.budget)
+    return await arun_query(deps.sql_query, deps.budget, deps.columnar)
@@ -0,0 +1,126 @@
+import os
+import re
+from typing import Optional, Dict, List, Any
+from pydantic import BaseModel, Field
+
+from src.tools.schema_selector import SchemaIndex, tokenize
+
+# ───────────────────────────────────────────────────────────────
+# Settings
+# ───────────────────────────────────────────────────────────────
+
+FAST_ROUTER_ENABLED = os.getenv("FAST_ROUTER_ENABLED", "true").lower() in ("1", "true", "yes")
+# Below this confidence the orchestrator LLM decides instead
+FAST_ROUTER_MIN_CONFIDENCE = float(os.getenv("FAST_ROUTER_MIN_CONFIDENCE", "0.6"))
+
+# ───────────────────────────────────────────────────────────────
+# Output schema
+# ───────────────────────────────────────────────────────────────
+
+class RouteDecision(BaseModel):
+    decision: str = Field(description="Same labels as OrchestratorResponse.decision.")
+    confidence: float
+    source: str = Field(description="'transition' for state-based rules, 'classifier' for first-hop intent.")
+
+# ───────────────────────────────────────────────────────────────
+# Deterministic state transitions (hops after a worker node)
+# ───────────────────────────────────────────────────────────────
+
+def route_transition(state: Dict[str, Any]) -> Optional[RouteDecision]:
+    """
+    Decides the next hop from what the previous worker node produced this
+    turn. Failures (rejected query, execution error) return None so the
+    orchestrator LLM can decide how to recover.
+    """
+    last_node = state.get("last_node")
+
+    if last_node == "postgresql_writer" and state.get("sql_query"):
+        return RouteDecision(decision="postgresql_checker", confidence=1.0, source="transition")
+
+    if last_node == "postgresql_checker" and state.get("validated"):
+        return RouteDecision(decision="executor", confidence=1.0, source="transition")
+
+    if last_node == "executor" and (state.get("executor_response") or {}).get("success"):
+        # Hand the results to the analyst only when the request asked for interpretation
+        wants_analysis = score_intents(state["user_input"])["analyst"] > 0
+        next_step = "analyst" if wants_analysis else "complete"
+        return RouteDecision(decision=next_step, confidence=1.0, source="transition")
+
+    if last_node == "analyst" and state.get("analysis"):
+        return RouteDecision(decision="complete", confidence=1.0, source="transition")
+
+    return None
+
+# ───────────────────────────────────────────────────────────────
+# Lightweight intent classifier (first hop of a turn)
+# ───────────────────────────────────────────────────────────────
+
+_INTENT_PATTERNS: Dict[str, List[str]] = {
+    "postgresql_writer": [
+        r"\bhow (many|much)\b", r"\bcount\b", r"\blist\b", r"\bshow( me)?\b", r"\btop \d+\b",
+        r"\btotal\b", r"\bsum\b", r"\baverage\b", r"\bavg\b", r"\bper (day|week|month|quarter|year)\b",
+        r"\bby (day|week|month|quarter|year|region|country|category|customer|product)\b",
+        r"\bselect\b", r"\bsql\b", r"\bquery\b", r"\bfind\b", r"\bwhich\b", r"\bwhat (is|are|was|were) the\b",
+    ],
+    "analyst": [
+        r"\bwhy\b", r"\bexplain\b", r"\binsights?\b", r"\btrends?\b", r"\banaly[sz]", r"\bsummari[sz]e\b",
+        r"\bcompare\b", r"\bpatterns?\b", r"\brecommend", r"\bwhat does (this|that|it) mean\b",
+    ],
+    "complete": [
+        r"^\s*(thanks|thank you|thx|cheers|bye|goodbye|that'?s all|that is all|no thanks|done)\b",
+    ],
+}
+
+_COMPILED = {label: [re.compile(p, re.IGNORECASE) for p in patterns] for label, patterns in _INTENT_PATTERNS.items()}
+
+# Score added to the data-question intent when the request names known tables/columns
+SCHEMA_MATCH_WEIGHT = 1.0
+
+def score_intents(user_input: str, schema_index: Optional[SchemaIndex] = None, in_analyst_mode: bool = False) -> Dict[str, float]:
+    scores = {label: float(sum(1 for p in patterns if p.search(user_input))) for label, patterns in _COMPILED.items()}
+
+    # Mentioning known tables/columns is strong evidence of a data question
+    if schema_index is not None and schema_index.score(tokenize(user_input)):
+        scores["postgresql_writer"] += SCHEMA_MATCH_WEIGHT
+
+    # Mirror the orchestrator prompt: stay with the analyst unless the topic changes
+    if in_analyst_mode:
+        scores["analyst"] += 1.0
+
+    return scores
+
+def classify_intent(user_input: str, schema_index: Optional[SchemaIndex] = None, in_analyst_mode: bool = False) -> Optional[RouteDecision]:
+    """
+    Scores the request against each intent; confidence is the winner's
+    margin over the runner-up relative to its own score.
+    """
+    scores = score_intents(user_input, schema_index, in_analyst_mode)
+    ranked = sorted(scores.items(), key=lambda item: -item[1])
+    (label, top), (_, second) = ranked[0], ranked[1]
+    if top < 1.0:
+        return None
+    return RouteDecision(decision=label, confidence=(top - second) / top, source="classifier")
+
+# ───────────────────────────────────────────────────────────────
+# Entry point used by the orchestrator node
+# ───────────────────────────────────────────────────────────────
+
+def is_first_hop(state: Dict[str, Any]) -> bool:
+    return not state.get("last_node")
+
+def fast_route(state: Dict[str, Any], schema_index: Optional[SchemaIndex] = None) -> Optional[RouteDecision]:
+    """
+    Returns a local routing decision, or None when the orchestrator LLM
+    should be consulted (disabled, no rule applies, or low confidence).
+    """
+    if not FAST_ROUTER_ENABLED:
+        return None
+
+    if is_first_hop(state):
+        decision = classify_intent(state["user_input"], schema_index, bool(state.get("in_analyst_mode")))
+    else:
+        decision = route_transition(state)
+
+    if decision is None or decision.confidence < FAST_ROUTER_MIN_CONFIDENCE:
+        return None
+    return decision
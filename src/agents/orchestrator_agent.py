@@ -1,9 +1,11 @@
 import json
-from dotenv import load_dotenv
+import logging
 from typing import Optional, List, Dict
 from pydantic import BaseModel, Field
 from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
+from src.tools.telemetry import log_event
+from src.tools.llm_registry import get_llm
+from src.tools.history import prompt_history
 
 # ───────────────────────────────────────────────────────────────
 # Define input and output schemas
@@ -51,52 +53,36 @@ Always return a structured JSON object in this format:
 }}
 """)
 
-# ───────────────────────────────────────────────────────────────
-# Initialize the LLM
-# ───────────────────────────────────────────────────────────────
-
-load_dotenv()
-
-llm = ChatOpenAI(
-    model="gpt-4o-mini", 
-    temperature=0,
-)
-
 # ───────────────────────────────────────────────────────────────
 # Create runnable pipeline
 # ───────────────────────────────────────────────────────────────
 
-orchestrator_agent = (
-    prompt_template
-    | llm
-    | (lambda x: OrchestratorResponse.model_validate_json(x.content))
-)
+def orchestrator_agent():
+    return (
+        prompt_template
+        | get_llm("orchestrator")
+        | (lambda x: OrchestratorResponse.model_validate_json(x.content))
+    )
 
 # ───────────────────────────────────────────────────────────────
 # Callable function to invoke the orchestrator
 # ───────────────────────────────────────────────────────────────
 
-def route_request(user_input: str, message_history: Optional[List[Dict[str, str]]] = None) -> OrchestratorResponse:
-    """
-    Analyzes the user's request and routes it to the appropriate agent.
-    """
+def _build_messages(user_input: str, message_history: Optional[List[Dict[str, str]]], summary: Optional[str] = None) -> List[Dict[str, str]]:
+    history = prompt_history(message_history or [], summary)
 
-    if message_history is None:
-        message_history = []
-
-    # Add the latest user input to the message history
-    updated_history = message_history + [{"role": "user", "content": user_input}]
+    # The current turn's user entry is sent last as `user_input` (which may carry mode hints)
+    for i in range(len(history) - 1, -1, -1):
+        if history[i]["role"] == "user":
+            if all(m["role"] == "system" for m in history[i + 1:]):
+                del history[i]
+            break
 
     # Prepend the system prompt (should always come first)
-    messages = [{"role": "system", "content": prompt_template.format(input=user_input)}] + updated_history
+    return [{"role": "system", "content": prompt_template.format(input=user_input)}] + history + [{"role": "user", "content": user_input}]
 
-    # Use LangChain ChatOpenAI directly with messages
-    response = llm.invoke(messages)
-
-    print("[Raw LLM Output]")
-    print(repr(response))
-    print("[Raw content]")
-    print(repr(response.content))
+def _parse_response(response) -> OrchestratorResponse:
+    log_event("llm_output", logging.DEBUG, agent="orchestrator", content=response.content)
 
     try:
         # Try parsing
@@ -104,6 +90,29 @@ def route_request(user_input: str, message_history: Optional[List[Dict[str, str]
         return OrchestratorResponse.model_validate(parsed_dict)
 
     except Exception as e:
-        print("[Orchestrator JSON Parse Error]", e)
+        log_event("llm_parse_error", logging.WARNING, agent="orchestrator", error=str(e), content=response.content[:500])
         raise ValueError("Orchestrator response is not valid JSON.")
 
+def route_request(
+    user_input: str, message_history: Optional[List[Dict[str, str]]] = None, summary: Optional[str] = None
+) -> OrchestratorResponse:
+    """
+    Analyzes the user's request and routes it to the appropriate agent.
+    `summary` is the rolling summary of turns no longer kept verbatim.
+    """
+    messages = _build_messages(user_input, message_history, summary)
+
+    # Use LangChain ChatOpenAI directly with messages
+    response = get_llm("orchestrator").invoke(messages)
+
+    return _parse_response(response)
+
+async def aroute_request(
+    user_input: str, message_history: Optional[List[Dict[str, str]]] = None, summary: Optional[str] = None
+) -> OrchestratorResponse:
+    """
+    Async variant of route_request.
+    """
+    messages = _build_messages(user_input, message_history, summary)
+    response = await get_llm("orchestrator").ainvoke(messages)
+    return _parse_response(response)
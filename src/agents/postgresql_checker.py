@@ -1,8 +1,9 @@
-from dotenv import load_dotenv
 from typing import Optional
 from pydantic import BaseModel, Field
 from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
+from src.tools.llm_cache import llm_cache
+from src.tools.llm_registry import get_llm
+from src.tools.sql_validation import PlanCheck, explain_query, aexplain_query
 
 # ───────────────────────────────────────────────────────────────
 # Define input dependencies and output schema
@@ -12,12 +13,15 @@ class PostgreSQLCheckerDependencies(BaseModel):
     user_request: str  # The original user request
     sql_query: str  # The generated SQL query
     database_schema: str  # The database schema for validation
+    schema_version: Optional[str] = None  # Snapshot version, part of the response cache key
+    pre_validate: bool = True  # Run EXPLAIN on the database before asking the LLM
 
 class PostgreSQLCheckerResponse(BaseModel):
     is_valid: bool = Field(description="Whether the query correctly fulfills the user request.")
     reason: str = Field(description="Explanation of why the query is valid or invalid.")
     suggested_fix: Optional[str] = Field(default=None, description="A suggested fix if the query is invalid.")
     expected_output: Optional[str] = Field(default=None, description="An example of what the query output should look like.")
+    plan: Optional[PlanCheck] = Field(default=None, description="Result of the database EXPLAIN pre-validation.")
 
 # ───────────────────────────────────────────────────────────────
 # System prompt template
@@ -31,47 +35,66 @@ Your task is to:
 - Use the provided database schema to verify that the query will run correctly.
 - Explain why the query is valid or invalid.
 - If the query is invalid, suggest an improved version.
-- Attempt to generate an expected sample output based on the schema.
 
 Always return a structured JSON object in this format:
 {{
     "is_valid": true or false,
     "reason": "Explanation of why the query is valid/invalid.",
-    "suggested_fix": "If invalid, a corrected version of the SQL query.",
-    "expected_output": "A JSON representation of what the query output might look like."
+    "suggested_fix": "If invalid, a corrected version of the SQL query."
 }}
 
 Rules:
 - Ensure the query fully satisfies the intent of the user request.
 - Ensure the SQL syntax follows PostgreSQL standards.
 - If the query is invalid, provide a corrected version.
-- The expected output should be an accurate guess of the query results.
+- When the plan check says PostgreSQL accepted the query, syntax and names are already correct; focus on whether it answers the request.
 
 User Request: {user_request}
 SQL Query: {sql_query}
 Database Schema: {database_schema}
+Plan Check: {plan_check}
 """)
 
 # ───────────────────────────────────────────────────────────────
-# Initialize the LLM
+# Create the runnable pipeline
 # ───────────────────────────────────────────────────────────────
 
-load_dotenv()
-
-llm = ChatOpenAI(
-    model="gpt-4o-mini", 
-    temperature=0
-)
+def postgresql_checker_agent():
+    return (
+        prompt_template
+        | get_llm("postgresql_checker")
+        | (lambda x: PostgreSQLCheckerResponse.model_validate_json(x.content))
+    )
 
 # ───────────────────────────────────────────────────────────────
-# Create the runnable pipeline
+# Database pre-validation helpers
 # ───────────────────────────────────────────────────────────────
 
-postgresql_checker_agent = (
-    prompt_template 
-    | llm 
-    | (lambda x: PostgreSQLCheckerResponse.model_validate_json(x))
-)
+def _plan_context(plan: Optional[PlanCheck]) -> str:
+    # Only stable facts go into the prompt so planner estimates don't defeat the response cache
+    if plan is None:
+        return "Not run."
+    return f"PostgreSQL parsed and planned the query successfully. Tables read: {', '.join(plan.relations) or 'none'}."
+
+def _rejected_by_database(plan: PlanCheck) -> PostgreSQLCheckerResponse:
+    return PostgreSQLCheckerResponse(
+        is_valid=False,
+        reason=f"PostgreSQL rejected the query: {plan.error}",
+        plan=plan,
+    )
+
+def _with_plan(result: PostgreSQLCheckerResponse, plan: Optional[PlanCheck]) -> PostgreSQLCheckerResponse:
+    if plan is None:
+        return result
+    return result.model_copy(update={"plan": plan, "expected_output": f"Planner estimate: {plan.summary()}"})
+
+def _checker_inputs(deps: PostgreSQLCheckerDependencies, plan: Optional[PlanCheck]) -> dict:
+    return {
+        "user_request": deps.user_request,
+        "sql_query": deps.sql_query,
+        "database_schema": deps.database_schema,
+        "plan_check": _plan_context(plan)
+    }
 
 # ───────────────────────────────────────────────────────────────
 # Callable function (e.g. for LangGraph integration)
@@ -80,9 +103,34 @@ postgresql_checker_agent = (
 def validate_query(deps: PostgreSQLCheckerDependencies) -> PostgreSQLCheckerResponse:
     """
     Validates the SQL query against the user's request and schema using LangChain.
+    The query is first planned by PostgreSQL (EXPLAIN); if the database
+    rejects it, the real error is returned without calling the LLM.
+    Identical checks against the same schema are served from the response cache.
     """
-    return postgresql_checker_agent.invoke({
-        "user_request": deps.user_request,
-        "sql_query": deps.sql_query,
-        "database_schema": deps.database_schema
-    })
+    plan = explain_query(deps.sql_query) if deps.pre_validate else None
+    if plan is not None and not plan.ok:
+        return _rejected_by_database(plan)
+
+    inputs = _checker_inputs(deps, plan)
+    result = llm_cache.cached(
+        "postgresql_checker", inputs, get_llm("postgresql_checker"), PostgreSQLCheckerResponse,
+        lambda: postgresql_checker_agent().invoke(inputs),
+        schema_version=deps.schema_version,
+    )
+    return _with_plan(result, plan)
+
+async def avalidate_query(deps: PostgreSQLCheckerDependencies) -> PostgreSQLCheckerResponse:
+    """
+    Async variant of validate_query.
+    """
+    plan = await aexplain_query(deps.sql_query) if deps.pre_validate else None
+    if plan is not None and not plan.ok:
+        return _rejected_by_database(plan)
+
+    inputs = _checker_inputs(deps, plan)
+    result = await llm_cache.acached(
+        "postgresql_checker", inputs, get_llm("postgresql_checker"), PostgreSQLCheckerResponse,
+        lambda: postgresql_checker_agent().ainvoke(inputs),
+        schema_version=deps.schema_version,
+    )
+    return _with_plan(result, plan)
@@ -1,7 +1,33 @@
-from dotenv import load_dotenv
+import os
+import asyncio
+import logging
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor
 from pydantic import BaseModel, Field
 from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
+from typing import Optional, List, Tuple
+from src.tools.llm_cache import llm_cache
+from src.tools.llm_registry import get_llm
+from src.tools.telemetry import log_event
+from src.tools.sql_validation import PlanCheck, explain_query, aexplain_query
+from src.tools.guardrails import default_budget, check_admission
+from src.tools.result_cache import fingerprint
+
+# ───────────────────────────────────────────────────────────────
+# Settings
+# ───────────────────────────────────────────────────────────────
+
+# Candidate queries generated per writer call; retries after a rejection fan out wider
+WRITER_CANDIDATES = int(os.getenv("WRITER_CANDIDATES", "1"))
+WRITER_RETRY_CANDIDATES = int(os.getenv("WRITER_RETRY_CANDIDATES", "3"))
+
+# Extra instructions that make the parallel candidates differ at temperature 0;
+# candidate 0 uses the plain prompt (and shares its cache entry with single-candidate mode)
+CANDIDATE_APPROACHES = [
+    "Prefer filtering and aggregating as early as possible, and avoid joins the request does not need.",
+    "Prefer plain joins over correlated subqueries, and select only the columns the request needs.",
+    "Prefer common table expressions that make each step explicit.",
+]
 
 # ───────────────────────────────────────────────────────────────
 # Define input and output schemas
@@ -10,10 +36,16 @@ from langchain_openai import ChatOpenAI
 class PostgreSQLWriterDependencies(BaseModel):
     user_request: str
     database_schema: str  # The schema of the database to generate accurate queries
+    schema_version: Optional[str] = None  # Snapshot version, part of the response cache key
+    previous_query: Optional[str] = None  # A rejected attempt to fix, if any
+    previous_error: Optional[str] = None  # Why it was rejected (PostgreSQL error or cost budget)
+    candidates: int = 1  # >1 generates that many candidates concurrently and keeps the cheapest valid one
 
 class PostgreSQLWriterResponse(BaseModel):
     sql_query: str = Field(description="The SQL query generated based on user request.")
     explanation: str = Field(description="A brief explanation of what the query does.")
+    estimated_cost: Optional[float] = Field(default=None, description="Planner cost of the chosen candidate (multi-candidate mode).")
+    candidates_considered: int = Field(default=1, description="Distinct candidate queries compared.")
 
 # ───────────────────────────────────────────────────────────────
 # Prompt Template
@@ -41,38 +73,155 @@ Rules:
 
 User Request: {user_request}
 Database Schema: {database_schema}
+{feedback}
 """)
 
-# ───────────────────────────────────────────────────────────────
-# Initialize LLM
-# ───────────────────────────────────────────────────────────────
-
-load_dotenv()
-
-llm = ChatOpenAI(
-    model="gpt-4o-mini", 
-    temperature=0
-)
-
 # ───────────────────────────────────────────────────────────────
 # Create Runnable Agent
 # ───────────────────────────────────────────────────────────────
 
-postgresql_writer_agent = (
-    prompt_template
-    | llm
-    | (lambda x: PostgreSQLWriterResponse.model_validate_json(x))
-)
+def postgresql_writer_agent():
+    return (
+        prompt_template
+        | get_llm("postgresql_writer")
+        | (lambda x: PostgreSQLWriterResponse.model_validate_json(x.content))
+    )
 
 # ───────────────────────────────────────────────────────────────
 # Callable function (for LangGraph or other orchestration)
 # ───────────────────────────────────────────────────────────────
 
+def _writer_inputs(deps: PostgreSQLWriterDependencies) -> dict:
+    feedback = ""
+    if deps.previous_query and deps.previous_error:
+        feedback = (
+            f"Previous Attempt: {deps.previous_query}\n"
+            f"Rejection Reason: {deps.previous_error}\n"
+            "Write a corrected query that avoids this problem."
+        )
+    return {
+        "user_request": deps.user_request,
+        "database_schema": deps.database_schema,
+        "feedback": feedback
+    }
+
+def _generate(deps: PostgreSQLWriterDependencies, inputs: dict) -> PostgreSQLWriterResponse:
+    return llm_cache.cached(
+        "postgresql_writer", inputs, get_llm("postgresql_writer"), PostgreSQLWriterResponse,
+        lambda: postgresql_writer_agent().invoke(inputs),
+        schema_version=deps.schema_version,
+    )
+
+async def _agenerate(deps: PostgreSQLWriterDependencies, inputs: dict) -> PostgreSQLWriterResponse:
+    return await llm_cache.acached(
+        "postgresql_writer", inputs, get_llm("postgresql_writer"), PostgreSQLWriterResponse,
+        lambda: postgresql_writer_agent().ainvoke(inputs),
+        schema_version=deps.schema_version,
+    )
+
 def generate_query(deps: PostgreSQLWriterDependencies) -> PostgreSQLWriterResponse:
     """
     Generates a PostgreSQL query and explanation using LangChain pipeline.
+    Identical requests against the same schema are served from the response cache.
+    With deps.candidates > 1, see generate_candidates.
     """
-    return postgresql_writer_agent.invoke({
-        "user_request": deps.user_request,
-        "database_schema": deps.database_schema
-    })
+    if deps.candidates > 1:
+        return generate_candidates(deps)
+    return _generate(deps, _writer_inputs(deps))
+
+async def agenerate_query(deps: PostgreSQLWriterDependencies) -> PostgreSQLWriterResponse:
+    """
+    Async variant of generate_query.
+    """
+    if deps.candidates > 1:
+        return await agenerate_candidates(deps)
+    return await _agenerate(deps, _writer_inputs(deps))
+
+# ───────────────────────────────────────────────────────────────
+# Multi-candidate generation with plan-cost selection
+# ───────────────────────────────────────────────────────────────
+
+def _candidate_inputs(deps: PostgreSQLWriterDependencies) -> List[dict]:
+    base = _writer_inputs(deps)
+    approaches = CANDIDATE_APPROACHES[:max(deps.candidates, 1) - 1]
+    return [base] + [{**base, "feedback": f"{base['feedback']}\nApproach: {approach}".strip()} for approach in approaches]
+
+def _distinct(responses: List[PostgreSQLWriterResponse]) -> List[PostgreSQLWriterResponse]:
+    seen, out = set(), []
+    for response in responses:
+        # Formatting and keyword case only; literals stay exact so 'ACME' and 'acme' remain distinct
+        key = fingerprint(response.sql_query).key
+        if key not in seen:
+            seen.add(key)
+            out.append(response)
+    return out
+
+def _safe_explain(query: str) -> PlanCheck:
+    try:
+        return explain_query(query)
+    except Exception as e:
+        return PlanCheck(ok=False, error=str(e))
+
+async def _asafe_explain(query: str) -> PlanCheck:
+    try:
+        return await aexplain_query(query)
+    except Exception as e:
+        return PlanCheck(ok=False, error=str(e))
+
+def _select(candidates: List[PostgreSQLWriterResponse], plans: List[PlanCheck]) -> PostgreSQLWriterResponse:
+    """
+    Keeps the valid candidate with the lowest planner cost, preferring ones
+    inside the execution budget. With no valid candidate the first one is
+    returned so the checker reports its error as usual.
+    """
+    budget = default_budget()
+    scored: List[Tuple[bool, float, int]] = [
+        (not check_admission(plan, budget).admitted, plan.total_cost or 0.0, i)
+        for i, plan in enumerate(plans) if plan.ok
+    ]
+    log_event(
+        "writer_candidates", considered=len(candidates), valid=len(scored),
+        costs=[plan.total_cost for plan in plans],
+    )
+    if not scored:
+        return candidates[0].model_copy(update={"candidates_considered": len(candidates)})
+    _, cost, best = min(scored)
+    return candidates[best].model_copy(update={"estimated_cost": cost, "candidates_considered": len(candidates)})
+
+def _successful(results: list) -> List[PostgreSQLWriterResponse]:
+    responses = [r for r in results if not isinstance(r, Exception)]
+    if not responses:
+        raise results[0]
+    for error in (r for r in results if isinstance(r, Exception)):
+        log_event("writer_candidate_failed", logging.WARNING, error=str(error))
+    return _distinct(responses)
+
+def generate_candidates(deps: PostgreSQLWriterDependencies) -> PostgreSQLWriterResponse:
+    """
+    Asks for deps.candidates queries concurrently (varied approach hints),
+    EXPLAINs the distinct ones in parallel on pooled connections and
+    returns the cheapest valid one.
+    """
+    def attempt(inputs: dict):
+        try:
+            return _generate(deps, inputs)
+        except Exception as e:
+            return e
+
+    inputs = _candidate_inputs(deps)
+    with ThreadPoolExecutor(max_workers=len(inputs)) as pool:
+        # Each task runs in a copy of the caller's context so telemetry stays on the request's trace
+        results = list(pool.map(lambda i: copy_context().run(attempt, i), inputs))
+        candidates = _successful(results)
+        plans = list(pool.map(lambda c: copy_context().run(_safe_explain, c.sql_query), candidates))
+    return _select(candidates, plans)
+
+async def agenerate_candidates(deps: PostgreSQLWriterDependencies) -> PostgreSQLWriterResponse:
+    """
+    Async variant of generate_candidates.
+    """
+    inputs = _candidate_inputs(deps)
+    results = await asyncio.gather(*(_agenerate(deps, i) for i in inputs), return_exceptions=True)
+    candidates = _successful(list(results))
+    plans = await asyncio.gather(*(_asafe_explain(c.sql_query) for c in candidates))
+    return _select(candidates, list(plans))
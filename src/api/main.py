@@ -1,61 +1,462 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import Counter
+from contextlib import AsyncExitStack
 from fastapi import FastAPI, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import Optional
-from src.graph.workflow_graph import app as workflow_app, WorkflowState
+from typing import Optional, AsyncIterator, Literal, List, Dict, Tuple, Callable
+from src.tools.env import load_env
+
+# Module-level settings throughout src/ are read at import time, so .env must be loaded first
+load_env()
+
+from src.graph.workflow_graph import WorkflowState, get_workflow_app, arestore_results
+from src.graph.checkpoints import get_checkpointer, turn_thread_id
+from src.agents.executor_agent import astream_query, aiter_export, ExportStats, export_totals, asort_key_for, afetch_page
+from src.api.sessions import session_store, load_session_state, turn_delta
+from src.api.streaming import ChatEventTranslator, sse
+from src.tools.db import close_pool, close_async_pool, get_pool_stats
+from src.tools.llm_cache import llm_cache
+from src.tools.llm_registry import llm_registry
+from src.tools.result_cache import result_cache
+from src.tools.columnar import ColumnarResult, json_default
+from src.tools.telemetry import metrics, trace_request, log_event
+from src.tools.history import history_length
 
 # FastAPI app instance
 fastapi_app = FastAPI(title="LangGraph Orchestrator API")
 
+@fastapi_app.on_event("shutdown")
+async def shutdown():
+    close_pool()
+    await close_async_pool()
+    await llm_registry.aclose()
+
 # Request model
 class UserRequest(BaseModel):
     user_input: str
     session_id: str
-    state: Optional[WorkflowState] = None
+    state: Optional[WorkflowState] = None  # Deprecated: sessions are now kept server-side
+    return_state: bool = False  # Echo the full WorkflowState (large; for debugging)
+    mode: Literal["orchestrated", "direct"] = "orchestrated"  # "direct" runs the writer→checker→executor→analyst pipeline
+    stream_results: bool = False  # Stream query rows back as NDJSON instead of a single JSON body
+    fetch_size: Optional[int] = None  # Rows per server-side cursor fetch when streaming
+    result_format: Literal["rows", "columnar"] = "rows"  # "columnar" returns {"columns", "data"} instead of a list of row objects
+    export_format: Optional[Literal["csv", "binary"]] = None  # Return the rows as a COPY file download instead of JSON
+    export_chunk_size: Optional[int] = None  # Bytes per response chunk when exporting
 
-@fastapi_app.post("/chat")
-def chat(request: UserRequest):
-    session_id = request.session_id
+def _ndjson(payload: dict) -> str:
+    return json.dumps(payload, default=json_default) + "\n"
 
-    # Use passed state if provided (e.g., during follow-up)
-    state = request.state or {
-        "user_input": request.user_input,
-        "retry_count": 0,
-        "message_history": [],
-        "in_analyst_mode": False
-    }
+def _encode(payload: dict) -> dict:
+    # Columnar results serialize straight from their arrays
+    return jsonable_encoder(payload, custom_encoder={ColumnarResult: ColumnarResult.to_json_dict})
+
+async def stream_chat_response(response: dict, sql_query: str, fetch_size: Optional[int]) -> AsyncIterator[str]:
+    """
+    Yields the chat response as NDJSON: one "meta" line with the workflow
+    output, then a "rows" line per server-side cursor batch, then "end".
+    """
+    yield _ndjson({"type": "meta", **response})
+
+    row_count = 0
+    try:
+        async for rows in astream_query(sql_query, fetch_size):
+            row_count += len(rows)
+            yield _ndjson({"type": "rows", "rows": rows})
+    except Exception as e:
+        yield _ndjson({"type": "error", "error_message": str(e), "row_count": row_count})
+        return
+
+    yield _ndjson({"type": "end", "row_count": row_count})
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "binary": "application/octet-stream"}
+
+async def export_chat_response(sql_query: str, fmt: str, chunk_size: Optional[int]) -> AsyncIterator[bytes]:
+    """
+    Streams COPY output straight from Postgres to the client. Errors after
+    the first chunk can only end the response early; they are logged and
+    counted in /stats/exports.
+    """
+    stats = ExportStats(format=fmt)
+    try:
+        async for chunk in aiter_export(sql_query, fmt, chunk_size, stats=stats):
+            yield chunk
+    except Exception as e:
+        log_event("export_error", logging.ERROR, error=str(e))
+        export_totals.record(stats, failed=True)
+        return
+    export_totals.record(stats)
+
+def _load_turn_state(request: UserRequest) -> WorkflowState:
+    # Passed state still wins for older clients; otherwise resume the stored session
+    if request.state is not None:
+        return dict(request.state)
+    return load_session_state(request.session_id, request.user_input)
+
+EventCallback = Callable[[dict], None]
+
+async def _ainvoke(workflow_app, graph_input, config: Optional[dict], on_event: Optional[EventCallback]) -> WorkflowState:
+    """
+    ainvoke, or with `on_event` the same run through astream_events so each
+    graph event (node runs, model tokens) is handed over as it happens.
+    """
+    if on_event is None:
+        return await workflow_app.ainvoke(graph_input, config)
+    result = None
+    async for event in workflow_app.astream_events(graph_input, config, version="v2"):
+        if event["event"] == "on_chain_end" and not event.get("parent_ids"):
+            result = event["data"].get("output")  # The root run ends with the final state
+        else:
+            on_event(event)
+    return result
+
+async def _invoke_checkpointed(
+    request: UserRequest,
+    previous: WorkflowState,
+    state: WorkflowState,
+    on_event: Optional[EventCallback] = None,
+) -> WorkflowState:
+    """
+    Runs the turn on its own checkpoint thread. If an earlier attempt at the
+    same turn was interrupted (crash, timeout, cancelled request), the graph
+    resumes after the last completed node instead of starting over. The
+    thread's checkpoints are dropped once the turn completes.
+    """
+    workflow_app = get_workflow_app(request.mode, checkpointed=True)
+    checkpointer = workflow_app.checkpointer
+    if checkpointer is None:
+        return await _ainvoke(workflow_app, state, None, on_event)
+
+    thread_id = turn_thread_id(request.session_id, previous, request.user_input)
+    config = {"configurable": {"thread_id": thread_id, "session_id": request.session_id}}
+
+    snapshot = await workflow_app.aget_state(config)
+    if snapshot.next:
+        log_event("run_resumed", session_id=request.session_id, next=list(snapshot.next))
+        result = await _ainvoke(workflow_app, None, config, on_event)
+    else:
+        result = await _ainvoke(workflow_app, state, config, on_event)
+
+    # Rows too large to checkpoint are fetched again if the resumed run ended without them
+    result = await arestore_results(result)
+    await checkpointer.adelete_thread(thread_id)
+    return result
+
+async def _run_turn(
+    request: UserRequest,
+    state: WorkflowState,
+    on_event: Optional[EventCallback] = None,
+) -> Tuple[dict, WorkflowState]:
+    """
+    Runs one conversational turn from `state`, stores the result in the
+    session and returns the response body (this turn's changes only)
+    together with the resulting state. `on_event` receives the graph's
+    events while the turn runs (see /chat/stream).
+    """
+    previous = dict(state)
+    previous_history_len = history_length(state)
+    state = dict(state)
 
     # Inject the new user input
     state["user_input"] = request.user_input
     state["awaiting_follow_up"] = False  # Reset in case previous run had follow-up
+    state["stream_results"] = request.stream_results
+    state["columnar_results"] = request.result_format == "columnar"
+    state["export_format"] = request.export_format
+    state["retry_count"] = 0  # The retry budget applies per turn, not per session
+    # A rejection from the previous turn must not reach the writer as feedback for a new question
+    state["validated"] = None
+    state["validation_error"] = None
+    state["suggested_fix"] = None
+    state["fix_attempts"] = 0
+    state["last_node"] = None  # Marks the first hop of a new turn for the fast-path router
+
+    # Run LangGraph on the event loop (async nodes, async LLM and DB calls)
+    with trace_request(mode=request.mode, session_id=request.session_id):
+        result = await _invoke_checkpointed(request, previous, state, on_event)
+
+    session_store.put(request.session_id, result)
+
+    # Determine what type of response to return
+    status = (
+        "awaiting_follow_up" if result.get("decision") == "follow_up"
+        else "complete" if result.get("decision") == "complete"
+        else "in_progress"
+    )
+
+    # Only this turn's changes; the full state stays server-side
+    response = {
+        "session_id": request.session_id,
+        "status": status,
+        "decision": result.get("decision"),
+        "follow_up_question": result.get("follow_up_question"),
+        **turn_delta(previous, result, previous_history_len),
+    }
+    if request.return_state:
+        response["state"] = result
+    return response, result
+
+@fastapi_app.post("/chat")
+async def chat(request: UserRequest):
+    session_id = request.session_id
 
     try:
-        # Run LangGraph
-        result = workflow_app.invoke(state)
-
-        print(result)
-
-        # Determine what type of response to return
-        status = (
-            "awaiting_follow_up" if result.get("decision") == "follow_up"
-            else "complete" if result.get("decision") == "complete"
-            else "in_progress"
-        )
-
-        print(status)
-
-        return {
-            "session_id": session_id,
-            "status": status,
-            "decision": result.get("decision"),
-            "follow_up_question": result.get("follow_up_question"),
-            "sql_query": result.get("sql_query"),
-            "query_results": result.get("query_results"),
-            "analysis": result.get("analysis"),
-            "executor_response": result.get("executor_response"),
-            "state": result  # 👈 Return full state so user can continue
-        }
+        response, result = await _run_turn(request, _load_turn_state(request))
+
+        executor_response = result.get("executor_response") or {}
+        if request.export_format and executor_response.get("streamed") and executor_response.get("success"):
+            extension = "csv" if request.export_format == "csv" else "bin"
+            return StreamingResponse(
+                export_chat_response(result["sql_query"], request.export_format, request.export_chunk_size),
+                media_type=EXPORT_MEDIA_TYPES[request.export_format],
+                headers={
+                    "Content-Disposition": f'attachment; filename="export.{extension}"',
+                    "X-Session-Id": session_id,
+                    "X-Status": response["status"],
+                },
+            )
+
+        if executor_response.get("streamed") and executor_response.get("success"):
+            return StreamingResponse(
+                stream_chat_response(response, result["sql_query"], request.fetch_size),
+                media_type="application/x-ndjson",
+            )
+
+        return _encode(response)
 
     except Exception as e:
-        print(state)
-        
+        log_event("chat_error", logging.ERROR, session_id=session_id, error=str(e))
+
         raise HTTPException(status_code=500, detail=str(e))
+
+# ───────────────────────────────────────────────────────────────
+# Streaming chat (Server-Sent Events)
+# ───────────────────────────────────────────────────────────────
+
+async def stream_chat_events(request: UserRequest) -> AsyncIterator[str]:
+    """
+    Runs the turn and yields its progress as Server-Sent Events:
+    node_start / node_end per graph node, "sql" once the writer has a
+    query, "token" for writer and analyst output as the model generates
+    it, then "result" with the same body /chat returns (or "error").
+    """
+    # Rows are returned inline in the result event
+    request = request.model_copy(update={"stream_results": False, "export_format": None})
+    translator = ChatEventTranslator()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    task = asyncio.ensure_future(_run_turn(request, _load_turn_state(request), on_event=queue.put_nowait))
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        while (event := await queue.get()) is not None:
+            for name, data in translator.translate(event):
+                yield sse(name, data)
+        response, _ = task.result()
+        yield sse("result", _encode(response))
+    except Exception as e:
+        log_event("chat_error", logging.ERROR, session_id=request.session_id, error=str(e))
+        yield sse("error", {"session_id": request.session_id, "error": str(e)})
+    finally:
+        # Client disconnected: stop the turn (a checkpointed turn resumes on retry)
+        task.cancel()
+
+@fastapi_app.post("/chat/stream")
+async def chat_stream(request: UserRequest):
+    return StreamingResponse(
+        stream_chat_events(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ───────────────────────────────────────────────────────────────
+# Batch chat
+# ───────────────────────────────────────────────────────────────
+
+# Upper bound on graphs running at once for one batch (LLM calls are also rate limited per provider)
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+class BatchRequest(BaseModel):
+    items: List[UserRequest]
+    concurrency: Optional[int] = None  # Capped at BATCH_MAX_CONCURRENCY
+
+def _batch_key(request: UserRequest, state: WorkflowState) -> str:
+    """Items with the same question, options and starting conversation produce the same turn."""
+    payload = [
+        " ".join(request.user_input.split()),
+        request.mode,
+        request.result_format,
+        state.get("message_history") or [],
+        state.get("history_summary"),
+        bool(state.get("in_analyst_mode")),
+    ]
+    return hashlib.sha256(json.dumps(payload, default=str).encode("utf-8")).hexdigest()
+
+async def stream_batch_response(batch: BatchRequest) -> AsyncIterator[str]:
+    """
+    Runs the batch's turns concurrently and yields one NDJSON "item" line
+    per request as soon as its turn finishes (in completion order, tagged
+    with the request's index), then an "end" line.
+
+    Identical items are run once and the result is stored into each of
+    their sessions. Items sharing a session_id run one after another in
+    batch order and are never merged.
+    """
+    started = time.perf_counter()
+    limit = max(1, min(batch.concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    semaphore = asyncio.Semaphore(limit)
+
+    # Rows are returned inline; per-item streaming and exports are not available in a batch
+    items = [item.model_copy(update={"stream_results": False, "export_format": None}) for item in batch.items]
+    session_counts = Counter(item.session_id for item in items)
+    session_locks = {sid: asyncio.Lock() for sid, count in session_counts.items() if count > 1}
+
+    groups: Dict[str, List[int]] = {}
+    for index, item in enumerate(items):
+        if item.session_id in session_locks:
+            key = f"session:{index}"
+        else:
+            key = _batch_key(item, _load_turn_state(item))
+        groups.setdefault(key, []).append(index)
+
+    async def run_group(indexes: List[int]) -> List[dict]:
+        first = items[indexes[0]]
+        async with AsyncExitStack() as stack:
+            lock = session_locks.get(first.session_id)
+            if lock is not None:
+                await stack.enter_async_context(lock)
+            await stack.enter_async_context(semaphore)
+            try:
+                response, result = await _run_turn(first, _load_turn_state(first))
+                response = _encode(response)
+            except Exception as e:
+                log_event("chat_error", logging.ERROR, session_id=first.session_id, error=str(e))
+                return [
+                    {"type": "item", "index": i, "session_id": items[i].session_id, "status": "error", "error": str(e)}
+                    for i in indexes
+                ]
+
+        lines = [{"type": "item", "index": indexes[0], **response}]
+        if len(indexes) > 1:
+            for i in indexes[1:]:
+                session_store.put(items[i].session_id, result)
+                lines.append({
+                    "type": "item", "index": i, **response,
+                    "session_id": items[i].session_id, "deduplicated_from": indexes[0],
+                })
+        return lines
+
+    failed = 0
+    tasks = [asyncio.ensure_future(run_group(indexes)) for indexes in groups.values()]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            for line in await finished:
+                failed += line.get("status") == "error"
+                yield _ndjson(line)
+    finally:
+        # Client disconnected: stop the remaining turns
+        for task in tasks:
+            task.cancel()
+
+    yield _ndjson({
+        "type": "end",
+        "items": len(items),
+        "unique": len(groups),
+        "failed": failed,
+        "seconds": round(time.perf_counter() - started, 3),
+    })
+
+@fastapi_app.post("/chat/batch")
+async def chat_batch(batch: BatchRequest):
+    if len(batch.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch.")
+    return StreamingResponse(stream_batch_response(batch), media_type="application/x-ndjson")
+
+@fastapi_app.get("/chat/{session_id}/results")
+async def chat_results(session_id: str, cursor: Optional[str] = None, limit: Optional[int] = None):
+    """
+    Pages through the rows of the session's last successfully executed
+    query with keyset pagination, without running the graph or any LLM.
+    Omit `cursor` for the first page; pass back `next_cursor` for the next.
+    """
+    state = session_store.get(session_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Unknown session.")
+    sql_query = state.get("sql_query")
+    if not sql_query or not (state.get("executor_response") or {}).get("success"):
+        raise HTTPException(status_code=409, detail="The session has no successfully executed query.")
+
+    # The sort key is chosen once per query and cached outside the session, which is only read here
+    try:
+        sort_key = await asort_key_for(sql_query)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    page = await afetch_page(sql_query, sort_key, cursor, limit)
+    if not page.success:
+        raise HTTPException(status_code=400, detail=page.error_message)
+    return _encode({
+        "session_id": session_id,
+        "rows": page.rows,
+        "sort_key": page.sort_key,
+        "next_cursor": page.next_cursor,
+    })
+
+@fastapi_app.delete("/chat/{session_id}")
+def end_session(session_id: str):
+    session_store.delete(session_id)
+    checkpointer = get_checkpointer()
+    if checkpointer is not None:
+        checkpointer.delete_session(session_id)
+    return {"session_id": session_id, "status": "deleted"}
+
+@fastapi_app.get("/stats/db-pool")
+def db_pool_stats():
+    return get_pool_stats()
+
+@fastapi_app.get("/stats/llm-cache")
+def llm_cache_stats():
+    return llm_cache.stats()
+
+@fastapi_app.get("/stats/llm-models")
+def llm_model_stats():
+    return llm_registry.stats()
+
+@fastapi_app.get("/stats/result-cache")
+def result_cache_stats():
+    return result_cache.stats()
+
+def _cache_samples():
+    samples = []
+    for cache, stats in (("llm", llm_cache.stats()), ("result", result_cache.stats())):
+        samples.append(("agent_cache_hits_total", "Cache hits.", "counter", {"cache": cache}, stats["hits"]))
+        samples.append(("agent_cache_misses_total", "Cache misses.", "counter", {"cache": cache}, stats["misses"]))
+        samples.append(("agent_cache_hit_rate", "Cache hit rate since start.", "gauge", {"cache": cache}, stats["hit_rate"]))
+    return samples
+
+def _pool_samples():
+    samples = []
+    for pool, stats in get_pool_stats().items():
+        if stats.get("open"):
+            samples.append(("agent_db_pool_in_use", "Connections checked out.", "gauge", {"pool": pool}, stats["in_use"]))
+            samples.append(("agent_db_pool_wait_ms_avg", "Average checkout wait.", "gauge", {"pool": pool}, stats["wait_ms_avg"]))
+    return samples
+
+metrics.register_collector(_cache_samples)
+metrics.register_collector(_pool_samples)
+
+@fastapi_app.get("/metrics")
+def metrics_endpoint():
+    # Prometheus text format: node/LLM/DB latency histograms, hops, tokens, cache and pool gauges
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@fastapi_app.get("/stats/exports")
+def export_stats():
+    return export_totals.stats()
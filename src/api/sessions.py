@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Optional, Dict, Any, List
+
+from src.tools.cache import LRUCache
+from src.tools.columnar import json_default
+
+# ───────────────────────────────────────────────────────────────
+# Settings
+# ───────────────────────────────────────────────────────────────
+
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "memory")  # "memory" or "sqlite"
+SESSION_STORE_SQLITE_PATH = os.getenv("SESSION_STORE_SQLITE_PATH", "sessions.db")
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "86400"))
+
+# ───────────────────────────────────────────────────────────────
+# Session stores
+# ───────────────────────────────────────────────────────────────
+
+class InMemorySessionStore:
+    """
+    Keeps each session's WorkflowState in process memory, evicting the
+    least recently used sessions past `max_entries` and idle ones past `ttl`.
+    """
+
+    def __init__(self, max_entries: int = SESSION_MAX_ENTRIES, ttl: float = SESSION_TTL):
+        self._sessions = LRUCache(max_entries=max_entries, ttl=ttl)
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return self._sessions.get(session_id)
+
+    def put(self, session_id: str, state: Dict[str, Any]) -> None:
+        self._sessions.set(session_id, state)
+
+    def delete(self, session_id: str) -> None:
+        self._sessions.delete(session_id)
+
+class SQLiteSessionStore:
+    """
+    Persists sessions as JSON in a local SQLite file so they survive
+    restarts and can be shared by workers on the same host.
+    """
+
+    def __init__(self, path: str = SESSION_STORE_SQLITE_PATH, max_entries: int = SESSION_MAX_ENTRIES, ttl: float = SESSION_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at)")
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def put(self, session_id: str, state: Dict[str, Any]) -> None:
+        payload = json.dumps(state, default=json_default)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, state, updated_at) VALUES (?, ?, ?)",
+                (session_id, payload, now),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl,))
+                self._conn.execute(
+                    "DELETE FROM sessions WHERE session_id IN ("
+                    " SELECT session_id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+def create_session_store():
+    """Builds the store selected by SESSION_STORE_BACKEND."""
+    if SESSION_STORE_BACKEND == "sqlite":
+        return SQLiteSessionStore()
+    return InMemorySessionStore()
+
+session_store = create_session_store()
+
+# ───────────────────────────────────────────────────────────────
+# Per-turn helpers
+# ───────────────────────────────────────────────────────────────
+
+def new_session_state(user_input: str) -> Dict[str, Any]:
+    return {
+        "user_input": user_input,
+        "retry_count": 0,
+        "message_history": [],
+        "in_analyst_mode": False
+    }
+
+def load_session_state(session_id: str, user_input: str) -> Dict[str, Any]:
+    """
+    Returns a working copy of the session's state (or a fresh one). The
+    message history list is copied because graph nodes append to it in place.
+    """
+    stored = session_store.get(session_id)
+    if stored is None:
+        return new_session_state(user_input)
+    return {**stored, "message_history": list(stored.get("message_history") or [])}
+
+# Fields compared between turns; message_history is reported as new_messages instead
+TURN_FIELDS = ("sql_query", "query_results", "validated", "analysis", "executor_response", "in_analyst_mode")
+
+def turn_delta(previous: Dict[str, Any], result: Dict[str, Any], previous_history_len: int) -> Dict[str, Any]:
+    """
+    Returns only what changed during this turn: the turn fields whose values
+    differ from the previous state, plus the messages appended to the history.
+    `previous_history_len` counts folded messages too (see history_length),
+    since compaction may have dropped older entries from the list.
+    """
+    delta = {
+        field: result.get(field)
+        for field in TURN_FIELDS
+        if result.get(field) != previous.get(field)
+    }
+    history: List[Dict[str, str]] = result.get("message_history") or []
+    start = previous_history_len - (result.get("history_offset") or 0)
+    delta["new_messages"] = history[max(start, 0):]
+    return delta
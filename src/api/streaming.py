@@ -0,0 +1,121 @@
+import re
+import json
+from typing import Dict, List, Tuple
+
+from src.graph.workflow_graph import node_summary
+from src.tools.columnar import json_default
+
+# Agents whose model output is streamed to the client, and the JSON string field forwarded as tokens
+STREAMED_FIELDS = {
+    "postgresql_writer": "sql_query",
+    "analyst": "insights",
+}
+
+def sse(event: str, data: dict) -> str:
+    """One Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, default=json_default)}\n\n"
+
+# ───────────────────────────────────────────────────────────────
+# Incremental JSON field extraction
+# ───────────────────────────────────────────────────────────────
+
+class JsonFieldStream:
+    """
+    Pulls the decoded text of one string field out of a JSON object as it
+    is generated, chunk by chunk. The agents answer in JSON, so this turns
+    '{"insights": "Sales gr' + 'ew 12%...' into 'Sales gr', 'ew 12%...'.
+    Escape sequences split across chunks are held back until complete.
+    """
+
+    def __init__(self, field: str):
+        self._key = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buffer = ""
+        self._started = False
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        if self.done:
+            return ""
+        self._buffer += chunk
+        if not self._started:
+            match = self._key.search(self._buffer)
+            if match is None:
+                return ""
+            self._started = True
+            self._buffer = self._buffer[match.end():]
+
+        buffer, out, i = self._buffer, [], 0
+        try:
+            while i < len(buffer):
+                c = buffer[i]
+                if c == '"':
+                    self.done = True
+                    break
+                if c != "\\":
+                    out.append(c)
+                    i += 1
+                    continue
+                size = 6 if buffer[i + 1:i + 2] == "u" else 2
+                if size == 6 and len(buffer) >= i + 6 and 0xD800 <= int(buffer[i + 2:i + 6], 16) <= 0xDBFF:
+                    size = 12  # Surrogate pair: decode both halves together
+                if len(buffer) < i + size:
+                    break
+                out.append(json.loads(f'"{buffer[i:i + size]}"'))
+                i += size
+        except ValueError:
+            self.done = True  # Not valid JSON after all; the final response still carries the field
+        self._buffer = buffer[i:]
+        return "".join(out)
+
+# ───────────────────────────────────────────────────────────────
+# Graph events → client events
+# ───────────────────────────────────────────────────────────────
+
+class ChatEventTranslator:
+    """
+    Maps LangGraph `astream_events` (v2) events of one turn to client events:
+    node_start / node_end per graph node, "sql" as soon as the writer has
+    produced the query, and "token" for streamed writer and analyst output.
+    Each model call is numbered (`call`) so parallel writer candidates can
+    be told apart.
+    """
+
+    def __init__(self):
+        self._fields: Dict[str, JsonFieldStream] = {}
+        self._calls: Dict[str, int] = {}
+
+    def translate(self, event: dict) -> List[Tuple[str, dict]]:
+        kind = event["event"]
+        node = event.get("metadata", {}).get("langgraph_node")
+
+        if kind == "on_chat_model_stream" and node in STREAMED_FIELDS:
+            return self._token(node, event)
+
+        # The node's own run sits directly under the graph's root run; __start__ is LangGraph's input step
+        if node in (None, "__start__") or event.get("name") != node or len(event.get("parent_ids") or ()) != 1:
+            return []
+        if kind == "on_chain_start":
+            return [("node_start", {"node": node})]
+        if kind != "on_chain_end":
+            return []
+
+        output = event.get("data", {}).get("output")
+        if not isinstance(output, dict):
+            return [("node_end", {"node": node})]
+        events = [("node_end", {"node": node, **node_summary(output)})]
+        if node == "postgresql_writer" and output.get("sql_query"):
+            events.append(("sql", {"sql_query": output["sql_query"]}))
+        return events
+
+    def _token(self, node: str, event: dict) -> List[Tuple[str, dict]]:
+        run_id = str(event.get("run_id"))
+        stream = self._fields.get(run_id)
+        if stream is None:
+            stream = self._fields[run_id] = JsonFieldStream(STREAMED_FIELDS[node])
+            self._calls[run_id] = len(self._calls)
+        chunk = event.get("data", {}).get("chunk")
+        content = getattr(chunk, "content", None)
+        text = stream.feed(content) if isinstance(content, str) else ""
+        if not text:
+            return []
+        return [("token", {"node": node, "field": STREAMED_FIELDS[node], "call": self._calls[run_id], "text": text})]
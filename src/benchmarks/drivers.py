@@ -0,0 +1,112 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from src.api.sessions import new_session_state
+from src.tools.telemetry import metrics, trace_request
+
+# ───────────────────────────────────────────────────────────────
+# Per-request samples
+# ───────────────────────────────────────────────────────────────
+
+class RequestSample(BaseModel):
+    latency: float  # Seconds
+    hops: Optional[int] = None
+    ok: bool = True
+    error: Optional[str] = None
+
+def _question(questions: List[str], i: int) -> str:
+    return questions[i % len(questions)]
+
+# ───────────────────────────────────────────────────────────────
+# workflow_app.invoke driver (threads)
+# ───────────────────────────────────────────────────────────────
+
+def run_invoke(questions: List[str], requests: int, concurrency: int, mode: str = "orchestrated") -> Tuple[List[RequestSample], float]:
+    """
+    Calls the compiled graph's sync invoke from `concurrency` threads, one
+    fresh conversation per request. Returns the samples and wall time.
+    """
+    from src.graph.workflow_graph import get_workflow_app
+
+    app = get_workflow_app(mode)
+
+    def one(i: int) -> RequestSample:
+        state = new_session_state(_question(questions, i))
+        started = time.perf_counter()
+        try:
+            with trace_request(mode=mode, driver="invoke") as trace:
+                app.invoke(state)
+            return RequestSample(latency=time.perf_counter() - started, hops=trace.hops)
+        except Exception as e:
+            return RequestSample(latency=time.perf_counter() - started, ok=False, error=str(e))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(one, range(requests)))
+    return samples, time.perf_counter() - started
+
+# ───────────────────────────────────────────────────────────────
+# FastAPI /chat driver (asyncio + httpx)
+# ───────────────────────────────────────────────────────────────
+
+def _hop_totals() -> Tuple[float, float]:
+    totals = metrics.totals("agent_graph_hops").values()
+    return sum(s for s, _ in totals), sum(c for _, c in totals)
+
+async def arun_chat(
+    questions: List[str],
+    requests: int,
+    concurrency: int,
+    mode: str = "orchestrated",
+    base_url: Optional[str] = None,
+    timeout: float = 120.0,
+) -> Tuple[List[RequestSample], float]:
+    """
+    Posts to /chat with at most `concurrency` requests in flight. Without
+    `base_url` the app is called in-process through httpx's ASGI transport,
+    which also lets hops be read from the agent_graph_hops histogram.
+    """
+    import httpx
+
+    if base_url is None:
+        from src.api.main import fastapi_app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fastapi_app), base_url="http://benchmark", timeout=timeout)
+    else:
+        client = httpx.AsyncClient(base_url=base_url, timeout=timeout)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> RequestSample:
+        payload = {"user_input": _question(questions, i), "session_id": f"benchmark-{i}", "mode": mode}
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post("/chat", json=payload)
+                latency = time.perf_counter() - started
+                if response.status_code != 200:
+                    return RequestSample(latency=latency, ok=False, error=f"HTTP {response.status_code}: {response.text[:200]}")
+                await client.delete(f"/chat/{payload['session_id']}")
+                return RequestSample(latency=latency)
+            except Exception as e:
+                return RequestSample(latency=time.perf_counter() - started, ok=False, error=str(e))
+
+    hops_before = _hop_totals()
+    started = time.perf_counter()
+    async with client:
+        samples = await asyncio.gather(*(one(i) for i in range(requests)))
+    wall = time.perf_counter() - started
+
+    if base_url is None:
+        hops_sum, hops_count = (a - b for a, b in zip(_hop_totals(), hops_before))
+        # Per-request hops are not visible over HTTP; every sample gets the run's mean
+        mean_hops = round(hops_sum / hops_count) if hops_count else None
+        for sample in samples:
+            sample.hops = mean_hops
+    return list(samples), wall
+
+def run_chat(*args, **kwargs) -> Tuple[List[RequestSample], float]:
+    return asyncio.run(arun_chat(*args, **kwargs))
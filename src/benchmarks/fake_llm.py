@@ -0,0 +1,165 @@
+import time
+import json
+import asyncio
+from typing import List, Dict, Any, Optional, Callable
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from src.tools.telemetry import LLMTelemetry
+from src.tools.history import STEPS_PREFIX
+
+# ───────────────────────────────────────────────────────────────
+# Benchmark scenarios (question -> SQL against the bench fixture)
+# ───────────────────────────────────────────────────────────────
+
+SCENARIOS: List[Dict[str, str]] = [
+    {
+        "question": "How many orders were placed per month?",
+        "sql": (
+            "SELECT date_trunc('month', ordered_at) AS month, count(*) AS orders "
+            "FROM bench.orders GROUP BY 1 ORDER BY 1"
+        ),
+    },
+    {
+        "question": "Show the top 10 customers by total spend",
+        "sql": (
+            "SELECT c.name, sum(i.quantity * i.unit_price) AS spend "
+            "FROM bench.customers c JOIN bench.orders o ON o.customer_id = c.id "
+            "JOIN bench.order_items i ON i.order_id = o.id "
+            "GROUP BY c.id, c.name ORDER BY spend DESC LIMIT 10"
+        ),
+    },
+    {
+        "question": "What is the average order value by country?",
+        "sql": (
+            "SELECT c.country, avg(t.total) AS avg_order_value FROM bench.customers c "
+            "JOIN (SELECT o.id, o.customer_id, sum(i.quantity * i.unit_price) AS total "
+            "FROM bench.orders o JOIN bench.order_items i ON i.order_id = o.id GROUP BY o.id) t "
+            "ON t.customer_id = c.id GROUP BY c.country ORDER BY avg_order_value DESC"
+        ),
+    },
+    {
+        "question": "List the 50 most recent orders with their customer names",
+        "sql": (
+            "SELECT o.id, o.ordered_at, o.status, c.name FROM bench.orders o "
+            "JOIN bench.customers c ON c.id = o.customer_id ORDER BY o.ordered_at DESC LIMIT 50"
+        ),
+    },
+    {
+        "question": "Analyze the revenue trend by product category and explain what stands out",
+        "sql": (
+            "SELECT p.category, date_trunc('month', o.ordered_at) AS month, "
+            "sum(i.quantity * i.unit_price) AS revenue FROM bench.order_items i "
+            "JOIN bench.products p ON p.id = i.product_id JOIN bench.orders o ON o.id = i.order_id "
+            "GROUP BY 1, 2 ORDER BY 2, 1"
+        ),
+    },
+]
+
+# Orchestrator decisions in order, indexed by how many it has already made this conversation
+ORCHESTRATOR_SEQUENCE = ["postgresql_writer", "postgresql_checker", "executor", "analyst", "complete"]
+
+# ───────────────────────────────────────────────────────────────
+# Scripted responses per agent
+# ───────────────────────────────────────────────────────────────
+
+def _text(messages: List[BaseMessage]) -> str:
+    return "\n".join(str(m.content) for m in messages)
+
+def _scenario_for(text: str) -> Dict[str, str]:
+    for scenario in SCENARIOS:
+        if scenario["question"] in text:
+            return scenario
+    return SCENARIOS[0]
+
+def _steps_taken(messages: List[BaseMessage]) -> int:
+    for m in reversed(messages):
+        content = str(m.content)
+        if content.startswith(STEPS_PREFIX):
+            return len(content[len(STEPS_PREFIX):].split(","))
+    return 0
+
+def default_script(agent: str, messages: List[BaseMessage]) -> str:
+    """
+    Replays a plausible JSON response for each agent. The orchestrator
+    walks ORCHESTRATOR_SEQUENCE using the steps already taken this turn
+    (the prompt's progress note); the writer answers with the matching
+    scenario's SQL.
+    """
+    text = _text(messages)
+    if agent == "orchestrator":
+        made = _steps_taken(messages)
+        decision = ORCHESTRATOR_SEQUENCE[min(made, len(ORCHESTRATOR_SEQUENCE) - 1)]
+        return json.dumps({"decision": decision, "follow_up_question": None})
+    if agent == "postgresql_writer":
+        scenario = _scenario_for(text)
+        return json.dumps({"sql_query": scenario["sql"], "explanation": "Scripted benchmark query."})
+    if agent == "postgresql_checker":
+        return json.dumps({"is_valid": True, "reason": "Matches the request.", "suggested_fix": None, "expected_output": None})
+    if agent == "analyst":
+        return json.dumps({
+            "insights": "Scripted benchmark analysis.",
+            "key_findings": ["Values are stable across the period.", "One category dominates revenue."],
+            "next_steps": "Break the largest category down further.",
+        })
+    raise ValueError(f"No script for agent {agent}")
+
+# ───────────────────────────────────────────────────────────────
+# Fake chat model
+# ───────────────────────────────────────────────────────────────
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model that returns scripted content after an injected delay, so
+    the workflow runs end to end without network calls or token spend.
+    Reports estimated token usage so LLM telemetry still has numbers.
+    """
+
+    agent: str
+    script: Callable[[str, List[BaseMessage]], str] = default_script
+    latency: float = 0.0  # Seconds per call
+    model_name: str = "scripted-benchmark"
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        content = self.script(self.agent, messages)
+        prompt_tokens = len(_text(messages)) // 4
+        completion_tokens = len(content) // 4
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._result(messages)
+
+# ───────────────────────────────────────────────────────────────
+# Installing the fakes into the agent modules
+# ───────────────────────────────────────────────────────────────
+
+def install_scripted_llms(latency: float = 0.0, script: Callable[[str, List[BaseMessage]], str] = default_script) -> None:
+    """
+    Registers a ScriptedChatModel for every agent in the shared model
+    registry, so each agent's chain is built around the fake.
+    """
+    from src.tools.llm_registry import llm_registry
+
+    for agent in ("orchestrator", "postgresql_writer", "postgresql_checker", "analyst"):
+        llm_registry.register(agent, ScriptedChatModel(agent=agent, script=script, latency=latency, callbacks=[LLMTelemetry(agent)]))
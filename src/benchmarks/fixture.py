@@ -0,0 +1,114 @@
+import random
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict
+
+from faker import Faker
+
+from src.tools.db import get_db_connection
+from src.tools.schema import invalidate_schema_cache
+
+# ───────────────────────────────────────────────────────────────
+# Fixture schema (isolated in its own schema)
+# ───────────────────────────────────────────────────────────────
+
+BENCH_SCHEMA = "bench"
+
+# Rows per table at scale 1
+BASE_ROWS = {"customers": 1000, "products": 200, "orders": 5000}
+ITEMS_PER_ORDER = (1, 5)
+
+DDL = f"""
+CREATE SCHEMA IF NOT EXISTS {BENCH_SCHEMA};
+DROP TABLE IF EXISTS {BENCH_SCHEMA}.order_items, {BENCH_SCHEMA}.orders,
+    {BENCH_SCHEMA}.products, {BENCH_SCHEMA}.customers;
+CREATE TABLE {BENCH_SCHEMA}.customers (
+    id integer PRIMARY KEY,
+    name text NOT NULL,
+    email text NOT NULL,
+    country text NOT NULL,
+    created_at timestamptz NOT NULL
+);
+CREATE TABLE {BENCH_SCHEMA}.products (
+    id integer PRIMARY KEY,
+    name text NOT NULL,
+    category text NOT NULL,
+    price numeric(10, 2) NOT NULL
+);
+CREATE TABLE {BENCH_SCHEMA}.orders (
+    id integer PRIMARY KEY,
+    customer_id integer NOT NULL REFERENCES {BENCH_SCHEMA}.customers (id),
+    ordered_at timestamptz NOT NULL,
+    status text NOT NULL
+);
+CREATE TABLE {BENCH_SCHEMA}.order_items (
+    order_id integer NOT NULL REFERENCES {BENCH_SCHEMA}.orders (id),
+    product_id integer NOT NULL REFERENCES {BENCH_SCHEMA}.products (id),
+    quantity integer NOT NULL,
+    unit_price numeric(10, 2) NOT NULL
+);
+"""
+
+INDEXES = f"""
+CREATE INDEX ON {BENCH_SCHEMA}.orders (customer_id);
+CREATE INDEX ON {BENCH_SCHEMA}.orders (ordered_at);
+CREATE INDEX ON {BENCH_SCHEMA}.order_items (order_id);
+ANALYZE {BENCH_SCHEMA}.customers, {BENCH_SCHEMA}.products, {BENCH_SCHEMA}.orders, {BENCH_SCHEMA}.order_items;
+"""
+
+CATEGORIES = ["electronics", "books", "garden", "toys", "grocery", "apparel", "sports", "beauty"]
+STATUSES = ["pending", "shipped", "delivered", "cancelled", "returned"]
+
+# ───────────────────────────────────────────────────────────────
+# Seeding
+# ───────────────────────────────────────────────────────────────
+
+def seed_fixture(scale: float = 1.0, seed: int = 42) -> Dict[str, int]:
+    """
+    (Re)creates the bench schema and bulk-loads deterministic synthetic
+    data with COPY. Faker supplies names, emails and countries; numbers
+    and dates come from a seeded Random so runs are reproducible.
+    Returns the row count per table.
+    """
+    Faker.seed(seed)
+    fake = Faker()
+    rng = random.Random(seed)
+
+    counts = {table: max(1, int(rows * scale)) for table, rows in BASE_ROWS.items()}
+    # A year of history ending at a fixed date keeps results identical between runs
+    end = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    start = end - timedelta(days=365)
+    span_seconds = int((end - start).total_seconds())
+
+    item_rows = 0
+    with get_db_connection() as conn:
+        conn.execute(DDL)
+        with conn.cursor() as cur:
+            with cur.copy(f"COPY {BENCH_SCHEMA}.customers (id, name, email, country, created_at) FROM STDIN") as copy:
+                for i in range(1, counts["customers"] + 1):
+                    copy.write_row((i, fake.name(), fake.email(), fake.country(), start + timedelta(seconds=rng.randrange(span_seconds))))
+
+            prices = {}
+            with cur.copy(f"COPY {BENCH_SCHEMA}.products (id, name, category, price) FROM STDIN") as copy:
+                for i in range(1, counts["products"] + 1):
+                    prices[i] = Decimal(rng.randrange(100, 50000)) / 100
+                    copy.write_row((i, fake.catch_phrase(), rng.choice(CATEGORIES), prices[i]))
+
+            with cur.copy(f"COPY {BENCH_SCHEMA}.orders (id, customer_id, ordered_at, status) FROM STDIN") as copy:
+                for i in range(1, counts["orders"] + 1):
+                    copy.write_row((
+                        i, rng.randint(1, counts["customers"]),
+                        start + timedelta(seconds=rng.randrange(span_seconds)), rng.choice(STATUSES),
+                    ))
+
+            with cur.copy(f"COPY {BENCH_SCHEMA}.order_items (order_id, product_id, quantity, unit_price) FROM STDIN") as copy:
+                for order_id in range(1, counts["orders"] + 1):
+                    for _ in range(rng.randint(*ITEMS_PER_ORDER)):
+                        product_id = rng.randint(1, counts["products"])
+                        copy.write_row((order_id, product_id, rng.randint(1, 4), prices[product_id]))
+                        item_rows += 1
+
+        conn.execute(INDEXES)
+
+    invalidate_schema_cache()
+    return {**counts, "order_items": item_rows}
@@ -0,0 +1,103 @@
+import json
+import math
+import resource
+import sys
+from typing import List, Dict, Any, Optional
+
+from src.benchmarks.drivers import RequestSample
+from src.tools.telemetry import metrics
+
+# ───────────────────────────────────────────────────────────────
+# Summary statistics
+# ───────────────────────────────────────────────────────────────
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _breakdown(name: str, label: str) -> Dict[str, Dict[str, float]]:
+    """Mean milliseconds and call count per label value of a seconds histogram."""
+    out = {}
+    for labels, (total, count) in metrics.totals(name).items():
+        key = dict(labels).get(label, "")
+        if count:
+            out[key] = {"mean_ms": round(total / count * 1000, 2), "calls": int(count)}
+    return out
+
+def summarize(samples: List[RequestSample], wall: float, traced_peak_bytes: Optional[int] = None) -> Dict[str, Any]:
+    ok = [s for s in samples if s.ok]
+    latencies = sorted(s.latency * 1000 for s in ok)
+    hops = sorted(s.hops for s in ok if s.hops is not None)
+    errors = [s.error for s in samples if not s.ok]
+    return {
+        "requests": len(samples),
+        "errors": len(errors),
+        "error_examples": errors[:3],
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(ok) / wall, 2) if wall else None,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else None,
+        },
+        "hops": {
+            "mean": round(sum(hops) / len(hops), 2) if hops else None,
+            "p95": percentile(hops, 95),
+        },
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_traced_mb": round(traced_peak_bytes / 1e6, 1) if traced_peak_bytes is not None else None,
+        # Where the time went, from the telemetry histograms
+        "nodes": _breakdown("agent_node_seconds", "node"),
+        "llm": _breakdown("agent_llm_seconds", "agent"),
+        "db": _breakdown("agent_db_seconds", "operation"),
+    }
+
+# ───────────────────────────────────────────────────────────────
+# Baseline comparison
+# ───────────────────────────────────────────────────────────────
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Lists regressions beyond `tolerance` (fractional) against a saved
+    report: higher p50/p95/p99 latency or peak RSS, or lower throughput.
+    """
+    regressions = []
+    for key in ("p50", "p95", "p99"):
+        current, previous = report["latency_ms"][key], baseline["latency_ms"].get(key)
+        if current is not None and previous and current > previous * (1 + tolerance):
+            regressions.append(f"latency {key}: {previous:.1f}ms -> {current:.1f}ms")
+    current, previous = report["throughput_rps"], baseline.get("throughput_rps")
+    if current is not None and previous and current < previous * (1 - tolerance):
+        regressions.append(f"throughput: {previous:.2f} -> {current:.2f} req/s")
+    current, previous = report["peak_rss_mb"], baseline.get("peak_rss_mb")
+    if previous and current > previous * (1 + tolerance):
+        regressions.append(f"peak RSS: {previous:.1f}MB -> {current:.1f}MB")
+    return regressions
+
+def format_report(report: Dict[str, Any]) -> str:
+    latency = report["latency_ms"]
+    lines = [
+        f"requests={report['requests']} errors={report['errors']} wall={report['wall_seconds']}s "
+        f"throughput={report['throughput_rps']} req/s",
+        f"latency ms: p50={latency['p50']} p95={latency['p95']} p99={latency['p99']} max={latency['max']}",
+        f"hops: mean={report['hops']['mean']} p95={report['hops']['p95']}",
+        f"memory: peak_rss={report['peak_rss_mb']}MB traced_peak={report['peak_traced_mb']}MB",
+    ]
+    for section in ("nodes", "llm", "db"):
+        for name, values in sorted(report[section].items()):
+            lines.append(f"  {section}.{name}: {values['mean_ms']}ms x{values['calls']}")
+    return "\n".join(lines)
+
+def load_report(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
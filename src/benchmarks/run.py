@@ -0,0 +1,85 @@
+"""
+Offline benchmark for the agent workflow: scripted LLMs, a seeded local
+Postgres fixture, and invoke or /chat drivers at configurable concurrency.
+
+    python -m src.benchmarks.run --driver invoke --requests 200 --concurrency 8 --latency-ms 300
+    python -m src.benchmarks.run --driver chat --mode direct --output bench.json --baseline main.json
+
+Connects with the usual DB_* variables; the fixture lives in the "bench" schema.
+"""
+import os
+import sys
+import json
+import argparse
+import tracemalloc
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline workflow benchmark (no OpenAI calls).")
+    parser.add_argument("--driver", choices=["invoke", "chat"], default="invoke")
+    parser.add_argument("--mode", choices=["orchestrated", "direct"], default="orchestrated")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Injected delay per scripted LLM call.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Fixture size multiplier (1.0 = 5,000 orders).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the existing bench schema.")
+    parser.add_argument("--base-url", default=None, help="Benchmark a running server instead of in-process ASGI.")
+    parser.add_argument("--llm-cache", action="store_true", help="Keep the LLM response cache enabled.")
+    parser.add_argument("--result-cache", action="store_true", help="Keep the query result cache enabled.")
+    parser.add_argument("--trace-memory", action="store_true", help="Track Python allocation peak with tracemalloc (slower).")
+    parser.add_argument("--output", default=None, help="Write the JSON report here.")
+    parser.add_argument("--baseline", default=None, help="Compare against a previous JSON report.")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed fractional regression vs. the baseline.")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    # Settings are read at import time, so they must be in place before importing the workflow
+    # (.env first; the forced cache switches below override it)
+    from src.tools.env import load_env
+    load_env()
+    os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+    os.environ.setdefault("TELEMETRY_LOG_SAMPLE_RATE", "0")
+    os.environ["LLM_CACHE_ENABLED"] = "true" if args.llm_cache else "false"
+    os.environ["RESULT_CACHE_ENABLED"] = "true" if args.result_cache else "false"
+
+    from src.benchmarks.fake_llm import SCENARIOS, install_scripted_llms
+    from src.benchmarks.fixture import seed_fixture
+    from src.benchmarks.drivers import run_invoke, run_chat
+    from src.benchmarks.report import summarize, compare, format_report, load_report
+
+    if not args.skip_seed and args.base_url is None:
+        counts = seed_fixture(args.scale, args.seed)
+        print(f"Seeded bench schema: {counts}")
+
+    install_scripted_llms(latency=args.latency_ms / 1000)
+    questions = [scenario["question"] for scenario in SCENARIOS]
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    if args.driver == "invoke":
+        samples, wall = run_invoke(questions, args.requests, args.concurrency, args.mode)
+    else:
+        samples, wall = run_chat(questions, args.requests, args.concurrency, args.mode, args.base_url)
+
+    traced_peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+    report = summarize(samples, wall, traced_peak)
+    report["config"] = {k: v for k, v in vars(args).items() if k not in ("output", "baseline")}
+
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        regressions = compare(report, load_report(args.baseline), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0 if report["errors"] == 0 else 2
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+import os
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from typing import Optional, Dict, Any, Iterator, AsyncIterator, List, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    WRITES_IDX_MAP,
+    get_checkpoint_id,
+)
+
+from src.tools.columnar import ColumnarResult
+from src.tools.history import history_length
+
+# ───────────────────────────────────────────────────────────────
+# Settings
+# ───────────────────────────────────────────────────────────────
+
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "sqlite")  # "sqlite" or "none"
+CHECKPOINT_SQLITE_PATH = os.getenv("CHECKPOINT_SQLITE_PATH", "checkpoints.db")
+# Checkpoints kept per run; resuming only needs the latest one and its pending writes
+CHECKPOINT_KEEP_PER_THREAD = int(os.getenv("CHECKPOINT_KEEP_PER_THREAD", "2"))
+# Runs left unfinished longer than this are pruned
+CHECKPOINT_TTL = float(os.getenv("CHECKPOINT_TTL", "86400"))
+# Larger query_results are left out of checkpoints and re-fetched on resume
+CHECKPOINT_MAX_RESULT_ROWS = int(os.getenv("CHECKPOINT_MAX_RESULT_ROWS", "200"))
+
+# ───────────────────────────────────────────────────────────────
+# Compact state encoding
+# ───────────────────────────────────────────────────────────────
+
+def compact_channel_values(values: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Drops bulky query_results from a checkpoint's channel values (marking
+    results_omitted so the rows are re-fetched when needed) and stores small
+    columnar results in their JSON form.
+    """
+    results = values.get("query_results")
+    if results is None:
+        return values
+    values = dict(values)
+    # Sessions restored from JSON hold columnar results as {"columns", "data", "row_count"}
+    rows = results["row_count"] if isinstance(results, dict) else len(results)
+    if rows > CHECKPOINT_MAX_RESULT_ROWS:
+        values["query_results"] = None
+        values["results_omitted"] = True
+    elif isinstance(results, ColumnarResult):
+        values["query_results"] = results.to_json_dict()
+    return values
+
+def compact_writes(writes: Sequence[Tuple[str, Any]]) -> List[Tuple[str, Any]]:
+    """
+    Applies compact_channel_values to a task's pending writes. Nodes return
+    the whole state, so every hop writes query_results again; an omitted
+    result also writes results_omitted=True.
+    """
+    writes = list(writes)
+    channels = [channel for channel, _ in writes]
+    if "query_results" not in channels:
+        return writes
+    i = channels.index("query_results")
+    compacted = compact_channel_values({"query_results": writes[i][1]})
+    writes[i] = ("query_results", compacted["query_results"])
+    if compacted.get("results_omitted"):
+        if "results_omitted" in channels:
+            writes[channels.index("results_omitted")] = ("results_omitted", True)
+        else:
+            writes.append(("results_omitted", True))
+    return writes
+
+def turn_thread_id(session_id: str, state: Dict[str, Any], user_input: str) -> str:
+    """
+    Checkpoint thread for one turn of a session. Retrying the same turn
+    (same history position and input) maps to the same thread and resumes
+    it; a new turn starts a fresh run.
+    """
+    digest = hashlib.sha256(user_input.encode("utf-8")).hexdigest()[:12]
+    return f"{session_id}:{history_length(state)}:{digest}"
+
+# ───────────────────────────────────────────────────────────────
+# SQLite checkpointer
+# ───────────────────────────────────────────────────────────────
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver):
+    """
+    LangGraph checkpointer on a local SQLite file (WAL mode). Keeps the
+    newest CHECKPOINT_KEEP_PER_THREAD checkpoints of each run and prunes
+    runs idle past CHECKPOINT_TTL. Async methods run the sync ones in a
+    worker thread.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_SQLITE_PATH, keep: int = CHECKPOINT_KEEP_PER_THREAD, ttl: float = CHECKPOINT_TTL):
+        super().__init__()
+        self.keep = keep
+        self.ttl = ttl
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            " thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,"
+            " parent_checkpoint_id TEXT, session_id TEXT, type TEXT, checkpoint BLOB, metadata_type TEXT,"
+            " metadata BLOB, updated_at REAL NOT NULL, PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS writes ("
+            " thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,"
+            " task_id TEXT NOT NULL, idx INTEGER NOT NULL, channel TEXT NOT NULL, type TEXT, value BLOB,"
+            " PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS checkpoints_updated ON checkpoints (updated_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS checkpoints_session ON checkpoints (session_id)")
+
+    # ─── Reads ───
+
+    def _tuple(self, row) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, blob, metadata_type, metadata = row
+        with self._lock:
+            writes = self._conn.execute(
+                "SELECT task_id, channel, type, value FROM writes"
+                " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint=self.serde.loads_typed((type_, blob)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((t, v))) for task_id, channel, t, v in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        configurable = config["configurable"]
+        thread_id, checkpoint_ns = configurable["thread_id"], configurable.get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        columns = "thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+        with self._lock:
+            if checkpoint_id:
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+                    " ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+        return self._tuple(row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata FROM checkpoints"
+        where, params = [], []
+        if config is not None:
+            where.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if "checkpoint_ns" in config["configurable"]:
+                where.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+        if before is not None:
+            where.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        yielded = 0
+        for row in rows:
+            if limit is not None and yielded >= limit:
+                break
+            item = self._tuple(row)
+            if filter and any(item.metadata.get(k) != v for k, v in filter.items()):
+                continue
+            yielded += 1
+            yield item
+
+    # ─── Writes ───
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        configurable = config["configurable"]
+        thread_id, checkpoint_ns = configurable["thread_id"], configurable.get("checkpoint_ns", "")
+        checkpoint = {**checkpoint, "channel_values": compact_channel_values(checkpoint["channel_values"])}
+        type_, blob = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_blob = self.serde.dumps_typed(metadata)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id, checkpoint_ns, checkpoint["id"], configurable.get("checkpoint_id"),
+                    configurable.get("session_id", thread_id), type_, blob, metadata_type, metadata_blob, now,
+                ),
+            )
+            self._prune_thread(thread_id, checkpoint_ns)
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._prune_expired(now)
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        configurable = config["configurable"]
+        key = (configurable["thread_id"], configurable.get("checkpoint_ns", ""), configurable["checkpoint_id"])
+        writes = compact_writes(writes)
+        rows = []
+        for i, (channel, value) in enumerate(writes):
+            type_, blob = self.serde.dumps_typed(value)
+            rows.append((*key, task_id, WRITES_IDX_MAP.get(channel, i), channel, type_, blob))
+        # Special channels (errors, interrupts) replace earlier writes; regular ones are written once
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        with self._lock:
+            self._conn.executemany(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    # ─── Pruning ───
+
+    def _prune_thread(self, thread_id: str, checkpoint_ns: str) -> None:
+        stale = self._conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+            " ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep),
+        ).fetchall()
+        for (checkpoint_id,) in stale:
+            for table in ("checkpoints", "writes"):
+                self._conn.execute(
+                    f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                )
+
+    def _prune_expired(self, now: float) -> None:
+        expired = self._conn.execute(
+            "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(updated_at) < ?",
+            (now - self.ttl,),
+        ).fetchall()
+        for (thread_id,) in expired:
+            self._delete(thread_id)
+
+    def _delete(self, thread_id: str) -> None:
+        self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+        self._conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Drops a run's checkpoints (e.g. once the turn has completed)."""
+        with self._lock:
+            self._delete(thread_id)
+
+    def delete_session(self, session_id: str) -> None:
+        with self._lock:
+            threads = self._conn.execute(
+                "SELECT DISTINCT thread_id FROM checkpoints WHERE session_id = ?", (session_id,)
+            ).fetchall()
+            for (thread_id,) in threads:
+                self._delete(thread_id)
+
+    # ─── Async variants ───
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+# ───────────────────────────────────────────────────────────────
+# Shared instance (created on first use)
+# ───────────────────────────────────────────────────────────────
+
+_checkpointer: Optional[SQLiteCheckpointSaver] = None
+_checkpointer_lock = threading.Lock()
+
+def get_checkpointer() -> Optional[SQLiteCheckpointSaver]:
+    """Returns the process-wide checkpointer, or None when CHECKPOINT_BACKEND is "none"."""
+    global _checkpointer
+    if CHECKPOINT_BACKEND != "sqlite":
+        return None
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                _checkpointer = SQLiteCheckpointSaver()
+    return _checkpointer
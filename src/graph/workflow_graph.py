@@ -1,17 +1,31 @@
-import pprint
+import logging
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, START, END
-from typing import TypedDict, Optional, List, Dict
+from typing import TypedDict, Optional, List, Dict, Tuple, Union
 
 # Import agent logic from agents/
-from src.agents.orchestrator_agent import route_request, OrchestratorResponse
-from src.agents.postgresql_writer import generate_query
-from src.agents.postgresql_checker import validate_query
-from src.agents.executor_agent import execute_query
-from src.agents.analyst_agent import analyze_request, AnalystDependencies
+from src.agents.orchestrator_agent import route_request, aroute_request, OrchestratorResponse
+from src.agents.postgresql_writer import (
+    generate_query, agenerate_query, PostgreSQLWriterDependencies, WRITER_CANDIDATES, WRITER_RETRY_CANDIDATES
+)
+from src.agents.postgresql_checker import validate_query, avalidate_query, PostgreSQLCheckerDependencies
+from src.agents.executor_agent import execute_query, aexecute_query, ExecutorDependencies
+from src.agents.analyst_agent import analyze_request, aanalyze_request, AnalystDependencies
+from src.tools.schema import get_schema_snapshot, aget_schema_snapshot
+from src.tools.schema_selector import select_schema_context, get_schema_index, SchemaIndex
+from src.tools.result_profile import profile_result
+from src.tools.columnar import ColumnarResult
+from src.tools.telemetry import timed, record_hop, log_event
+from src.tools.history import compact_history
+from src.graph.checkpoints import get_checkpointer
+from src.agents.fast_router import fast_route, is_first_hop, RouteDecision
 
 # Max retries to prevent looping
 MAX_RETRIES = 3
 
+# Max checker-suggested rewrites tried in pipeline mode before falling back to the orchestrator
+MAX_FIX_ATTEMPTS = 2
+
 # ───────────────────────────────────────────────────────────────
 # Define the shared LangGraph state
 # ───────────────────────────────────────────────────────────────
@@ -21,152 +35,454 @@ class WorkflowState(TypedDict):
     decision: Optional[str] = None
     follow_up_question: Optional[str] = None
     sql_query: Optional[str] = None
-    query_results: Optional[List[Dict]] = None
+    query_results: Optional[Union[List[Dict], ColumnarResult]] = None
+    results_omitted: Optional[bool]  # query_results was too large to checkpoint; re-fetched on resume
     validated: Optional[bool] = None
     analysis: Optional[Dict] = None
     executor_response: Optional[Dict] = None
     retry_count: Optional[int]
-    message_history: Optional[List[Dict[str, str]]]
+    message_history: Optional[List[Dict[str, str]]]  # Recent messages, kept verbatim within HISTORY_TOKEN_BUDGET
+    history_summary: Optional[str]  # Rolling summary of the messages folded out of message_history
+    history_offset: Optional[int]  # Number of messages folded into the summary
     in_analyst_mode: Optional[bool]
+    stream_results: Optional[bool]
+    columnar_results: Optional[bool]  # Executor returns a ColumnarResult instead of List[dict]
+    export_format: Optional[str]  # "csv" or "binary": rows are exported with COPY after the graph runs
+    last_node: Optional[str]  # Worker node that ran last in the current turn (None at turn start)
+    suggested_fix: Optional[str]
+    fix_attempts: Optional[int]
+    validation_error: Optional[str]  # PostgreSQL error or budget rejection reason for the last query
 
 # ───────────────────────────────────────────────────────────────
 # Define LangGraph node functions
 # ───────────────────────────────────────────────────────────────
 
-def orchestrate(state: WorkflowState) -> WorkflowState:
-    retry_count = state.get("retry_count", 0)
-    history = state.get("message_history", [])
-    in_analyst_mode = state.get("in_analyst_mode", False)
-
-    if retry_count >= MAX_RETRIES:
-        print(f"Max retries ({MAX_RETRIES}) reached. Ending workflow.")
+def _max_retries_reached(state: WorkflowState) -> Optional[WorkflowState]:
+    if state.get("retry_count", 0) >= MAX_RETRIES:
+        log_event("max_retries_reached", logging.WARNING, max_retries=MAX_RETRIES)
         return {
             **state,
             "decision": "complete",
             "follow_up_question": "We weren't able to process your request after several attempts. Please try again with more clarity."
         }
+    return None
 
-    # Append user input to history
-    history.append({
-        "role": "user",
-        "content": state["user_input"]
-    })
+def _compacted_history(state: WorkflowState, history: List[Dict[str, str]]) -> Dict:
+    compacted = compact_history(history, state.get("history_summary"), state.get("history_offset") or 0)
+    return {
+        "message_history": compacted.messages,
+        "history_summary": compacted.summary,
+        "history_offset": compacted.offset
+    }
+
+def _prepare_orchestrator_input(state: WorkflowState) -> Tuple[str, Dict]:
+    history = state.get("message_history", [])
+
+    # Append user input to history (once per turn, not on every hop)
+    if is_first_hop(state):
+        history.append({
+            "role": "user",
+            "content": state["user_input"]
+        })
 
     # If already in analyst mode, instruct the orchestrator accordingly
-    if in_analyst_mode:
+    if state.get("in_analyst_mode", False):
         orchestrator_input = f"(You are currently in analyst mode)\nUser: {state['user_input']}"
     else:
         orchestrator_input = state["user_input"]
 
-    response: OrchestratorResponse = route_request(orchestrator_input, history)
+    # Older turns are folded into the summary before the prompt is built
+    return orchestrator_input, _compacted_history(state, history)
 
+def _apply_orchestrator_decision(
+    state: WorkflowState, memory: Dict, response: OrchestratorResponse
+) -> WorkflowState:
     # Append assistant response to history
-    history.append({
+    memory["message_history"].append({
         "role": "assistant",
         "content": response.follow_up_question or f"Decision: {response.decision}"
     })
 
     # Handle analyst mode toggle based on decision
-    new_in_analyst_mode = in_analyst_mode
-    if response.decision == "analyst":
-        new_in_analyst_mode = True
-    elif response.decision != "analyst":
-        new_in_analyst_mode = False
+    new_in_analyst_mode = response.decision == "analyst"
 
     return {
         **state,
+        **memory,
         "decision": response.decision,
         "follow_up_question": response.follow_up_question,
-        "message_history": history,
-        "retry_count": retry_count + 1,
+        "retry_count": state.get("retry_count", 0) + 1,
         "in_analyst_mode": new_in_analyst_mode
     }
 
+def _apply_fast_route(state: WorkflowState, route: RouteDecision) -> WorkflowState:
+    # Local decisions are not retries and add no "Decision: X" bookkeeping to the history
+    history = state.get("message_history", [])
+    if is_first_hop(state):
+        history.append({"role": "user", "content": state["user_input"]})
+
+    log_event("fast_route", source=route.source, decision=route.decision, confidence=round(route.confidence, 2))
+
+    return {
+        **state,
+        **_compacted_history(state, history),
+        "decision": route.decision,
+        "follow_up_question": None,
+        "in_analyst_mode": route.decision == "analyst"
+    }
+
+def _load_schema_index() -> Optional[SchemaIndex]:
+    try:
+        return get_schema_index(get_schema_snapshot())
+    except Exception as e:
+        log_event("schema_unavailable", logging.WARNING, error=str(e))
+        return None
+
+async def _aload_schema_index() -> Optional[SchemaIndex]:
+    try:
+        return get_schema_index(await aget_schema_snapshot())
+    except Exception as e:
+        log_event("schema_unavailable", logging.WARNING, error=str(e))
+        return None
+
+def orchestrate(state: WorkflowState) -> WorkflowState:
+    stopped = _max_retries_reached(state)
+    if stopped is not None:
+        return stopped
+
+    route = fast_route(state, _load_schema_index() if is_first_hop(state) else None)
+    if route is not None:
+        return _apply_fast_route(state, route)
+
+    orchestrator_input, memory = _prepare_orchestrator_input(state)
+    response: OrchestratorResponse = route_request(orchestrator_input, memory["message_history"], memory["history_summary"])
+    return _apply_orchestrator_decision(state, memory, response)
+
+async def aorchestrate(state: WorkflowState) -> WorkflowState:
+    stopped = _max_retries_reached(state)
+    if stopped is not None:
+        return stopped
+
+    route = fast_route(state, await _aload_schema_index() if is_first_hop(state) else None)
+    if route is not None:
+        return _apply_fast_route(state, route)
+
+    orchestrator_input, memory = _prepare_orchestrator_input(state)
+    response: OrchestratorResponse = await aroute_request(orchestrator_input, memory["message_history"], memory["history_summary"])
+    return _apply_orchestrator_decision(state, memory, response)
+
+def _writer_deps(state: WorkflowState, schema) -> PostgreSQLWriterDependencies:
+    # A query rejected by PostgreSQL is sent back with its error so the rewrite can fix it
+    rejected = state.get("validation_error")
+    return PostgreSQLWriterDependencies(
+        user_request=state["user_input"],
+        database_schema=select_schema_context(schema, state["user_input"]),
+        schema_version=schema.version,
+        previous_query=state.get("sql_query") if rejected else None,
+        previous_error=rejected,
+        # A rewrite after a rejection compares several candidates by planner cost
+        candidates=WRITER_RETRY_CANDIDATES if rejected or state.get("validated") is False else WRITER_CANDIDATES
+    )
+
+def _writer_update(state: WorkflowState, result) -> WorkflowState:
+    return {
+        **state,
+        "sql_query": result.sql_query,
+        "validated": None,
+        "validation_error": None,
+        "fix_attempts": (state.get("fix_attempts") or 0) + 1 if state.get("validation_error") else 0,
+        "last_node": "postgresql_writer"
+    }
+
 def handle_writer(state: WorkflowState) -> WorkflowState:
-    result = generate_query({
-        "user_request": state["user_input"]
-    })
-    return {**state, "sql_query": result.sql_query}
+    result = generate_query(_writer_deps(state, get_schema_snapshot()))
+    return _writer_update(state, result)
+
+async def ahandle_writer(state: WorkflowState) -> WorkflowState:
+    result = await agenerate_query(_writer_deps(state, await aget_schema_snapshot()))
+    return _writer_update(state, result)
+
+def _checker_deps(state: WorkflowState, schema) -> PostgreSQLCheckerDependencies:
+    return PostgreSQLCheckerDependencies(
+        user_request=state["user_input"],
+        sql_query=state["sql_query"],
+        # Rank against the SQL too so every table it references is included
+        database_schema=select_schema_context(schema, f"{state['user_input']} {state['sql_query']}"),
+        schema_version=schema.version
+    )
+
+def _checker_update(state: WorkflowState, result) -> WorkflowState:
+    plan = result.plan
+    return {
+        **state,
+        "validated": result.is_valid,
+        "suggested_fix": result.suggested_fix,
+        "validation_error": plan.error if plan is not None and not plan.ok else None,
+        "last_node": "postgresql_checker"
+    }
 
 def handle_checker(state: WorkflowState) -> WorkflowState:
-    result = validate_query({
-        "user_request": state["user_input"],
-        "sql_query": state["sql_query"]
-    })
-    return {**state, "validated": result.is_valid}
+    result = validate_query(_checker_deps(state, get_schema_snapshot()))
+    return _checker_update(state, result)
 
-def handle_executor(state: WorkflowState) -> WorkflowState:
-    result = execute_query({"sql_query": state["sql_query"]})
+async def ahandle_checker(state: WorkflowState) -> WorkflowState:
+    result = await avalidate_query(_checker_deps(state, await aget_schema_snapshot()))
+    return _checker_update(state, result)
+
+def _executor_deps(state: WorkflowState) -> ExecutorDependencies:
+    return ExecutorDependencies(
+        sql_query=state["sql_query"],
+        stream=bool(state.get("stream_results")),
+        columnar=bool(state.get("columnar_results")),
+        export_format=state.get("export_format")
+    )
+
+def _executor_update(state: WorkflowState, result) -> WorkflowState:
+    # Over-budget rejections go back to the writer like a database error would
+    admission = result.admission
+    rejected = admission is not None and not admission.admitted
     return {
         **state,
-        "executor_response": result.dict(),
-        "query_results": result.results
+        # Rows live only in query_results; copying them into executor_response doubled memory
+        "executor_response": result.dict(exclude={"results"}),
+        "query_results": result.results,
+        "results_omitted": False,
+        "validation_error": admission.reason if rejected else None,
+        "last_node": "executor"
     }
 
+def handle_executor(state: WorkflowState) -> WorkflowState:
+    return _executor_update(state, execute_query(_executor_deps(state)))
+
+async def ahandle_executor(state: WorkflowState) -> WorkflowState:
+    return _executor_update(state, await aexecute_query(_executor_deps(state)))
+
+def restore_results(state: WorkflowState) -> WorkflowState:
+    """
+    Re-runs a successful query whose rows were left out of the checkpoint
+    the run resumed from (served by the result cache when still warm).
+    """
+    if not state.get("results_omitted"):
+        return state
+    return _executor_update(state, execute_query(_executor_deps(state)))
+
+async def arestore_results(state: WorkflowState) -> WorkflowState:
+    if not state.get("results_omitted"):
+        return state
+    return _executor_update(state, await aexecute_query(_executor_deps(state)))
+
+def _analyst_deps(state: WorkflowState) -> AnalystDependencies:
+    # The analyst sees a fixed-size statistical profile rather than raw rows
+    rows = state.get("query_results")
+    truncated = bool((state.get("executor_response") or {}).get("truncated"))
+    return AnalystDependencies(
+        user_request=state["user_input"],
+        sql_query=state.get("sql_query"),
+        data_profile=profile_result(rows, truncated=truncated).to_prompt() if rows else None
+    )
+
 def handle_analyst(state: WorkflowState) -> WorkflowState:
-    result = analyze_request(AnalystDependencies(
-        user_request=state["user_input"]
-    ))
-    return {**state, "analysis": result.dict()}
+    state = restore_results(state)
+    result = analyze_request(_analyst_deps(state))
+    return {**state, "analysis": result.dict(), "last_node": "analyst"}
+
+async def ahandle_analyst(state: WorkflowState) -> WorkflowState:
+    state = await arestore_results(state)
+    result = await aanalyze_request(_analyst_deps(state))
+    return {**state, "analysis": result.dict(), "last_node": "analyst"}
+
+def apply_fix(state: WorkflowState) -> WorkflowState:
+    """Replaces a rejected query with the checker's suggested fix for re-checking."""
+    return {
+        **state,
+        "sql_query": state["suggested_fix"],
+        "suggested_fix": None,
+        "validated": None,
+        "fix_attempts": (state.get("fix_attempts") or 0) + 1,
+        "last_node": "apply_fix"
+    }
+
+def finish_pipeline(state: WorkflowState) -> WorkflowState:
+    """Ends a direct-mode turn; the orchestrator's entry decision would otherwise still name the writer."""
+    return {**state, "decision": "complete"}
 
 # ───────────────────────────────────────────────────────────────
-# Logging for testing visibility
+# Per-node tracing
 # ───────────────────────────────────────────────────────────────
 
-pp = pprint.PrettyPrinter(indent=2)
+def node_summary(state: WorkflowState) -> Dict:
+    # Small scalar fields only; rows and history are summarized by size
+    results = state.get("query_results")
+    return {
+        "decision": state.get("decision"),
+        "validated": state.get("validated"),
+        "retry_count": state.get("retry_count"),
+        "fix_attempts": state.get("fix_attempts"),
+        "result_rows": len(results) if results is not None else None,
+        "history_messages": len(state.get("message_history") or []),
+    }
 
-def log_node(name: str, fn):
+def log_node(name: str, fn, afn=None):
+    """
+    Wraps a node's sync (and optionally async) implementation with timing
+    (agent_node_seconds), hop counting and a sampled structured log event.
+    The returned runnable uses `fn` under app.invoke and `afn` under app.ainvoke.
+    """
     def wrapped(state: WorkflowState) -> WorkflowState:
-        print(f"\n--- ENTERING NODE: {name.upper()} ---")
-        print("Input:")
-        pp.pprint({k: v for k, v in state.items() if v is not None})
+        record_hop()
+        with timed("node", node=name) as span:
+            result = fn(state)
+            span.update(node_summary(result))
+        return result
 
-        result = fn(state)
+    if afn is None:
+        return wrapped
 
-        print(f"\n--- EXITING NODE: {name.upper()} ---")
-        print("Output:")
-        pp.pprint({k: v for k, v in result.items() if v is not None})
+    async def awrapped(state: WorkflowState) -> WorkflowState:
+        record_hop()
+        with timed("node", node=name) as span:
+            result = await afn(state)
+            span.update(node_summary(result))
         return result
-    return wrapped
+
+    return RunnableLambda(wrapped, afunc=awrapped, name=name)
 
 # ───────────────────────────────────────────────────────────────
 # Build the stateful LangGraph
 # ───────────────────────────────────────────────────────────────
 
-workflow = StateGraph(WorkflowState)
-
-# Register core nodes with logging
-workflow.add_node("orchestrator", log_node("orchestrator", orchestrate))
-workflow.add_node("postgresql_writer", log_node("postgresql_writer", handle_writer))
-workflow.add_node("postgresql_checker", log_node("postgresql_checker", handle_checker))
-workflow.add_node("executor", log_node("executor", handle_executor))
-workflow.add_node("analyst", log_node("analyst", handle_analyst))
-
-# Define the entry point of the workflow
-workflow.add_edge(START, "orchestrator")
-
-# Add routing logic based on orchestrator decision
-workflow.add_conditional_edges(
-    "orchestrator",
-    lambda state: state["decision"],
-    {
-        "postgresql_writer": "postgresql_writer",
-        "postgresql_checker": "postgresql_checker",
-        "executor": "executor",
-        "analyst": "analyst",
-        "follow_up": "orchestrator",
-        "complete": END  # End the workflow
-    }
-)
+def _add_core_nodes(workflow: StateGraph) -> None:
+    # Register core nodes with logging (sync for app.invoke, async for app.ainvoke)
+    workflow.add_node("orchestrator", log_node("orchestrator", orchestrate, aorchestrate))
+    workflow.add_node("postgresql_writer", log_node("postgresql_writer", handle_writer, ahandle_writer))
+    workflow.add_node("postgresql_checker", log_node("postgresql_checker", handle_checker, ahandle_checker))
+    workflow.add_node("executor", log_node("executor", handle_executor, ahandle_executor))
+    workflow.add_node("analyst", log_node("analyst", handle_analyst, ahandle_analyst))
+
+def build_workflow() -> StateGraph:
+    """
+    Orchestrated mode: every worker node hands control back to the
+    orchestrator, which decides the next step.
+    """
+    workflow = StateGraph(WorkflowState)
+    _add_core_nodes(workflow)
+
+    # Define the entry point of the workflow
+    workflow.add_edge(START, "orchestrator")
+
+    # Add routing logic based on orchestrator decision
+    workflow.add_conditional_edges(
+        "orchestrator",
+        lambda state: state["decision"],
+        {
+            "postgresql_writer": "postgresql_writer",
+            "postgresql_checker": "postgresql_checker",
+            "executor": "executor",
+            "analyst": "analyst",
+            "follow_up": "orchestrator",
+            "complete": END  # End the workflow
+        }
+    )
+
+    # Add edges returning to orchestrator after each subtask
+    workflow.add_edge("postgresql_writer", "orchestrator")
+    workflow.add_edge("postgresql_checker", "orchestrator")
+    workflow.add_edge("executor", "orchestrator")
+    workflow.add_edge("analyst", "orchestrator")
+
+    return workflow
+
+def route_after_checker(state: WorkflowState) -> str:
+    if state.get("validated"):
+        return "executor"
+    if (state.get("fix_attempts") or 0) >= MAX_FIX_ATTEMPTS:
+        return "orchestrator"
+    if state.get("validation_error"):
+        return "postgresql_writer"  # Rewrite using the real database error
+    if state.get("suggested_fix"):
+        return "apply_fix"
+    return "orchestrator"
+
+def route_after_executor(state: WorkflowState) -> str:
+    if (state.get("executor_response") or {}).get("success"):
+        return "analyst"
+    if state.get("validation_error") and (state.get("fix_attempts") or 0) < MAX_FIX_ATTEMPTS:
+        return "postgresql_writer"  # Ask for a cheaper query that fits the budget
+    return "orchestrator"
 
-# Add edges returning to orchestrator after each subtask
-workflow.add_edge("postgresql_writer", "orchestrator")
-workflow.add_edge("postgresql_checker", "orchestrator")
-workflow.add_edge("executor", "orchestrator")
-workflow.add_edge("analyst", "orchestrator")
+def build_pipeline_workflow() -> StateGraph:
+    """
+    Direct query mode: writer -> checker -> executor -> analyst wired with
+    conditional edges. A query PostgreSQL rejects goes back to the writer
+    with the real error; one the LLM checker rejects is replaced by its
+    suggested fix. Either is re-checked up to MAX_FIX_ATTEMPTS times; the orchestrator is only
+    consulted at entry and when a step fails.
+    """
+    workflow = StateGraph(WorkflowState)
+    _add_core_nodes(workflow)
+    workflow.add_node("apply_fix", log_node("apply_fix", apply_fix))
+    workflow.add_node("finish", log_node("finish", finish_pipeline))
+
+    workflow.add_edge(START, "orchestrator")
+
+    workflow.add_conditional_edges(
+        "orchestrator",
+        lambda state: state["decision"],
+        {
+            "postgresql_writer": "postgresql_writer",
+            "postgresql_checker": "postgresql_checker",
+            "executor": "executor",
+            "analyst": "analyst",
+            "follow_up": END,  # Return the question to the client instead of re-asking the LLM
+            "complete": END
+        }
+    )
+
+    workflow.add_edge("postgresql_writer", "postgresql_checker")
+    workflow.add_conditional_edges(
+        "postgresql_checker",
+        route_after_checker,
+        {
+            "executor": "executor",
+            "postgresql_writer": "postgresql_writer",
+            "apply_fix": "apply_fix",
+            "orchestrator": "orchestrator"
+        }
+    )
+    workflow.add_edge("apply_fix", "postgresql_checker")
+    workflow.add_conditional_edges(
+        "executor",
+        route_after_executor,
+        {"analyst": "analyst", "postgresql_writer": "postgresql_writer", "orchestrator": "orchestrator"}
+    )
+    workflow.add_edge("analyst", "finish")
+    workflow.add_edge("finish", END)
+
+    return workflow
 
 # ───────────────────────────────────────────────────────────────
-# Compile the workflow app
+# Compile the workflow apps
 # ───────────────────────────────────────────────────────────────
 
+workflow = build_workflow()
 app = workflow.compile()
+
+pipeline_app = build_pipeline_workflow().compile()
+
+_checkpointed_apps = {}
+
+def get_workflow_app(mode: str = "orchestrated", checkpointed: bool = False):
+    """
+    Returns the compiled graph for a /chat mode ("orchestrated" or "direct").
+    With `checkpointed`, the graph saves a checkpoint after every node
+    (invoke it with a thread_id); falls back to the plain graph when
+    CHECKPOINT_BACKEND is "none".
+    """
+    if checkpointed and get_checkpointer() is not None:
+        if mode not in _checkpointed_apps:
+            graph = build_pipeline_workflow() if mode == "direct" else build_workflow()
+            _checkpointed_apps[mode] = graph.compile(checkpointer=get_checkpointer())
+        return _checkpointed_apps[mode]
+    if mode == "direct":
+        return pipeline_app
+    return app
@@ -0,0 +1,231 @@
+import os
+import sys
+import json
+from array import array
+from collections.abc import Mapping
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Sequence
+
+import psycopg
+from pydantic_core import core_schema
+
+# ───────────────────────────────────────────────────────────────
+# Settings
+# ───────────────────────────────────────────────────────────────
+
+# Rows transposed into the column arrays per server-side cursor fetch
+COLUMNAR_FETCH_SIZE = int(os.getenv("DB_COLUMNAR_FETCH_SIZE", "5000"))
+
+# PostgreSQL type OIDs stored in typed arrays: int2/int4/int8 and float4/float8.
+# numeric stays a list of Decimal so no precision is lost.
+_TYPECODES = {21: "q", 23: "q", 20: "q", 700: "d", 701: "d"}
+
+# ───────────────────────────────────────────────────────────────
+# Row view
+# ───────────────────────────────────────────────────────────────
+
+class RowView(Mapping):
+    """
+    Read-only dict-like view of one row of a ColumnarResult. Values are
+    looked up in the column arrays on access; nothing is copied.
+    """
+
+    __slots__ = ("_result", "_index")
+
+    def __init__(self, result: "ColumnarResult", index: int):
+        self._result = result
+        self._index = index
+
+    def __getitem__(self, name: str) -> Any:
+        return self._result.value(self._result.positions[name], self._index)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._result.names)
+
+    def __len__(self) -> int:
+        return len(self._result.names)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+# ───────────────────────────────────────────────────────────────
+# Columnar result
+# ───────────────────────────────────────────────────────────────
+
+class ColumnarResult:
+    """
+    Query result stored column-major: a header of column names and types,
+    then one array per column. Integer and float columns use `array`
+    (8 bytes per value) with a null mask allocated only once a null is
+    seen; other types are plain lists. Column names are stored once
+    rather than once per row as with dict_row.
+    """
+
+    __slots__ = ("names", "types", "positions", "values", "nulls", "row_count")
+
+    def __init__(self, names: List[str], types: List[str], typecodes: List[Optional[str]]):
+        self.names = names
+        self.types = types
+        self.positions = {name: i for i, name in enumerate(names)}
+        self.values: List[Any] = [array(code) if code else [] for code in typecodes]
+        self.nulls: List[Optional[bytearray]] = [None] * len(names)
+        self.row_count = 0
+
+    @classmethod
+    def from_description(cls, description: Sequence[psycopg.Column]) -> "ColumnarResult":
+        """Builds an empty result from a cursor's column description."""
+        return cls(
+            names=[col.name for col in description],
+            types=[col.type_display for col in description],
+            typecodes=[_TYPECODES.get(col.type_code) for col in description],
+        )
+
+    @classmethod
+    def from_json_dict(cls, payload: Dict[str, Any]) -> "ColumnarResult":
+        """Rebuilds a result from to_json_dict() output, e.g. a session restored from JSON."""
+        columns = payload["columns"]
+        result = cls([c["name"] for c in columns], [c["type"] for c in columns], [None] * len(columns))
+        result.values = [list(values) for values in payload["data"]]
+        result.row_count = payload["row_count"]
+        return result
+
+    def append_batch(self, rows: Sequence[tuple]) -> None:
+        """Transposes a batch of tuple rows onto the end of the column arrays."""
+        if not rows:
+            return
+        start = self.row_count
+        for i, column in enumerate(zip(*rows)):
+            store = self.values[i]
+            if isinstance(store, array):
+                mask = self.nulls[i]
+                if None in column:
+                    if mask is None:
+                        mask = self.nulls[i] = bytearray(start)
+                    mask.extend(1 if v is None else 0 for v in column)
+                    store.extend(0 if v is None else v for v in column)
+                    continue
+                if mask is not None:
+                    mask.extend(bytes(len(column)))
+            store.extend(column)
+        self.row_count += len(rows)
+
+    # ── Access ──────────────────────────────────────────────────
+
+    def value(self, column: int, row: int) -> Any:
+        mask = self.nulls[column]
+        if mask is not None and mask[row]:
+            return None
+        return self.values[column][row]
+
+    def column(self, name: str) -> Sequence[Any]:
+        """
+        Values of one column, with None for nulls. Typed columns without
+        nulls are returned as the underlying array without copying.
+        """
+        i = self.positions[name]
+        store, mask = self.values[i], self.nulls[i]
+        if mask is None:
+            return store
+        return [None if null else v for v, null in zip(store, mask)]
+
+    def columns_dict(self) -> Dict[str, Sequence[Any]]:
+        return {name: self.column(name) for name in self.names}
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def __getitem__(self, index: int) -> RowView:
+        if index < 0:
+            index += self.row_count
+        if not 0 <= index < self.row_count:
+            raise IndexError("row index out of range")
+        return RowView(self, index)
+
+    def __iter__(self) -> Iterator[RowView]:
+        return (RowView(self, i) for i in range(self.row_count))
+
+    def to_rows(self, limit: Optional[int] = None) -> List[dict]:
+        """Materializes rows as dicts (the dict_row shape), optionally only the first `limit`."""
+        count = self.row_count if limit is None else min(limit, self.row_count)
+        return [dict(RowView(self, i)) for i in range(count)]
+
+    # ── Serialization ───────────────────────────────────────────
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        """
+        JSON-ready column-major form:
+        {"columns": [{"name", "type"}], "data": [[column values], ...], "row_count": n}
+        """
+        data = []
+        for name in self.names:
+            store = self.column(name)
+            data.append(store.tolist() if isinstance(store, array) else list(store))
+        return {
+            "columns": [{"name": n, "type": t} for n, t in zip(self.names, self.types)],
+            "data": data,
+            "row_count": self.row_count,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_json_dict(), default=str)
+
+    def nbytes(self) -> int:
+        """Approximate in-memory size; list columns are estimated from a sample."""
+        total = sys.getsizeof(self)
+        for store, mask in zip(self.values, self.nulls):
+            total += sys.getsizeof(store) + (sys.getsizeof(mask) if mask is not None else 0)
+            if isinstance(store, list) and store:
+                sample = store[:100]
+                total += int(sum(sys.getsizeof(v) for v in sample) / len(sample) * len(store))
+        return total
+
+    def __repr__(self) -> str:
+        return f"ColumnarResult(columns={self.names!r}, row_count={self.row_count})"
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source: Any, handler: Any) -> core_schema.CoreSchema:
+        # Carried through models and WorkflowState as-is; the JSON form is accepted back as a plain dict
+        return core_schema.union_schema(
+            [core_schema.is_instance_schema(cls), core_schema.dict_schema()],
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                lambda value: value.to_json_dict() if isinstance(value, ColumnarResult) else value
+            ),
+        )
+
+def json_default(value: Any) -> Any:
+    """`default=` hook for json.dumps that understands ColumnarResult."""
+    if isinstance(value, ColumnarResult):
+        return value.to_json_dict()
+    return str(value)
+
+# ───────────────────────────────────────────────────────────────
+# Fetching from a cursor
+# ───────────────────────────────────────────────────────────────
+
+def _batch_size(result: ColumnarResult, max_rows: Optional[int]) -> int:
+    if max_rows is None:
+        return COLUMNAR_FETCH_SIZE
+    return min(COLUMNAR_FETCH_SIZE, max_rows - len(result))
+
+def fetch_columnar(cur: psycopg.ServerCursor, max_rows: Optional[int] = None) -> Tuple[ColumnarResult, bool]:
+    """
+    Reads an executed tuple_row cursor into a ColumnarResult batch by batch,
+    so at most one batch of row tuples exists at a time. Returns the result
+    and whether more than `max_rows` rows were available.
+    """
+    result = ColumnarResult.from_description(cur.description)
+    while max_rows is None or len(result) < max_rows:
+        rows = cur.fetchmany(_batch_size(result, max_rows))
+        if not rows:
+            return result, False
+        result.append_batch(rows)
+    return result, cur.fetchone() is not None
+
+async def afetch_columnar(cur: psycopg.AsyncServerCursor, max_rows: Optional[int] = None) -> Tuple[ColumnarResult, bool]:
+    """Async variant of fetch_columnar."""
+    result = ColumnarResult.from_description(cur.description)
+    while max_rows is None or len(result) < max_rows:
+        rows = await cur.fetchmany(_batch_size(result, max_rows))
+        if not rows:
+            return result, False
+        result.append_batch(rows)
+    return result, await cur.fetchone() is not None
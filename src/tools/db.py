@@ -1,19 +1,435 @@
 import os
+import time
+import logging
+import asyncio
+import threading
+import weakref
+from contextlib import contextmanager, asynccontextmanager, ExitStack, AsyncExitStack
+from typing import Optional, Dict, Any, Iterator, AsyncIterator, List
+
 import psycopg
+from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool, AsyncConnectionPool
+
+from src.tools.env import load_env
+from src.tools.telemetry import observe, log_event
+
+# ───────────────────────────────────────────────────────────────
+# Connection settings (read from the environment on first use)
+# ───────────────────────────────────────────────────────────────
 
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
-DB_NAME = os.getenv("DB_NAME")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-
-def get_db_connection():
-    """Returns a PostgreSQL database connection."""
-    return psycopg.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        row_factory=psycopg.rows.dict_row
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+def get_conninfo() -> str:
+    """Builds a libpq connection string from the DB_* environment variables."""
+    load_env()
+    return psycopg.conninfo.make_conninfo(
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+        dbname=os.getenv("DB_NAME"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
     )
+
+def get_pool_settings() -> Dict[str, Any]:
+    """Pool sizing and lifetime settings, overridable via DB_POOL_* variables."""
+    return {
+        "min_size": _env_int("DB_POOL_MIN_SIZE", 1),
+        "max_size": _env_int("DB_POOL_MAX_SIZE", 10),
+        "max_idle": _env_float("DB_POOL_MAX_IDLE", 300.0),
+        "max_lifetime": _env_float("DB_POOL_MAX_LIFETIME", 3600.0),
+        "timeout": _env_float("DB_POOL_TIMEOUT", 30.0),
+    }
+
+# ───────────────────────────────────────────────────────────────
+# Shared connection pool
+# ───────────────────────────────────────────────────────────────
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """
+    Returns the process-wide connection pool, creating it on first use.
+    Connections are health-checked on checkout and recycled after
+    DB_POOL_MAX_IDLE / DB_POOL_MAX_LIFETIME seconds.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    conninfo=get_conninfo(),
+                    kwargs={"row_factory": dict_row},
+                    check=ConnectionPool.check_connection,
+                    name="postgresql-agent",
+                    open=True,
+                    **get_pool_settings(),
+                )
+    return _pool
+
+def close_pool() -> None:
+    """Closes the shared pool and the replicas' pools (e.g. on application shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+    close_replica_pools()
+
+@contextmanager
+def get_db_connection() -> Iterator[psycopg.Connection]:
+    """
+    Checks a PostgreSQL connection out of the shared pool.
+    The transaction is committed (or rolled back on error) and the
+    connection returned to the pool when the block exits.
+    """
+    started = time.perf_counter()
+    with get_pool().connection() as conn:
+        observe("db", time.perf_counter() - started, operation="connect")
+        yield conn
+
+# ───────────────────────────────────────────────────────────────
+# Shared async connection pool (asyncio execution mode)
+# ───────────────────────────────────────────────────────────────
+
+_async_pool: Optional[AsyncConnectionPool] = None
+_async_pool_opening: Optional[asyncio.Future] = None
+
+async def get_async_pool() -> AsyncConnectionPool:
+    """
+    Returns the process-wide async connection pool, opening it on first use.
+    Must be called from within the running event loop that will use it.
+    """
+    global _async_pool, _async_pool_opening
+    if _async_pool is None:
+        _async_pool = AsyncConnectionPool(
+            conninfo=get_conninfo(),
+            kwargs={"row_factory": dict_row},
+            check=AsyncConnectionPool.check_connection,
+            name="postgresql-agent-async",
+            open=False,
+            **get_pool_settings(),
+        )
+        _async_pool_opening = asyncio.ensure_future(_async_pool.open())
+    # Concurrent first callers all wait for the same open() to finish; a cancelled caller must not cancel it for the rest
+    opening = _async_pool_opening
+    try:
+        await asyncio.shield(opening)
+    except Exception:
+        # Forget the failed pool so the next caller opens a new one instead of re-raising this error
+        if _async_pool_opening is opening:
+            _async_pool, _async_pool_opening = None, None
+        raise
+    return _async_pool
+
+async def close_async_pool() -> None:
+    """Closes the shared async pool and the replicas' async pools (e.g. on application shutdown)."""
+    global _async_pool, _async_pool_opening
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+        _async_pool_opening = None
+    await aclose_replica_pools()
+
+@asynccontextmanager
+async def get_async_db_connection() -> AsyncIterator[psycopg.AsyncConnection]:
+    """Async counterpart of get_db_connection()."""
+    started = time.perf_counter()
+    pool = await get_async_pool()
+    async with pool.connection() as conn:
+        observe("db", time.perf_counter() - started, operation="connect")
+        yield conn
+
+# ───────────────────────────────────────────────────────────────
+# Read replicas (read-only executor and EXPLAIN traffic)
+# ───────────────────────────────────────────────────────────────
+
+# Replication lag in seconds; 0 for an instance that is not in recovery
+REPLICA_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END AS lag
+"""
+
+def get_replica_settings() -> Dict[str, Any]:
+    """
+    Replica routing settings. DB_READ_REPLICAS lists "host[:port]" entries
+    (comma separated) that share the primary's database and credentials.
+    """
+    load_env()
+    hosts = [h.strip() for h in (os.getenv("DB_READ_REPLICAS") or "").split(",") if h.strip()]
+    return {
+        "hosts": hosts,
+        "max_lag": _env_float("DB_REPLICA_MAX_LAG_SECONDS", 5.0),
+        "lag_check_interval": _env_float("DB_REPLICA_LAG_CHECK_INTERVAL", 2.0),
+        # Longest a lag check waits for a replica connection before counting the replica as down
+        "lag_check_timeout": _env_float("DB_REPLICA_LAG_CHECK_TIMEOUT", 1.0),
+        "pool_max_size": _env_int("DB_REPLICA_POOL_MAX_SIZE", get_pool_settings()["max_size"]),
+    }
+
+class Replica:
+    """
+    One read replica: its own sync and async pools, the number of requests
+    currently using it, and the last measured replication lag (None while
+    unknown or after a failed check, which keeps it out of rotation).
+    """
+
+    def __init__(self, host: str, settings: Dict[str, Any]):
+        name, _, port = host.partition(":")
+        self.name = host
+        self.conninfo = psycopg.conninfo.make_conninfo(get_conninfo(), host=name, port=port or os.getenv("DB_PORT"))
+        self.max_lag = settings["max_lag"]
+        self.lag_check_interval = settings["lag_check_interval"]
+        self.lag_check_timeout = settings["lag_check_timeout"]
+        self.pool_settings = {**get_pool_settings(), "max_size": settings["pool_max_size"]}
+        self.outstanding = 0
+        self.lag: Optional[float] = None
+        self.lag_checked = 0.0
+        self.checking = False
+        self.pool: Optional[ConnectionPool] = None
+        self.async_pool: Optional[AsyncConnectionPool] = None
+        self._async_opening: Optional[asyncio.Future] = None
+
+    def get_pool(self) -> ConnectionPool:
+        if self.pool is None:
+            with _replica_lock:
+                if self.pool is None:
+                    self.pool = ConnectionPool(
+                        conninfo=self.conninfo,
+                        kwargs={"row_factory": dict_row},
+                        check=ConnectionPool.check_connection,
+                        name=f"postgresql-agent-replica-{self.name}",
+                        open=True,
+                        **self.pool_settings,
+                    )
+        return self.pool
+
+    async def get_async_pool(self) -> AsyncConnectionPool:
+        if self.async_pool is None:
+            self.async_pool = AsyncConnectionPool(
+                conninfo=self.conninfo,
+                kwargs={"row_factory": dict_row},
+                check=AsyncConnectionPool.check_connection,
+                name=f"postgresql-agent-replica-async-{self.name}",
+                open=False,
+                **self.pool_settings,
+            )
+            self._async_opening = asyncio.ensure_future(self.async_pool.open())
+        opening = self._async_opening
+        try:
+            await asyncio.shield(opening)
+        except Exception:
+            if self._async_opening is opening:
+                self.async_pool, self._async_opening = None, None
+            raise
+        return self.async_pool
+
+    @property
+    def usable(self) -> bool:
+        return self.lag is not None and self.lag <= self.max_lag
+
+    def claim_lag_check(self) -> bool:
+        """True for the one caller that should refresh a stale lag reading."""
+        with _replica_lock:
+            if self.checking or time.monotonic() - self.lag_checked < self.lag_check_interval:
+                return False
+            self.checking = True
+            return True
+
+    def record_lag(self, lag: Optional[float]) -> None:
+        with _replica_lock:
+            self.lag = lag
+            self.lag_checked = time.monotonic()
+            self.checking = False
+
+    def acquire(self) -> None:
+        with _replica_lock:
+            self.outstanding += 1
+
+    def release(self) -> None:
+        with _replica_lock:
+            self.outstanding -= 1
+
+_replicas: Optional[List[Replica]] = None
+_replica_lock = threading.Lock()
+
+def get_replicas() -> List[Replica]:
+    global _replicas
+    if _replicas is None:
+        settings = get_replica_settings()
+        with _replica_lock:
+            if _replicas is None:
+                _replicas = [Replica(host, settings) for host in settings["hosts"]]
+    return _replicas
+
+def _lag_from_row(row) -> Optional[float]:
+    # NULL replay timestamp: nothing replayed yet, so the lag is unknown
+    return float(row["lag"]) if row and row["lag"] is not None else None
+
+def _refresh_lag(replica: Replica) -> None:
+    try:
+        with replica.get_pool().connection(timeout=replica.lag_check_timeout) as conn:
+            replica.record_lag(_lag_from_row(conn.execute(REPLICA_LAG_SQL).fetchone()))
+    except Exception as e:
+        replica.record_lag(None)
+        log_event("replica_unavailable", logging.WARNING, replica=replica.name, error=str(e))
+
+async def _arefresh_lag(replica: Replica) -> None:
+    try:
+        pool = await replica.get_async_pool()
+        async with pool.connection(timeout=replica.lag_check_timeout) as conn:
+            cur = await conn.execute(REPLICA_LAG_SQL)
+            replica.record_lag(_lag_from_row(await cur.fetchone()))
+    except Exception as e:
+        replica.record_lag(None)
+        log_event("replica_unavailable", logging.WARNING, replica=replica.name, error=str(e))
+
+def _least_outstanding(replicas: List[Replica]) -> Optional[Replica]:
+    usable = [r for r in replicas if r.usable]
+    return min(usable, key=lambda r: r.outstanding) if usable else None
+
+def choose_replica() -> Optional[Replica]:
+    """
+    The usable replica (lag within DB_REPLICA_MAX_LAG_SECONDS) with the
+    fewest requests in flight, or None to fall back to the primary. Lag is
+    re-measured at most every DB_REPLICA_LAG_CHECK_INTERVAL seconds, waiting
+    no longer than DB_REPLICA_LAG_CHECK_TIMEOUT for a connection, so a down
+    replica delays a request by that much rather than the pool timeout.
+    """
+    replicas = get_replicas()
+    for replica in replicas:
+        if replica.claim_lag_check():
+            _refresh_lag(replica)
+    return _least_outstanding(replicas)
+
+async def achoose_replica() -> Optional[Replica]:
+    """Async variant of choose_replica."""
+    replicas = get_replicas()
+    stale = [r for r in replicas if r.claim_lag_check()]
+    if stale:
+        await asyncio.gather(*(_arefresh_lag(r) for r in stale))
+    return _least_outstanding(replicas)
+
+# Connections handed out by replica pools; see is_replica_connection()
+_replica_connections = weakref.WeakSet()
+
+def is_replica_connection(conn) -> bool:
+    """
+    True if `conn` came from a read replica. Hot standbys keep their own
+    pg_stat_user_tables counters, which WAL replay does not advance.
+    """
+    return conn in _replica_connections
+
+@contextmanager
+def get_read_connection() -> Iterator[psycopg.Connection]:
+    """
+    Like get_db_connection(), but served by a read replica when one is
+    configured and caught up; otherwise (or if the replica cannot be
+    reached) by the primary. Only for read-only work.
+    """
+    replica = choose_replica() if get_replicas() else None
+    with ExitStack() as stack:
+        conn = None
+        if replica is not None:
+            replica.acquire()
+            stack.callback(replica.release)
+            started = time.perf_counter()
+            try:
+                conn = stack.enter_context(replica.get_pool().connection())
+                _replica_connections.add(conn)
+                observe("db", time.perf_counter() - started, operation="replica_connect")
+            except psycopg.OperationalError as e:
+                replica.record_lag(None)
+                log_event("replica_unavailable", logging.WARNING, replica=replica.name, error=str(e))
+        if conn is None:
+            conn = stack.enter_context(get_db_connection())
+        yield conn
+
+@asynccontextmanager
+async def get_async_read_connection() -> AsyncIterator[psycopg.AsyncConnection]:
+    """Async counterpart of get_read_connection()."""
+    replica = await achoose_replica() if get_replicas() else None
+    async with AsyncExitStack() as stack:
+        conn = None
+        if replica is not None:
+            replica.acquire()
+            stack.callback(replica.release)
+            started = time.perf_counter()
+            try:
+                pool = await replica.get_async_pool()
+                conn = await stack.enter_async_context(pool.connection())
+                _replica_connections.add(conn)
+                observe("db", time.perf_counter() - started, operation="replica_connect")
+            except psycopg.OperationalError as e:
+                replica.record_lag(None)
+                log_event("replica_unavailable", logging.WARNING, replica=replica.name, error=str(e))
+        if conn is None:
+            conn = await stack.enter_async_context(get_async_db_connection())
+        yield conn
+
+def close_replica_pools() -> None:
+    for replica in _replicas or []:
+        if replica.pool is not None:
+            replica.pool.close()
+            replica.pool = None
+
+async def aclose_replica_pools() -> None:
+    for replica in _replicas or []:
+        if replica.async_pool is not None:
+            await replica.async_pool.close()
+            replica.async_pool = None
+            replica._async_opening = None
+
+# ───────────────────────────────────────────────────────────────
+# Pool statistics
+# ───────────────────────────────────────────────────────────────
+
+def _summarize_pool(pool: Optional[ConnectionPool]) -> Dict[str, Any]:
+    if pool is None:
+        return {"open": False}
+
+    stats = pool.get_stats()
+    requests = stats.get("requests_num", 0)
+    wait_ms = stats.get("requests_wait_ms", 0)
+    size = stats.get("pool_size", 0)
+    available = stats.get("pool_available", 0)
+
+    return {
+        "open": True,
+        "min_size": stats.get("pool_min"),
+        "max_size": stats.get("pool_max"),
+        "size": size,
+        "available": available,
+        "in_use": size - available,
+        "requests_waiting": stats.get("requests_waiting", 0),
+        "checkouts": requests,
+        "wait_ms_total": wait_ms,
+        "wait_ms_avg": (wait_ms / requests) if requests else 0.0,
+        "checkout_failures": stats.get("requests_errors", 0),
+        "connections_lost": stats.get("connections_lost", 0),
+        "raw": stats,
+    }
+
+def get_pool_stats() -> Dict[str, Any]:
+    """
+    Returns a snapshot of pool usage: sizes, connections in use, time spent
+    waiting for a connection and checkout failures (timeouts).
+    """
+    stats = {
+        "sync": _summarize_pool(_pool),
+        "async": _summarize_pool(_async_pool),
+    }
+    for replica in _replicas or []:
+        routing = {"lag_seconds": replica.lag, "usable": replica.usable, "outstanding": replica.outstanding}
+        stats[f"replica:{replica.name}"] = {**_summarize_pool(replica.pool), **routing}
+        stats[f"replica-async:{replica.name}"] = _summarize_pool(replica.async_pool)
+    return stats
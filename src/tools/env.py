@@ -0,0 +1,21 @@
+import threading
+
+from dotenv import load_dotenv
+
+_loaded = False
+_lock = threading.Lock()
+
+def load_env() -> None:
+    """
+    Loads .env into os.environ once per process. The entry points
+    (src.api.main, src.benchmarks.run) call it before importing modules
+    whose settings are read at import time; the DB and LLM settings
+    readers call it again on first use for other callers.
+    """
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if not _loaded:
+            load_dotenv()
+            _loaded = True
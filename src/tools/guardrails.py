@@ -0,0 +1,162 @@
+import os
+import re
+from typing import List, Optional
+
+import psycopg
+from pydantic import BaseModel, Field
+
+from src.tools.sql_validation import PlanCheck
+
+# ───────────────────────────────────────────────────────────────
+# Budgets
+# ───────────────────────────────────────────────────────────────
+
+class ExecutionBudget(BaseModel):
+    max_cost: float = Field(description="Highest planner total cost admitted.")
+    max_estimated_rows: float = Field(description="Highest planner row estimate admitted.")
+    statement_timeout_ms: int = Field(description="Per-query statement_timeout.")
+    work_mem: str = Field(description="Per-query work_mem, e.g. '64MB'.")
+    max_rows: int = Field(description="Rows fetched before the result is truncated.")
+
+def default_budget() -> ExecutionBudget:
+    """Budget from the EXEC_* environment variables."""
+    return ExecutionBudget(
+        max_cost=float(os.getenv("EXEC_MAX_COST", "10000000")),
+        max_estimated_rows=float(os.getenv("EXEC_MAX_ESTIMATED_ROWS", "1000000")),
+        statement_timeout_ms=int(os.getenv("EXEC_STATEMENT_TIMEOUT_MS", "30000")),
+        work_mem=os.getenv("EXEC_WORK_MEM", "64MB"),
+        max_rows=int(os.getenv("EXEC_MAX_ROWS", "10000")),
+    )
+
+def export_budget() -> ExecutionBudget:
+    """
+    Budget for bulk exports from the EXPORT_* environment variables. Exports
+    are expected to return many rows, so the row estimate and timeout are
+    far looser than for interactive queries; max_rows does not apply.
+    """
+    base = default_budget()
+    return ExecutionBudget(
+        max_cost=float(os.getenv("EXPORT_MAX_COST", str(base.max_cost * 10))),
+        max_estimated_rows=float(os.getenv("EXPORT_MAX_ESTIMATED_ROWS", "100000000")),
+        statement_timeout_ms=int(os.getenv("EXPORT_STATEMENT_TIMEOUT_MS", "600000")),
+        work_mem=os.getenv("EXPORT_WORK_MEM", base.work_mem),
+        max_rows=base.max_rows,
+    )
+
+# ───────────────────────────────────────────────────────────────
+# Statement screening
+# ───────────────────────────────────────────────────────────────
+
+# Literals, quoted identifiers, dollar-quoted bodies and comments are removed before matching
+# keywords. Plain literals are stripped both as standard-conforming and as backslash-escaped
+# strings, and a query must pass under both readings, so an E'\'' cannot hide a statement.
+_COMMON = r"|\$([A-Za-z_][A-Za-z0-9_]*|)\$.*?\$\1\$|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/"
+_NON_CODE = (
+    re.compile(r"(?<![\w$])[eE]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*'" + _COMMON, re.DOTALL),
+    re.compile(r"'(?:[^'\\]|\\.|'')*'" + _COMMON, re.DOTALL),
+)
+# Statement-leading keywords only, so columns named "copy", "lock" or "created" stay usable
+_MODIFYING = re.compile(
+    r"^[\s(]*(insert|update|delete|merge|drop|alter|truncate|create|grant|revoke|copy|vacuum|reindex"
+    r"|cluster|lock|call|do|set|reset|discard|refresh|comment|import|load|checkpoint"
+    r"|commit|end|begin|start|rollback|abort|savepoint|release|prepare|execute|deallocate"
+    r"|listen|unlisten|notify)\b",
+    re.IGNORECASE,
+)
+# Data-modifying statements nested in a WITH query
+_WITH = re.compile(r"^[\s(]*with\b", re.IGNORECASE)
+_WRITES = re.compile(r"\b(insert|update|delete|merge)\b", re.IGNORECASE)
+
+def _statements(code: str) -> List[str]:
+    return [statement for statement in code.split(";") if statement.strip()]
+
+def is_modifying_query(query: str) -> bool:
+    """
+    Rejects anything but a single statement that does not begin with a
+    data-modifying, DDL, session or transaction-control command, and WITH
+    queries containing INSERT/UPDATE/DELETE/MERGE. More than one statement
+    is always rejected: psycopg sends unparameterized SQL over the simple
+    query protocol, where a COMMIT would end the READ ONLY transaction
+    before the next statement runs.
+    """
+    for non_code in _NON_CODE:
+        statements = _statements(non_code.sub(" ", query))
+        if len(statements) != 1:
+            return True
+        statement = statements[0]
+        if _MODIFYING.match(statement) or (_WITH.match(statement) and _WRITES.search(statement)):
+            return True
+    return False
+
+# ───────────────────────────────────────────────────────────────
+# Admission control
+# ───────────────────────────────────────────────────────────────
+
+class AdmissionResult(BaseModel):
+    admitted: bool
+    code: Optional[str] = Field(default=None, description="'invalid', 'cost_exceeded' or 'rows_exceeded' when rejected.")
+    reason: Optional[str] = Field(default=None, description="Human/LLM-readable explanation of the rejection.")
+    estimated_cost: Optional[float] = None
+    estimated_rows: Optional[float] = None
+    max_cost: Optional[float] = None
+    max_estimated_rows: Optional[float] = None
+
+def check_admission(plan: PlanCheck, budget: ExecutionBudget) -> AdmissionResult:
+    """
+    Compares the planner's estimates with the budget. Rejection reasons are
+    phrased so the writer can produce a cheaper query from them.
+    """
+    common = {
+        "estimated_cost": plan.total_cost,
+        "estimated_rows": plan.estimated_rows,
+        "max_cost": budget.max_cost,
+        "max_estimated_rows": budget.max_estimated_rows,
+    }
+    if not plan.ok:
+        return AdmissionResult(admitted=False, code="invalid", reason=plan.error, **common)
+
+    if plan.total_cost is not None and plan.total_cost > budget.max_cost:
+        return AdmissionResult(
+            admitted=False,
+            code="cost_exceeded",
+            reason=(
+                f"Estimated cost {plan.total_cost:.0f} exceeds the budget of {budget.max_cost:.0f}. "
+                "Add selective filters, aggregate earlier, avoid cross joins, or limit the time range."
+            ),
+            **common,
+        )
+
+    if plan.estimated_rows is not None and plan.estimated_rows > budget.max_estimated_rows:
+        return AdmissionResult(
+            admitted=False,
+            code="rows_exceeded",
+            reason=(
+                f"Estimated {plan.estimated_rows:.0f} result rows exceeds the budget of "
+                f"{budget.max_estimated_rows:.0f}. Aggregate the data or add filters or a LIMIT."
+            ),
+            **common,
+        )
+
+    return AdmissionResult(admitted=True, **common)
+
+# ───────────────────────────────────────────────────────────────
+# Guarded transaction settings
+# ───────────────────────────────────────────────────────────────
+
+def _settings_params(budget: ExecutionBudget) -> tuple:
+    return (str(budget.statement_timeout_ms), budget.work_mem)
+
+SETTINGS_SQL = "SELECT set_config('statement_timeout', %s, true), set_config('work_mem', %s, true)"
+
+def apply_guardrails(conn: psycopg.Connection, budget: ExecutionBudget) -> None:
+    """
+    Makes the current transaction READ ONLY and sets transaction-local
+    statement_timeout and work_mem. Must run first in the transaction.
+    """
+    conn.execute("SET TRANSACTION READ ONLY")
+    conn.execute(SETTINGS_SQL, _settings_params(budget))
+
+async def aapply_guardrails(conn: psycopg.AsyncConnection, budget: ExecutionBudget) -> None:
+    """Async variant of apply_guardrails."""
+    await conn.execute("SET TRANSACTION READ ONLY")
+    await conn.execute(SETTINGS_SQL, _settings_params(budget))
@@ -0,0 +1,140 @@
+import os
+from typing import List, Dict, Optional
+
+from pydantic import BaseModel
+
+# ───────────────────────────────────────────────────────────────
+# Settings
+# ───────────────────────────────────────────────────────────────
+
+# Estimated tokens of conversation kept verbatim; older turns are folded into the summary
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+# Cap on the rolling summary; its oldest lines are dropped beyond this
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "300"))
+# Characters kept per folded message in the summary
+HISTORY_SUMMARY_LINE_CHARS = int(os.getenv("HISTORY_SUMMARY_LINE_CHARS", "160"))
+
+# Prefix of the orchestrator's internal routing entries
+DECISION_PREFIX = "Decision: "
+# Prefix of the single progress note that replaces them in the prompt
+STEPS_PREFIX = "Steps already taken for this request: "
+
+Message = Dict[str, str]
+
+# ───────────────────────────────────────────────────────────────
+# Token estimates and filtering
+# ───────────────────────────────────────────────────────────────
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token); no tokenizer round trip."""
+    return len(text) // 4 + 1
+
+def message_tokens(message: Message) -> int:
+    # Role and framing overhead per chat message
+    return estimate_tokens(message.get("content") or "") + 4
+
+def is_bookkeeping(message: Message) -> bool:
+    return message.get("role") == "assistant" and (message.get("content") or "").startswith(DECISION_PREFIX)
+
+def conversational(history: List[Message]) -> List[Message]:
+    """
+    The history as the LLM should see it: routing bookkeeping dropped and
+    repeated user entries (re-appended on every orchestrator hop) collapsed.
+    """
+    out: List[Message] = []
+    last_user = None
+    for message in history:
+        if is_bookkeeping(message):
+            continue
+        if message.get("role") == "user":
+            if message.get("content") == last_user:
+                continue
+            last_user = message.get("content")
+        else:
+            last_user = None
+        out.append(message)
+    return out
+
+def pending_steps(history: List[Message]) -> List[str]:
+    """Decisions recorded since the latest user message (the current turn's progress)."""
+    steps: List[str] = []
+    for message in reversed(history):
+        if message.get("role") == "user":
+            break
+        if is_bookkeeping(message):
+            steps.append(message["content"][len(DECISION_PREFIX):])
+    return steps[::-1]
+
+def history_length(state: Dict) -> int:
+    """Messages ever recorded for the session, including those folded into the summary."""
+    return (state.get("history_offset") or 0) + len(state.get("message_history") or [])
+
+# ───────────────────────────────────────────────────────────────
+# Incremental compaction
+# ───────────────────────────────────────────────────────────────
+
+class CompactedHistory(BaseModel):
+    messages: List[Message]
+    summary: Optional[str] = None
+    offset: int = 0  # Messages folded into the summary so far
+
+def _summary_line(message: Message) -> str:
+    content = " ".join((message.get("content") or "").split())
+    if len(content) > HISTORY_SUMMARY_LINE_CHARS:
+        content = content[:HISTORY_SUMMARY_LINE_CHARS - 3] + "..."
+    return f"- {message.get('role', 'user')}: {content}"
+
+def fold_summary(summary: Optional[str], messages: List[Message]) -> Optional[str]:
+    """Appends one line per folded message, then trims the oldest lines to the cap."""
+    lines = (summary.splitlines() if summary else []) + [_summary_line(m) for m in conversational(messages)]
+    while lines and estimate_tokens("\n".join(lines)) > HISTORY_SUMMARY_TOKENS:
+        lines.pop(0)
+    return "\n".join(lines) or None
+
+def compact_history(
+    history: List[Message],
+    summary: Optional[str] = None,
+    offset: int = 0,
+    budget: int = HISTORY_TOKEN_BUDGET,
+) -> CompactedHistory:
+    """
+    Keeps the most recent messages verbatim within `budget` estimated
+    tokens and folds the older ones into the rolling summary. Only the
+    newly folded messages are summarized, and nothing is done while the
+    history fits. The current turn (from the latest user message) is
+    never folded.
+    """
+    sizes = [0 if is_bookkeeping(m) else message_tokens(m) for m in history]
+    total = sum(sizes)
+    if total <= budget:
+        return CompactedHistory(messages=history, summary=summary, offset=offset)
+
+    current_turn = max((i for i, m in enumerate(history) if m.get("role") == "user"), default=len(history))
+    cut = 0
+    while cut < current_turn and total > budget:
+        total -= sizes[cut]
+        cut += 1
+    return CompactedHistory(
+        messages=history[cut:],
+        summary=fold_summary(summary, history[:cut]),
+        offset=offset + cut,
+    )
+
+# ───────────────────────────────────────────────────────────────
+# Prompt assembly
+# ───────────────────────────────────────────────────────────────
+
+def prompt_history(history: List[Message], summary: Optional[str] = None) -> List[Message]:
+    """
+    Messages to send after the system prompt: the rolling summary, the
+    verbatim recent conversation, and a single note listing the current
+    turn's routing steps in place of the "Decision: X" entries.
+    """
+    messages: List[Message] = []
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+    messages.extend(conversational(history))
+    steps = pending_steps(history)
+    if steps:
+        messages.append({"role": "system", "content": STEPS_PREFIX + ", ".join(steps)})
+    return messages
@@ -0,0 +1,243 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, Optional, Type, TypeVar, Callable, Awaitable
+
+from pydantic import BaseModel
+
+from src.tools.cache import LRUCache
+
+ResponseT = TypeVar("ResponseT", bound=BaseModel)
+
+# ───────────────────────────────────────────────────────────────
+# Settings
+# ───────────────────────────────────────────────────────────────
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_SQLITE_PATH = os.getenv("LLM_CACHE_SQLITE_PATH")  # Unset = memory tier only
+LLM_CACHE_SQLITE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_SQLITE_MAX_ENTRIES", "100000"))
+
+# ───────────────────────────────────────────────────────────────
+# Key normalization
+# ───────────────────────────────────────────────────────────────
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_input(value: Any) -> Any:
+    """
+    Collapses whitespace in every string input. Case is kept, including in
+    the user request: "orders for 'ACME'" and "orders for 'acme'" need
+    different SQL literals.
+    """
+    if not isinstance(value, str):
+        return value
+    return _WHITESPACE.sub(" ", value).strip()
+
+# Generation parameters that change the output; two models differing in any of these never share entries
+MODEL_PARAMS = ("temperature", "top_p", "max_tokens", "seed", "frequency_penalty", "presence_penalty", "model_kwargs")
+
+def model_params(model: Any) -> Dict[str, Any]:
+    """Name and bound generation parameters of a chat model (or just the name, given a string)."""
+    if isinstance(model, str):
+        return {"model": model}
+    params = {"model": getattr(model, "model_name", None) or type(model).__name__}
+    for name in MODEL_PARAMS:
+        value = getattr(model, name, None)
+        if value is not None:
+            params[name] = value
+    return params
+
+def cache_key(agent: str, inputs: Dict[str, Any], model: Any, schema_version: Optional[str] = None) -> str:
+    """Stable key for one chain call: agent, model and its parameters, schema version and normalized inputs."""
+    payload = json.dumps(
+        {
+            "agent": agent,
+            "model": model_params(model),
+            "schema_version": schema_version,
+            "inputs": {name: normalize_input(value) for name, value in sorted(inputs.items())},
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# ───────────────────────────────────────────────────────────────
+# SQLite tier
+# ───────────────────────────────────────────────────────────────
+
+class SQLiteResponseStore:
+    """
+    On-disk tier shared across restarts and worker processes. Rows past the
+    TTL are ignored on read; the oldest rows are trimmed past `max_entries`.
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._writes += 1
+            # Trim periodically rather than on every write
+            if self._writes % 100 == 0:
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            " SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM llm_cache").fetchone()[0]
+
+# ───────────────────────────────────────────────────────────────
+# Two-tier response cache
+# ───────────────────────────────────────────────────────────────
+
+class LLMResponseCache:
+    """
+    Caches parsed chain outputs (pydantic models) as JSON. Lookups try the
+    in-memory LRU first, then the optional SQLite tier, promoting disk hits
+    back into memory.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        ttl: float = LLM_CACHE_TTL,
+        sqlite_path: Optional[str] = LLM_CACHE_SQLITE_PATH,
+        sqlite_max_entries: int = LLM_CACHE_SQLITE_MAX_ENTRIES,
+        enabled: bool = LLM_CACHE_ENABLED,
+    ):
+        self.enabled = enabled
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.disk = SQLiteResponseStore(sqlite_path, ttl, sqlite_max_entries) if sqlite_path else None
+        self.disk_hits = 0
+        self.misses = 0
+
+    def lookup(self, key: str, response_type: Type[ResponseT]) -> Optional[ResponseT]:
+        if not self.enabled:
+            return None
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.disk_hits += 1
+                self.memory.set(key, value)
+        if value is None:
+            self.misses += 1
+            return None
+        return response_type.model_validate_json(value)
+
+    def store(self, key: str, response: BaseModel) -> None:
+        if not self.enabled:
+            return
+        value = response.model_dump_json()
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def cached(
+        self,
+        agent: str,
+        inputs: Dict[str, Any],
+        model: Any,
+        response_type: Type[ResponseT],
+        compute: Callable[[], ResponseT],
+        schema_version: Optional[str] = None,
+    ) -> ResponseT:
+        """
+        Returns the cached response for these inputs, calling `compute` on a
+        miss. `model` is the agent's chat model, so its parameters are keyed.
+        """
+        key = cache_key(agent, inputs, model, schema_version)
+        hit = self.lookup(key, response_type)
+        if hit is not None:
+            return hit
+        response = compute()
+        self.store(key, response)
+        return response
+
+    async def acached(
+        self,
+        agent: str,
+        inputs: Dict[str, Any],
+        model: Any,
+        response_type: Type[ResponseT],
+        compute: Callable[[], Awaitable[ResponseT]],
+        schema_version: Optional[str] = None,
+    ) -> ResponseT:
+        """Async variant of cached."""
+        key = cache_key(agent, inputs, model, schema_version)
+        hit = self.lookup(key, response_type)
+        if hit is not None:
+            return hit
+        response = await compute()
+        self.store(key, response)
+        return response
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        memory = self.memory.stats()
+        hits = memory["hits"] + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": hits,
+            "memory_hits": memory["hits"],
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (hits / lookups) if lookups else 0.0,
+            "memory_entries": memory["entries"],
+            "memory_evictions": memory["evictions"],
+            "disk_entries": len(self.disk) if self.disk is not None else None,
+        }
+
+# Shared by the writer, checker and analyst agents
+llm_cache = LLMResponseCache()
@@ -0,0 +1,147 @@
+import os
+import threading
+from typing import Dict, Any
+
+from pydantic import BaseModel
+
+from src.tools.env import load_env
+from src.tools.telemetry import LLMTelemetry
+from src.tools.rate_limits import provider_rate_limiter, LLM_MAX_RETRIES
+
+# ───────────────────────────────────────────────────────────────
+# Settings (read from the environment on first use)
+# ───────────────────────────────────────────────────────────────
+
+DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_TEMPERATURE = 0.0
+DEFAULT_TIMEOUT = 60.0  # Seconds per provider request
+
+def _env(agent: str, name: str, default: str) -> str:
+    """LLM_<AGENT>_<NAME> wins over LLM_<NAME>, e.g. LLM_ANALYST_MODEL over LLM_MODEL."""
+    return os.getenv(f"LLM_{agent.upper()}_{name}") or os.getenv(f"LLM_{name}") or default
+
+def get_http_settings() -> Dict[str, float]:
+    """Shared HTTP client limits, overridable via LLM_HTTP_* variables."""
+    return {
+        "max_connections": int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100")),
+        "max_keepalive_connections": int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20")),
+        "keepalive_expiry": float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "30")),
+    }
+
+class ModelSettings(BaseModel):
+    model: str
+    temperature: float
+    timeout: float
+    provider: str = "openai"
+
+# ───────────────────────────────────────────────────────────────
+# Registry
+# ───────────────────────────────────────────────────────────────
+
+class ModelRegistry:
+    """
+    Builds each agent's chat model on first use and shares one keep-alive
+    HTTP client (sync and async) between all of them, so importing the
+    agents opens no sockets and the process holds a single connection pool
+    to the provider.
+    """
+
+    def __init__(self):
+        self._models: Dict[str, Any] = {}
+        self._registered: Dict[str, Any] = {}
+        self._overrides: Dict[str, Dict[str, Any]] = {}
+        self._http_client = None
+        self._http_async_client = None
+        self._lock = threading.Lock()
+
+    def settings(self, agent: str) -> ModelSettings:
+        load_env()
+        settings = ModelSettings(
+            model=_env(agent, "MODEL", DEFAULT_MODEL),
+            temperature=float(_env(agent, "TEMPERATURE", str(DEFAULT_TEMPERATURE))),
+            timeout=float(_env(agent, "TIMEOUT", str(DEFAULT_TIMEOUT))),
+        )
+        return settings.model_copy(update=self._overrides.get(agent, {}))
+
+    def configure(self, agent: str, **overrides) -> None:
+        """Overrides model/temperature/timeout for `agent`; the next get() rebuilds it."""
+        with self._lock:
+            self._overrides.setdefault(agent, {}).update(overrides)
+            self._models.pop(agent, None)
+
+    def register(self, agent: str, model) -> None:
+        """Installs a prebuilt chat model for `agent` (e.g. a scripted fake in benchmarks)."""
+        with self._lock:
+            self._registered[agent] = model
+
+    def get(self, agent: str):
+        model = self._registered.get(agent) or self._models.get(agent)
+        if model is None:
+            with self._lock:
+                model = self._models.get(agent)
+                if model is None:
+                    model = self._models[agent] = self._build(agent)
+        return model
+
+    def _clients(self):
+        import httpx
+
+        if self._http_client is None:
+            limits = httpx.Limits(**get_http_settings())
+            self._http_client = httpx.Client(limits=limits)
+            self._http_async_client = httpx.AsyncClient(limits=limits)
+        return self._http_client, self._http_async_client
+
+    def _build(self, agent: str):
+        # Imported here so loading the agent modules stays cheap
+        from langchain_openai import ChatOpenAI
+
+        settings = self.settings(agent)
+        http_client, http_async_client = self._clients()
+        return ChatOpenAI(
+            model=settings.model,
+            temperature=settings.temperature,
+            timeout=settings.timeout,
+            max_retries=LLM_MAX_RETRIES,
+            stream_usage=True,  # Token counts for streamed calls too (/chat/stream)
+            callbacks=[LLMTelemetry(agent)],
+            rate_limiter=provider_rate_limiter(settings.provider),
+            http_client=http_client,
+            http_async_client=http_async_client,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "models": {agent: model.model_name for agent, model in {**self._models, **self._registered}.items()},
+            "http_client_open": self._http_client is not None,
+        }
+
+    def reset(self) -> None:
+        """
+        Forgets built models and clients without closing them. Used in forked
+        children, whose inherited sockets still belong to the parent.
+        """
+        self._models = {}
+        self._http_client = None
+        self._http_async_client = None
+        self._lock = threading.Lock()
+
+    async def aclose(self) -> None:
+        """Closes the shared HTTP clients (e.g. on application shutdown)."""
+        with self._lock:
+            http_client, http_async_client = self._http_client, self._http_async_client
+            self._models = {}
+            self._http_client = self._http_async_client = None
+        if http_client is not None:
+            http_client.close()
+        if http_async_client is not None:
+            await http_async_client.aclose()
+
+llm_registry = ModelRegistry()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=llm_registry.reset)
+
+def get_llm(agent: str):
+    """Returns the shared chat model for `agent`, building it on first use."""
+    return llm_registry.get(agent)
@@ -0,0 +1,136 @@
+import os
+import json
+import base64
+import hashlib
+from typing import List, Optional, Sequence, Tuple, Dict, Any
+
+from psycopg import sql
+
+from src.tools.cache import LRUCache
+from src.tools.sql_validation import strip_statement
+
+# ───────────────────────────────────────────────────────────────
+# Settings
+# ───────────────────────────────────────────────────────────────
+
+RESULT_PAGE_SIZE = int(os.getenv("RESULT_PAGE_SIZE", "100"))
+RESULT_PAGE_MAX_SIZE = int(os.getenv("RESULT_PAGE_MAX_SIZE", "1000"))
+# Sort keys chosen per query; the TTL bounds how long a schema change can go unnoticed
+RESULT_SORT_KEY_CACHE_SIZE = int(os.getenv("RESULT_SORT_KEY_CACHE_SIZE", "1024"))
+RESULT_SORT_KEY_TTL = float(os.getenv("RESULT_SORT_KEY_TTL", "3600"))
+
+# Types with a btree ordering whose text form round-trips through a cursor:
+# bool, int2/4/8, oid, float4/8, numeric, name, text, bpchar, varchar,
+# date, time, timestamp, timestamptz, uuid
+SORTABLE_TYPES = {16, 21, 23, 20, 26, 700, 701, 1700, 19, 25, 1042, 1043, 1082, 1083, 1114, 1184, 2950}
+
+# Takes a PlanCheck relation ("schema.table", unquoted names as EXPLAIN reports them), matched
+# against the catalog by name: a regclass cast would re-parse it, breaking on case or dots
+PRIMARY_KEY_SQL = """
+SELECT a.attname
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+WHERE n.nspname || '.' || c.relname = %s AND i.indisprimary
+ORDER BY array_position(i.indkey::int2[], a.attnum)
+"""
+
+# ───────────────────────────────────────────────────────────────
+# Sort key
+# ───────────────────────────────────────────────────────────────
+
+def choose_sort_key(columns: Sequence[Tuple[str, int]], primary_key: Sequence[str] = ()) -> List[str]:
+    """
+    Picks the keyset columns for a result with these (name, type oid)
+    columns. A single-table query that returns its primary key is paged on
+    it; otherwise every sortable, uniquely named column is used, so pages
+    stay stable (rows that are exact duplicates may be collapsed at a page
+    boundary).
+    """
+    names = [name for name, _ in columns]
+    unique = {name for name in names if names.count(name) == 1}
+    if primary_key and all(name in unique for name in primary_key):
+        return list(primary_key)
+    key = [name for name, oid in columns if name in unique and oid in SORTABLE_TYPES]
+    if not key:
+        raise ValueError("The result has no sortable columns to paginate on.")
+    return key
+
+# Query fingerprint -> sort key, kept apart from the session so paging never writes session state
+sort_key_cache = LRUCache(max_entries=RESULT_SORT_KEY_CACHE_SIZE, ttl=RESULT_SORT_KEY_TTL)
+
+# ───────────────────────────────────────────────────────────────
+# Keyset SQL
+# ───────────────────────────────────────────────────────────────
+
+def _after(sort_key: Sequence[str], values: Sequence[Optional[str]]) -> Tuple[sql.Composable, List[str]]:
+    """
+    Lexicographic "row comes after `values`" predicate for ORDER BY
+    <key> ASC NULLS LAST, spelled out per column so NULL keys page correctly.
+    """
+    alternatives, params = [], []
+    for i, (column, value) in enumerate(zip(sort_key, values)):
+        terms, term_params = [], []
+        for previous, previous_value in zip(sort_key[:i], values[:i]):
+            if previous_value is None:
+                terms.append(sql.SQL("{} IS NULL").format(sql.Identifier(previous)))
+            else:
+                terms.append(sql.SQL("{} = %s").format(sql.Identifier(previous)))
+                term_params.append(previous_value)
+        if value is None:
+            continue  # Nothing sorts after NULL in this column
+        terms.append(sql.SQL("({0} > %s OR {0} IS NULL)").format(sql.Identifier(column)))
+        term_params.append(value)
+        alternatives.append(sql.SQL("(") + sql.SQL(" AND ").join(terms) + sql.SQL(")"))
+        params.extend(term_params)
+    if not alternatives:
+        return sql.SQL("FALSE"), []
+    return sql.SQL(" OR ").join(alternatives), params
+
+def page_sql(query: str, sort_key: Sequence[str], after: Optional[Sequence[Optional[str]]], limit: int) -> Tuple[sql.Composed, List[str]]:
+    """
+    Wraps the validated query and seeks past the previous page's last key
+    instead of using OFFSET. One extra row is fetched to tell whether
+    another page follows. Always execute with the returned params list.
+    """
+    where, params = (_after(sort_key, after) if after is not None else (sql.SQL("TRUE"), []))
+    order = sql.SQL(", ").join(sql.SQL("{} ASC NULLS LAST").format(sql.Identifier(c)) for c in sort_key)
+    statement = sql.SQL("SELECT * FROM ({query}) AS page_source WHERE {where} ORDER BY {order} LIMIT {limit}").format(
+        # Executed with parameters, so literal % in the query must be escaped
+        query=sql.SQL(strip_statement(query).replace("%", "%%")),
+        where=where,
+        order=order,
+        limit=sql.Literal(limit + 1),
+    )
+    return statement, params
+
+def describe_sql(query: str) -> sql.Composed:
+    """Returns no rows; only the result's column names and types."""
+    return sql.SQL("SELECT * FROM ({}) AS page_source LIMIT 0").format(sql.SQL(strip_statement(query)))
+
+# ───────────────────────────────────────────────────────────────
+# Opaque cursors
+# ───────────────────────────────────────────────────────────────
+
+def query_fingerprint(query: str) -> str:
+    return hashlib.sha256(strip_statement(query).encode("utf-8")).hexdigest()[:16]
+
+def _key_text(value: Any) -> Optional[str]:
+    # Sent back as untyped literals, so PostgreSQL parses them as the column's type
+    return None if value is None else str(value)
+
+def encode_cursor(query: str, sort_key: Sequence[str], row: Dict[str, Any]) -> str:
+    payload = {"q": query_fingerprint(query), "k": [_key_text(row[c]) for c in sort_key]}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str, query: str, sort_key: Sequence[str]) -> List[Optional[str]]:
+    """Key values of the row a cursor points after; ValueError if it belongs to another query."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        values = payload["k"]
+    except Exception:
+        raise ValueError("Malformed cursor.")
+    if payload.get("q") != query_fingerprint(query) or len(values) != len(sort_key):
+        raise ValueError("Cursor does not belong to this session's current query.")
+    return values
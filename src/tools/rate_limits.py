@@ -0,0 +1,46 @@
+import os
+import threading
+from typing import Dict
+
+from langchain_core.rate_limiters import InMemoryRateLimiter
+
+# ───────────────────────────────────────────────────────────────
+# Settings
+# ───────────────────────────────────────────────────────────────
+
+# Client-side throttling is opt-in: LLM_RATE_LIMIT_ENABLED=true shares one token bucket per provider
+LLM_RATE_LIMIT_ENABLED = os.getenv("LLM_RATE_LIMIT_ENABLED", "false").lower() in ("1", "true", "yes")
+# Requests per second allowed per provider when enabled, e.g. LLM_RATE_LIMIT_OPENAI_RPS=8; 0 disables it
+DEFAULT_PROVIDER_RPS = float(os.getenv("LLM_RATE_LIMIT_RPS", "8"))
+# Short bursts above the steady rate (token bucket size)
+DEFAULT_PROVIDER_BURST = float(os.getenv("LLM_RATE_LIMIT_BURST", "16"))
+# Retries (with exponential backoff) on 429 / transient provider errors; 2 is the OpenAI client's default
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+# ───────────────────────────────────────────────────────────────
+# Shared per-provider limiters
+# ───────────────────────────────────────────────────────────────
+
+_limiters: Dict[str, InMemoryRateLimiter] = {}
+_lock = threading.Lock()
+
+def provider_rate_limiter(provider: str = "openai"):
+    """
+    Returns the process-wide token-bucket limiter for `provider`, shared by
+    every agent's chat model so concurrent graphs (e.g. /chat/batch) stay
+    under the provider's request rate instead of tripping 429s. None (no
+    limiter) unless LLM_RATE_LIMIT_ENABLED is set.
+    """
+    if not LLM_RATE_LIMIT_ENABLED:
+        return None
+    with _lock:
+        if provider not in _limiters:
+            rps = float(os.getenv(f"LLM_RATE_LIMIT_{provider.upper()}_RPS", str(DEFAULT_PROVIDER_RPS)))
+            if rps <= 0:
+                return None
+            _limiters[provider] = InMemoryRateLimiter(
+                requests_per_second=rps,
+                check_every_n_seconds=0.05,
+                max_bucket_size=DEFAULT_PROVIDER_BURST,
+            )
+        return _limiters[provider]
@@ -0,0 +1,311 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+from uuid import uuid4
+from typing import List, Dict, Tuple, Optional, Any, Union
+
+import psycopg
+from psycopg.rows import tuple_row
+from pydantic import BaseModel
+
+from src.tools.cache import LRUCache
+from src.tools.columnar import ColumnarResult, fetch_columnar, afetch_columnar
+from src.tools.sql_validation import relations_from_explain, run_explain, arun_explain, strip_statement
+from src.tools.db import is_replica_connection
+
+# ───────────────────────────────────────────────────────────────
+# Settings
+# ───────────────────────────────────────────────────────────────
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Upper bound on staleness: table statistics are flushed asynchronously by Postgres
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+# Entries younger than this are served without re-checking table statistics
+RESULT_CACHE_FRESH_SECONDS = float(os.getenv("RESULT_CACHE_FRESH_SECONDS", "1"))
+
+# ───────────────────────────────────────────────────────────────
+# SQL fingerprinting
+# ───────────────────────────────────────────────────────────────
+
+_TOKEN = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+    |(?P<string>[EeBbXxNn]?'(?:[^']|'')*')
+    |(?P<ident>"(?:[^"]|"")*")
+    |(?P<number>\b\d+(?:\.\d*)?(?:[eE][-+]?\d+)?\b|\.\d+(?:[eE][-+]?\d+)?\b)
+    |(?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    |(?P<space>\s+)
+    |(?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# Functions whose results change between executions of the same SQL
+_VOLATILE = {
+    "now", "random", "clock_timestamp", "statement_timestamp", "transaction_timestamp",
+    "timeofday", "current_date", "current_time", "current_timestamp", "localtime",
+    "localtimestamp", "nextval", "currval", "gen_random_uuid", "uuid_generate_v4", "txid_current",
+}
+
+class SQLFingerprint(BaseModel):
+    key: str  # Hash of the normalized template plus literal values
+    template: str  # Normalized SQL with literals replaced by "?"
+    literals: List[str]
+    volatile: bool
+
+def fingerprint(sql: str) -> SQLFingerprint:
+    """
+    Normalizes SQL so formatting differences share a cache entry: comments
+    are dropped, whitespace collapsed, unquoted keywords/identifiers
+    lower-cased and literals lifted out. Literal values stay part of the
+    key, so "id = 1" and "id = 2" never share results.
+    """
+    parts: List[str] = []
+    literals: List[str] = []
+    words = set()
+    for match in _TOKEN.finditer(sql):
+        kind = match.lastgroup
+        text = match.group()
+        if kind in ("comment", "space"):
+            continue
+        if kind in ("string", "number"):
+            literals.append(text)
+            parts.append("?")
+        elif kind == "word":
+            word = text.lower()
+            words.add(word)
+            parts.append(word)
+        else:
+            parts.append(text)
+
+    while parts and parts[-1] == ";":
+        parts.pop()
+
+    template = " ".join(parts)
+    digest = hashlib.sha256(json.dumps([template, literals]).encode("utf-8")).hexdigest()
+    return SQLFingerprint(key=digest, template=template, literals=literals, volatile=bool(words & _VOLATILE))
+
+# ───────────────────────────────────────────────────────────────
+# Table tracking and change detection
+# ───────────────────────────────────────────────────────────────
+
+TABLE_STATS_SQL = """
+SELECT schemaname || '.' || relname AS name,
+       n_tup_ins, n_tup_upd, n_tup_del, n_live_tup
+FROM pg_stat_user_tables
+WHERE schemaname || '.' || relname = ANY(%s)
+ORDER BY 1
+"""
+
+def _table_versions(stat_rows: List[Dict[str, Any]]) -> Tuple:
+    return tuple(
+        (row["name"], row["n_tup_ins"], row["n_tup_upd"], row["n_tup_del"], row["n_live_tup"])
+        for row in stat_rows
+    )
+
+# ───────────────────────────────────────────────────────────────
+# Result cache
+# ───────────────────────────────────────────────────────────────
+
+Rows = Union[List[dict], ColumnarResult]
+
+class CachedResult(BaseModel):
+    rows: Any  # List[dict] or ColumnarResult
+    truncated: bool
+    tables: List[str]
+    versions: Tuple
+    stored_at: float
+    checked_at: float
+
+def _cursor_name() -> str:
+    return f"capped_{uuid4().hex}"
+
+def _fetch_rows(conn: psycopg.Connection, query: str, max_rows: Optional[int], columnar: bool = False) -> Tuple[Rows, bool]:
+    if columnar:
+        with conn.cursor(name=_cursor_name(), row_factory=tuple_row) as cur:
+            cur.execute(strip_statement(query))
+            return fetch_columnar(cur, max_rows)
+    if max_rows is None:
+        return conn.execute(query).fetchall(), False
+    # A server-side cursor lets Postgres stop producing rows at the cap
+    with conn.cursor(name=_cursor_name()) as cur:
+        cur.execute(strip_statement(query))
+        rows = cur.fetchmany(max_rows + 1)
+    return rows[:max_rows], len(rows) > max_rows
+
+async def _afetch_rows(conn: psycopg.AsyncConnection, query: str, max_rows: Optional[int], columnar: bool = False) -> Tuple[Rows, bool]:
+    if columnar:
+        async with conn.cursor(name=_cursor_name(), row_factory=tuple_row) as cur:
+            await cur.execute(strip_statement(query))
+            return await afetch_columnar(cur, max_rows)
+    if max_rows is None:
+        cur = await conn.execute(query)
+        return await cur.fetchall(), False
+    async with conn.cursor(name=_cursor_name()) as cur:
+        await cur.execute(strip_statement(query))
+        rows = await cur.fetchmany(max_rows + 1)
+    return rows[:max_rows], len(rows) > max_rows
+
+def _estimate_size(rows: Rows) -> int:
+    """Approximate in-memory size from a sample, avoiding a full traversal."""
+    if isinstance(rows, ColumnarResult):
+        return rows.nbytes()
+    if not rows:
+        return 0
+    sample = rows[:100]
+    per_row = sum(
+        sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values()) for row in sample
+    ) / len(sample)
+    return int(per_row * len(rows))
+
+def _entry_key(fp: SQLFingerprint, max_rows: Optional[int], columnar: bool) -> str:
+    return f"{fp.key}:{max_rows}:{'columnar' if columnar else 'rows'}"
+
+class QueryResultCache:
+    """
+    LRU cache of executor results, bounded by entry count and estimated
+    bytes. Each entry remembers the tables the query read (from its plan)
+    and their pg_stat_user_tables modification counters; an entry is
+    served only while those counters are unchanged and it is within TTL.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+        ttl: float = RESULT_CACHE_TTL,
+        fresh_seconds: float = RESULT_CACHE_FRESH_SECONDS,
+        enabled: bool = RESULT_CACHE_ENABLED,
+    ):
+        self.enabled = enabled
+        self.fresh_seconds = fresh_seconds
+        self.entries = LRUCache(
+            max_entries=max_entries,
+            ttl=ttl,
+            max_bytes=max_bytes,
+            sizeof=lambda entry: _estimate_size(entry.rows),
+        )
+        self.invalidations = 0
+        self.replica_bypasses = 0
+
+    def _lookup(self, key: str, fp: SQLFingerprint) -> Optional[CachedResult]:
+        if not self.enabled or fp.volatile:
+            return None
+        return self.entries.get(key)
+
+    def _is_fresh(self, entry: CachedResult) -> bool:
+        return time.time() - entry.checked_at < self.fresh_seconds
+
+    def _revalidate(self, key: str, entry: CachedResult, versions: Tuple) -> bool:
+        if versions == entry.versions:
+            entry.checked_at = time.time()
+            return True
+        self.entries.delete(key)
+        self.invalidations += 1
+        return False
+
+    def _store(self, key: str, rows: Rows, truncated: bool, tables: List[str], versions: Tuple) -> None:
+        now = time.time()
+        # model_construct: rows come straight from the cursor, skip re-validation
+        self.entries.set(key, CachedResult.model_construct(
+            rows=rows, truncated=truncated, tables=tables, versions=versions, stored_at=now, checked_at=now,
+        ))
+
+    def fetch(
+        self,
+        conn: psycopg.Connection,
+        query: str,
+        max_rows: Optional[int] = None,
+        relations: Optional[List[str]] = None,
+        columnar: bool = False,
+    ) -> Tuple[Rows, bool]:
+        """
+        Runs `query` on `conn` (a dict_row connection), serving it from the
+        cache when the tables it reads have not changed. Returns the rows
+        and whether they were truncated at `max_rows`. Pass `relations` when
+        the caller already has the query's plan, to skip a second EXPLAIN.
+        With `columnar` the rows come back as a ColumnarResult.
+
+        Replica connections bypass the cache: their table counters do not
+        move with replayed writes, so changes could never be detected.
+        """
+        if is_replica_connection(conn):
+            self.replica_bypasses += 1
+            return _fetch_rows(conn, query, max_rows, columnar)
+        fp = fingerprint(query)
+        key = _entry_key(fp, max_rows, columnar)
+        entry = self._lookup(key, fp)
+        if entry is not None:
+            if self._is_fresh(entry):
+                return entry.rows, entry.truncated
+            versions = _table_versions(conn.execute(TABLE_STATS_SQL, (entry.tables,)).fetchall())
+            if self._revalidate(key, entry, versions):
+                return entry.rows, entry.truncated
+
+        if not self.enabled or fp.volatile:
+            return _fetch_rows(conn, query, max_rows, columnar)
+
+        # Snapshot counters before executing so concurrent writes invalidate conservatively
+        tables = relations if relations is not None else relations_from_explain(run_explain(conn, query))
+        versions = _table_versions(conn.execute(TABLE_STATS_SQL, (tables,)).fetchall())
+        rows, truncated = _fetch_rows(conn, query, max_rows, columnar)
+        self._store(key, rows, truncated, tables, versions)
+        return rows, truncated
+
+    async def afetch(
+        self,
+        conn: psycopg.AsyncConnection,
+        query: str,
+        max_rows: Optional[int] = None,
+        relations: Optional[List[str]] = None,
+        columnar: bool = False,
+    ) -> Tuple[Rows, bool]:
+        """Async variant of fetch."""
+        if is_replica_connection(conn):
+            self.replica_bypasses += 1
+            return await _afetch_rows(conn, query, max_rows, columnar)
+        fp = fingerprint(query)
+        key = _entry_key(fp, max_rows, columnar)
+        entry = self._lookup(key, fp)
+        if entry is not None:
+            if self._is_fresh(entry):
+                return entry.rows, entry.truncated
+            cur = await conn.execute(TABLE_STATS_SQL, (entry.tables,))
+            versions = _table_versions(await cur.fetchall())
+            if self._revalidate(key, entry, versions):
+                return entry.rows, entry.truncated
+
+        if not self.enabled or fp.volatile:
+            return await _afetch_rows(conn, query, max_rows, columnar)
+
+        if relations is None:
+            relations = relations_from_explain(await arun_explain(conn, query))
+        cur = await conn.execute(TABLE_STATS_SQL, (relations,))
+        versions = _table_versions(await cur.fetchall())
+        rows, truncated = await _afetch_rows(conn, query, max_rows, columnar)
+        self._store(key, rows, truncated, relations, versions)
+        return rows, truncated
+
+    def invalidate_table(self, table: str) -> int:
+        """Drops every entry that read `table` (schema-qualified)."""
+        removed = self.entries.delete_where(lambda key, entry: table in entry.tables)
+        self.invalidations += removed
+        return removed
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "invalidations": self.invalidations,
+            "replica_bypasses": self.replica_bypasses,
+            **self.entries.stats(),
+        }
+
+result_cache = QueryResultCache()
@@ -0,0 +1,283 @@
+import os
+from datetime import datetime, date, timezone
+from decimal import Decimal
+from typing import List, Dict, Any, Optional, Sequence, Union
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from src.tools.columnar import ColumnarResult
+
+# ───────────────────────────────────────────────────────────────
+# Settings
+# ───────────────────────────────────────────────────────────────
+
+PROFILE_TOP_K = int(os.getenv("PROFILE_TOP_K", "5"))
+PROFILE_MAX_COLUMNS = int(os.getenv("PROFILE_MAX_COLUMNS", "30"))
+PROFILE_MAX_BUCKETS = int(os.getenv("PROFILE_MAX_BUCKETS", "24"))
+PROFILE_SAMPLE_ROWS = int(os.getenv("PROFILE_SAMPLE_ROWS", "3"))
+# Longest text kept for a sample cell or top value; a JSON blob or note column would otherwise dominate the prompt
+PROFILE_MAX_VALUE_CHARS = int(os.getenv("PROFILE_MAX_VALUE_CHARS", "80"))
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# ───────────────────────────────────────────────────────────────
+# Profile schema
+# ───────────────────────────────────────────────────────────────
+
+class ColumnProfile(BaseModel):
+    name: str
+    kind: str = Field(description="numeric, temporal, boolean or categorical")
+    count: int
+    nulls: int
+    distinct: Optional[int] = None
+    min: Optional[Any] = None
+    max: Optional[Any] = None
+    mean: Optional[float] = None
+    std: Optional[float] = None
+    quantiles: Optional[Dict[str, float]] = None
+    top_values: Optional[List[List[Any]]] = None  # [[value, count], ...]
+
+class TrendProfile(BaseModel):
+    time_column: str
+    bucket: str = Field(description="day, week, month or year")
+    measure: Optional[str] = None  # Summed numeric column, or None for row counts
+    points: List[List[Any]]  # [[bucket_start, value], ...]
+
+class ResultProfile(BaseModel):
+    row_count: int
+    truncated: bool = False  # Rows were cut off at the executor's max_rows
+    columns: List[ColumnProfile]
+    omitted_columns: int = 0
+    trend: Optional[TrendProfile] = None
+    sample_rows: List[Dict[str, Any]] = Field(default_factory=list)
+
+    def to_prompt(self) -> str:
+        """Compact text form passed to the analyst instead of raw rows."""
+        lines = [f"Rows: {self.row_count}" + (" (truncated; statistics cover these rows only)" if self.truncated else "")]
+        for col in self.columns:
+            parts = [f"- {col.name} ({col.kind}): {col.count} values, {col.nulls} nulls"]
+            if col.distinct is not None:
+                parts.append(f"{col.distinct} distinct")
+            if col.min is not None:
+                parts.append(f"min {_fmt(col.min)}, max {_fmt(col.max)}")
+            if col.mean is not None:
+                parts.append(f"mean {_fmt(col.mean)}, std {_fmt(col.std)}")
+            if col.quantiles:
+                parts.append("quantiles " + ", ".join(f"{k}={_fmt(v)}" for k, v in col.quantiles.items()))
+            if col.top_values:
+                parts.append("top " + ", ".join(f"{_fmt(v)} ({c})" for v, c in col.top_values))
+            lines.append("; ".join(parts))
+        if self.omitted_columns:
+            lines.append(f"- ... {self.omitted_columns} more columns not profiled")
+        if self.trend is not None:
+            label = f"sum of {self.trend.measure}" if self.trend.measure else "row count"
+            points = ", ".join(f"{start}: {_fmt(value)}" for start, value in self.trend.points)
+            lines.append(f"Trend ({label} per {self.trend.bucket} of {self.trend.time_column}): {points}")
+        if self.sample_rows:
+            lines.append(f"Sample rows: {self.sample_rows}")
+        return "\n".join(lines)
+
+def _clip(value: Any, limit: int = PROFILE_MAX_VALUE_CHARS) -> Any:
+    """Shortens long text (and long non-scalar values, as text) to `limit` characters."""
+    if value is None or isinstance(value, (bool, int, float, Decimal, date)):
+        return value
+    text = value if isinstance(value, str) else str(value)
+    if len(text) <= limit:
+        return value
+    return text[:limit] + "…"
+
+def _fmt(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+# ───────────────────────────────────────────────────────────────
+# Column kind detection
+# ───────────────────────────────────────────────────────────────
+
+def _kind_of(values: Sequence[Any]) -> str:
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            return "boolean"
+        if isinstance(value, (int, float, Decimal)):
+            return "numeric"
+        if isinstance(value, (datetime, date)):
+            return "temporal"
+        return "categorical"
+    return "categorical"
+
+def _to_datetime64(values: Sequence[Any]) -> np.ndarray:
+    """Converts dates/datetimes (naive or aware, as UTC) to datetime64[s], NaT for nulls."""
+    converted = []
+    for value in values:
+        if value is None:
+            converted.append(None)
+        elif isinstance(value, datetime):
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            converted.append(value)
+        else:
+            converted.append(datetime(value.year, value.month, value.day))
+    return np.array(converted, dtype="datetime64[s]")
+
+# ───────────────────────────────────────────────────────────────
+# Vectorized per-column statistics
+# ───────────────────────────────────────────────────────────────
+
+def _numeric_profile(name: str, values: Sequence[Any], top_k: int) -> ColumnProfile:
+    array = np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+    present = array[~np.isnan(array)]
+    profile = ColumnProfile(name=name, kind="numeric", count=int(present.size), nulls=int(array.size - present.size))
+    if present.size:
+        qs = np.quantile(present, QUANTILES)
+        profile.min = float(present.min())
+        profile.max = float(present.max())
+        profile.mean = float(present.mean())
+        profile.std = float(present.std())
+        profile.quantiles = {f"p{int(q * 100)}": float(v) for q, v in zip(QUANTILES, qs)}
+        uniques, counts = np.unique(present, return_counts=True)
+        profile.distinct = int(uniques.size)
+        # Low-cardinality numerics (status codes, ratings) also get their most common values
+        if uniques.size <= top_k * 4:
+            order = np.argsort(-counts)[:top_k]
+            profile.top_values = [[float(uniques[i]), int(counts[i])] for i in order]
+    return profile
+
+def _categorical_profile(name: str, values: Sequence[Any], kind: str, top_k: int) -> ColumnProfile:
+    present = np.array([str(v) for v in values if v is not None], dtype=object)
+    profile = ColumnProfile(name=name, kind=kind, count=int(present.size), nulls=len(values) - int(present.size))
+    if present.size:
+        uniques, counts = np.unique(present, return_counts=True)
+        order = np.argsort(-counts)[:top_k]
+        profile.distinct = int(uniques.size)
+        profile.top_values = [[_clip(uniques[i]), int(counts[i])] for i in order]
+    return profile
+
+def _temporal_profile(name: str, times: np.ndarray) -> ColumnProfile:
+    present = times[~np.isnat(times)]
+    profile = ColumnProfile(name=name, kind="temporal", count=int(present.size), nulls=int(times.size - present.size))
+    if present.size:
+        profile.min = str(present.min())
+        profile.max = str(present.max())
+        profile.distinct = int(np.unique(present).size)
+    return profile
+
+# ───────────────────────────────────────────────────────────────
+# Time-bucketed trend
+# ───────────────────────────────────────────────────────────────
+
+_BUCKETS = (("day", "D"), ("week", "W"), ("month", "M"), ("year", "Y"))
+
+def _bucket(times: np.ndarray, unit: str) -> np.ndarray:
+    if unit != "W":
+        return times.astype(f"datetime64[{unit}]")
+    # datetime64[W] counts weeks from the epoch, a Thursday; start weeks on the ISO Monday instead
+    days = times.astype("datetime64[D]")
+    weekday = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday (weekday 3)
+    return days - weekday.astype("timedelta64[D]")
+
+def _trend(name: str, times: np.ndarray, measure: Optional[str], measure_values: Optional[np.ndarray], max_buckets: int) -> Optional[TrendProfile]:
+    mask = ~np.isnat(times)
+    if measure_values is not None:
+        mask &= ~np.isnan(measure_values)
+    if not mask.any():
+        return None
+
+    # Pick the finest bucket that keeps the series within max_buckets
+    for label, unit in _BUCKETS:
+        buckets = _bucket(times[mask], unit)
+        uniques, inverse = np.unique(buckets, return_inverse=True)
+        if uniques.size <= max_buckets or unit == "Y":
+            break
+
+    if measure_values is not None:
+        totals = np.bincount(inverse, weights=measure_values[mask], minlength=uniques.size)
+        points = [[str(u), float(t)] for u, t in zip(uniques, totals)]
+    else:
+        counts = np.bincount(inverse, minlength=uniques.size)
+        points = [[str(u), int(c)] for u, c in zip(uniques, counts)]
+
+    return TrendProfile(time_column=name, bucket=label, measure=measure, points=points[-max_buckets:])
+
+# ───────────────────────────────────────────────────────────────
+# Entry point
+# ───────────────────────────────────────────────────────────────
+
+def profile_columns(
+    columns: Dict[str, Sequence[Any]],
+    row_count: int,
+    sample_rows: Optional[List[Dict[str, Any]]] = None,
+    truncated: bool = False,
+    top_k: int = PROFILE_TOP_K,
+    max_columns: int = PROFILE_MAX_COLUMNS,
+    max_buckets: int = PROFILE_MAX_BUCKETS,
+) -> ResultProfile:
+    """
+    Profiles a result given column-major data ({name: values}). Each column
+    is converted to one NumPy array and summarized in batch, so cost grows
+    linearly with the data while the profile size stays fixed.
+    """
+    names = list(columns)
+    profiled = names[:max_columns]
+
+    profiles: List[ColumnProfile] = []
+    first_time = None
+    first_measure = None
+    for name in profiled:
+        values = columns[name]
+        kind = _kind_of(values)
+        if kind == "numeric":
+            profile = _numeric_profile(name, values, top_k)
+            if first_measure is None:
+                first_measure = name
+        elif kind == "temporal":
+            times = _to_datetime64(values)
+            profile = _temporal_profile(name, times)
+            if first_time is None:
+                first_time = (name, times)
+        else:
+            profile = _categorical_profile(name, values, kind, top_k)
+        profiles.append(profile)
+
+    trend = None
+    if first_time is not None:
+        measure_values = None
+        if first_measure is not None:
+            measure_values = np.array(
+                [np.nan if v is None else float(v) for v in columns[first_measure]], dtype=np.float64
+            )
+        trend = _trend(first_time[0], first_time[1], first_measure, measure_values, max_buckets)
+
+    return ResultProfile(
+        row_count=row_count,
+        truncated=truncated,
+        columns=profiles,
+        omitted_columns=len(names) - len(profiled),
+        trend=trend,
+        sample_rows=[
+            {column: _clip(value) for column, value in row.items()}
+            for row in (sample_rows or [])[:PROFILE_SAMPLE_ROWS]
+        ],
+    )
+
+def profile_rows(rows: List[Dict[str, Any]], **kwargs) -> ResultProfile:
+    """Profiles row-major results (List[dict]) by transposing them once into columns."""
+    if not rows:
+        return ResultProfile(row_count=0, columns=[])
+    names = list(rows[0].keys())
+    columns = {name: [row.get(name) for row in rows] for name in names}
+    return profile_columns(columns, len(rows), sample_rows=rows, **kwargs)
+
+def profile_result(results: Union[List[Dict[str, Any]], ColumnarResult, Dict[str, Any]], truncated: bool = False, **kwargs) -> ResultProfile:
+    """Profiles executor results in either representation; columnar results are used as-is."""
+    if isinstance(results, dict):  # Columnar JSON form from a restored session
+        results = ColumnarResult.from_json_dict(results)
+    if isinstance(results, ColumnarResult):
+        return profile_columns(
+            results.columns_dict(), len(results),
+            sample_rows=results.to_rows(PROFILE_SAMPLE_ROWS), truncated=truncated, **kwargs,
+        )
+    return profile_rows(results, truncated=truncated, **kwargs)
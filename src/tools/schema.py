@@ -0,0 +1,402 @@
+import os
+import re
+import time
+import asyncio
+import json
+import hashlib
+import threading
+from typing import List, Optional, Dict, Any
+
+import psycopg
+from pydantic import BaseModel, Field
+
+from src.tools.db import get_db_connection, get_async_db_connection
+
+# ───────────────────────────────────────────────────────────────
+# Snapshot models
+# ───────────────────────────────────────────────────────────────
+
+class ColumnInfo(BaseModel):
+    name: str
+    data_type: str
+    nullable: bool = True
+    comment: Optional[str] = None
+
+class ForeignKeyInfo(BaseModel):
+    columns: List[str]
+    ref_table: str
+    ref_columns: List[str]
+
+class TableInfo(BaseModel):
+    name: str  # Schema-qualified when outside the search_path
+    kind: str = Field(description="table, view, materialized view or partitioned table")
+    row_estimate: int = 0
+    comment: Optional[str] = None
+    columns: List[ColumnInfo] = Field(default_factory=list)
+    primary_key: List[str] = Field(default_factory=list)
+    foreign_keys: List[ForeignKeyInfo] = Field(default_factory=list)
+    indexes: List[str] = Field(default_factory=list)
+
+class SchemaSnapshot(BaseModel):
+    version: str = Field(description="Hash of the schema structure (row estimates excluded).")
+    ddl_version: Optional[int] = Field(default=None, description="Event-trigger DDL counter, if installed.")
+    loaded_at: float
+    tables: List[TableInfo]
+    text: str = Field(description="Compact text rendering passed to the LLM prompts.")
+
+    def table(self, name: str) -> Optional[TableInfo]:
+        for table in self.tables:
+            if table.name == name:
+                return table
+        return None
+
+# ───────────────────────────────────────────────────────────────
+# Catalog queries
+# ───────────────────────────────────────────────────────────────
+
+VERSION_TABLE = "agent_schema_version"
+
+_USER_RELATIONS = """
+    n.nspname NOT IN ('pg_catalog', 'information_schema')
+    AND n.nspname NOT LIKE 'pg_toast%'
+    AND n.nspname NOT LIKE 'pg_temp%'
+    AND c.relname <> '{version_table}'
+""".format(version_table=VERSION_TABLE)
+
+TABLES_SQL = f"""
+SELECT c.oid::regclass::text AS table_name,
+       c.relkind::text AS relkind,
+       GREATEST(c.reltuples, 0)::bigint AS row_estimate,
+       obj_description(c.oid, 'pg_class') AS comment
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE c.relkind IN ('r', 'p', 'v', 'm') AND {_USER_RELATIONS}
+ORDER BY 1
+"""
+
+COLUMNS_SQL = f"""
+SELECT c.oid::regclass::text AS table_name,
+       a.attname AS column_name,
+       format_type(a.atttypid, a.atttypmod) AS data_type,
+       NOT a.attnotnull AS nullable,
+       col_description(c.oid, a.attnum) AS comment
+FROM pg_attribute a
+JOIN pg_class c ON c.oid = a.attrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE c.relkind IN ('r', 'p', 'v', 'm') AND a.attnum > 0 AND NOT a.attisdropped
+  AND {_USER_RELATIONS}
+ORDER BY 1, a.attnum
+"""
+
+CONSTRAINTS_SQL = f"""
+SELECT con.conrelid::regclass::text AS table_name,
+       con.contype::text AS contype,
+       CASE WHEN con.contype = 'f' THEN con.confrelid::regclass::text END AS ref_table,
+       ARRAY(
+           SELECT a.attname FROM unnest(con.conkey) WITH ORDINALITY k(attnum, ord)
+           JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+           ORDER BY k.ord
+       ) AS columns,
+       ARRAY(
+           SELECT a.attname FROM unnest(con.confkey) WITH ORDINALITY k(attnum, ord)
+           JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+           ORDER BY k.ord
+       ) AS ref_columns
+FROM pg_constraint con
+JOIN pg_class c ON c.oid = con.conrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE con.contype IN ('p', 'f') AND {_USER_RELATIONS}
+ORDER BY 1, con.conname
+"""
+
+INDEXES_SQL = f"""
+SELECT c.oid::regclass::text AS table_name,
+       i.indexrelid::regclass::text AS index_name,
+       i.indisunique AS is_unique,
+       pg_get_indexdef(i.indexrelid) AS definition
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE NOT i.indisprimary AND {_USER_RELATIONS}
+ORDER BY 1, 2
+"""
+
+DDL_VERSION_SQL = f"SELECT version FROM {VERSION_TABLE}"
+
+INSTALL_DDL_VERSION_TRIGGER_SQL = f"""
+CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+    id boolean PRIMARY KEY DEFAULT true CHECK (id),
+    version bigint NOT NULL DEFAULT 0
+);
+INSERT INTO {VERSION_TABLE} (id, version) VALUES (true, 0) ON CONFLICT DO NOTHING;
+CREATE OR REPLACE FUNCTION {VERSION_TABLE}_bump() RETURNS event_trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE {VERSION_TABLE} SET version = version + 1;
+END
+$$;
+DROP EVENT TRIGGER IF EXISTS {VERSION_TABLE}_on_ddl;
+CREATE EVENT TRIGGER {VERSION_TABLE}_on_ddl ON ddl_command_end
+EXECUTE FUNCTION {VERSION_TABLE}_bump();
+"""
+
+_RELKINDS = {"r": "table", "p": "partitioned table", "v": "view", "m": "materialized view"}
+
+# ───────────────────────────────────────────────────────────────
+# Snapshot building and rendering (pure, no I/O)
+# ───────────────────────────────────────────────────────────────
+
+def _index_summary(row: Dict[str, Any]) -> str:
+    match = re.search(r" USING (.*)$", row["definition"])
+    summary = match.group(1) if match else row["definition"]
+    prefix = "UNIQUE " if row["is_unique"] else ""
+    return f"{row['index_name']} {prefix}{summary}"
+
+def build_snapshot(
+    table_rows: List[Dict[str, Any]],
+    column_rows: List[Dict[str, Any]],
+    constraint_rows: List[Dict[str, Any]],
+    index_rows: List[Dict[str, Any]],
+    ddl_version: Optional[int] = None,
+) -> SchemaSnapshot:
+    """
+    Assembles catalog query rows into a SchemaSnapshot and renders its text form.
+    """
+    tables: Dict[str, TableInfo] = {}
+    for row in table_rows:
+        tables[row["table_name"]] = TableInfo(
+            name=row["table_name"],
+            kind=_RELKINDS.get(row["relkind"], row["relkind"]),
+            row_estimate=row["row_estimate"] or 0,
+            comment=row["comment"],
+        )
+
+    for row in column_rows:
+        table = tables.get(row["table_name"])
+        if table is not None:
+            table.columns.append(ColumnInfo(
+                name=row["column_name"],
+                data_type=row["data_type"],
+                nullable=row["nullable"],
+                comment=row["comment"],
+            ))
+
+    for row in constraint_rows:
+        table = tables.get(row["table_name"])
+        if table is None:
+            continue
+        if row["contype"] == "p":
+            table.primary_key = list(row["columns"])
+        else:
+            table.foreign_keys.append(ForeignKeyInfo(
+                columns=list(row["columns"]),
+                ref_table=row["ref_table"],
+                ref_columns=list(row["ref_columns"]),
+            ))
+
+    for row in index_rows:
+        table = tables.get(row["table_name"])
+        if table is not None:
+            table.indexes.append(_index_summary(row))
+
+    table_list = list(tables.values())
+    text = render_schema(table_list)
+
+    # Row estimates move with ANALYZE, so they are left out of the version
+    structure = json.dumps([t.model_dump(exclude={"row_estimate"}) for t in table_list], sort_keys=True)
+
+    return SchemaSnapshot(
+        version=hashlib.sha256(structure.encode("utf-8")).hexdigest()[:16],
+        ddl_version=ddl_version,
+        loaded_at=time.time(),
+        tables=table_list,
+        text=text,
+    )
+
+def render_table(table: TableInfo) -> str:
+    """
+    Renders one table as a compact block, e.g.
+
+        orders (table, ~12000 rows) -- customer orders
+          id integer PK, customer_id integer NOT NULL FK->customers.id
+          indexes: orders_created_idx btree (created_at)
+    """
+    fk_targets = {}
+    for fk in table.foreign_keys:
+        for column, ref_column in zip(fk.columns, fk.ref_columns):
+            fk_targets[column] = f"{fk.ref_table}.{ref_column}"
+
+    header = f"{table.name} ({table.kind}, ~{table.row_estimate} rows)"
+    if table.comment:
+        header += f" -- {table.comment}"
+
+    columns = []
+    for column in table.columns:
+        parts = [column.name, column.data_type]
+        if column.name in table.primary_key:
+            parts.append("PK")
+        elif not column.nullable:
+            parts.append("NOT NULL")
+        if column.name in fk_targets:
+            parts.append(f"FK->{fk_targets[column.name]}")
+        if column.comment:
+            parts.append(f"/* {column.comment} */")
+        columns.append(" ".join(parts))
+
+    lines = [header, "  " + ", ".join(columns)]
+    if len(table.primary_key) > 1:
+        lines.append(f"  primary key: ({', '.join(table.primary_key)})")
+    if table.indexes:
+        lines.append(f"  indexes: {'; '.join(table.indexes)}")
+    return "\n".join(lines)
+
+def render_schema(tables: List[TableInfo]) -> str:
+    return "\n".join(render_table(table) for table in tables)
+
+# ───────────────────────────────────────────────────────────────
+# Catalog loading
+# ───────────────────────────────────────────────────────────────
+
+def _read_ddl_version(conn: psycopg.Connection) -> Optional[int]:
+    try:
+        with conn.transaction():
+            row = conn.execute(DDL_VERSION_SQL).fetchone()
+        return row["version"] if row else None
+    except psycopg.errors.UndefinedTable:
+        return None
+
+async def _aread_ddl_version(conn: psycopg.AsyncConnection) -> Optional[int]:
+    try:
+        async with conn.transaction():
+            cur = await conn.execute(DDL_VERSION_SQL)
+            row = await cur.fetchone()
+        return row["version"] if row else None
+    except psycopg.errors.UndefinedTable:
+        return None
+
+def load_schema() -> SchemaSnapshot:
+    """
+    Reads the user-visible schema from pg_catalog in four queries.
+    """
+    with get_db_connection() as conn:
+        ddl_version = _read_ddl_version(conn)
+        rows = [conn.execute(sql).fetchall() for sql in (TABLES_SQL, COLUMNS_SQL, CONSTRAINTS_SQL, INDEXES_SQL)]
+    return build_snapshot(*rows, ddl_version=ddl_version)
+
+async def aload_schema() -> SchemaSnapshot:
+    """
+    Async variant of load_schema.
+    """
+    async with get_async_db_connection() as conn:
+        ddl_version = await _aread_ddl_version(conn)
+        rows = []
+        for sql in (TABLES_SQL, COLUMNS_SQL, CONSTRAINTS_SQL, INDEXES_SQL):
+            cur = await conn.execute(sql)
+            rows.append(await cur.fetchall())
+    return build_snapshot(*rows, ddl_version=ddl_version)
+
+def install_ddl_version_trigger() -> None:
+    """
+    Installs an event trigger that bumps a version counter on every DDL
+    command, letting the cache invalidate immediately instead of on TTL.
+    Requires superuser (or event trigger) privileges; run once per database.
+    """
+    with get_db_connection() as conn:
+        conn.execute(INSTALL_DDL_VERSION_TRIGGER_SQL)
+
+# ───────────────────────────────────────────────────────────────
+# In-process cache
+# ───────────────────────────────────────────────────────────────
+
+# Maximum age of a snapshot before it is reloaded from the catalog
+SCHEMA_CACHE_TTL = float(os.getenv("SCHEMA_CACHE_TTL", "300"))
+# How often the DDL counter is polled (only when the event trigger is installed)
+SCHEMA_VERSION_CHECK_INTERVAL = float(os.getenv("SCHEMA_VERSION_CHECK_INTERVAL", "5"))
+
+class SchemaCache:
+    """
+    Holds the current SchemaSnapshot. A snapshot is reused until it is older
+    than `ttl`, or until the DDL counter maintained by the event trigger
+    changes (polled at most every `check_interval` seconds).
+    """
+
+    def __init__(self, ttl: float = SCHEMA_CACHE_TTL, check_interval: float = SCHEMA_VERSION_CHECK_INTERVAL):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._snapshot: Optional[SchemaSnapshot] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._async_lock: Optional[asyncio.Lock] = None  # Created on first use, inside the running loop
+
+    def invalidate(self) -> None:
+        self._snapshot = None
+
+    def _expired(self, snapshot: Optional[SchemaSnapshot], now: float) -> bool:
+        return snapshot is None or now - snapshot.loaded_at >= self.ttl
+
+    def _should_poll(self, snapshot: Optional[SchemaSnapshot], now: float) -> bool:
+        return (
+            snapshot is not None
+            and snapshot.ddl_version is not None
+            and now - self._last_check >= self.check_interval
+        )
+
+    def _outdated(self, snapshot: SchemaSnapshot) -> None:
+        # Only drop the snapshot that was checked; another caller may have reloaded already
+        if self._snapshot is snapshot:
+            self._snapshot = None
+
+    # Every method reads self._snapshot once: invalidate() may run concurrently
+
+    def get(self) -> SchemaSnapshot:
+        now = time.time()
+        snapshot = self._snapshot
+        if self._should_poll(snapshot, now):
+            self._last_check = now
+            with get_db_connection() as conn:
+                if _read_ddl_version(conn) != snapshot.ddl_version:
+                    self._outdated(snapshot)
+                    snapshot = None
+
+        if self._expired(snapshot, now):
+            with self._lock:
+                snapshot = self._snapshot
+                if self._expired(snapshot, time.time()):
+                    snapshot = self._snapshot = load_schema()
+                    self._last_check = time.time()
+        return snapshot
+
+    async def aget(self) -> SchemaSnapshot:
+        now = time.time()
+        snapshot = self._snapshot
+        if self._should_poll(snapshot, now):
+            self._last_check = now
+            async with get_async_db_connection() as conn:
+                if await _aread_ddl_version(conn) != snapshot.ddl_version:
+                    self._outdated(snapshot)
+                    snapshot = None
+
+        if self._expired(snapshot, now):
+            if self._async_lock is None:
+                self._async_lock = asyncio.Lock()
+            # One reload per expiry; the other requests wait for it instead of reloading too
+            async with self._async_lock:
+                snapshot = self._snapshot
+                if self._expired(snapshot, time.time()):
+                    snapshot = self._snapshot = await aload_schema()
+                    self._last_check = time.time()
+        return snapshot
+
+schema_cache = SchemaCache()
+
+def get_schema_snapshot() -> SchemaSnapshot:
+    """Returns the cached schema snapshot, reloading it when stale."""
+    return schema_cache.get()
+
+async def aget_schema_snapshot() -> SchemaSnapshot:
+    """Async variant of get_schema_snapshot."""
+    return await schema_cache.aget()
+
+def invalidate_schema_cache() -> None:
+    """Drops the cached snapshot so the next call reloads the catalog."""
+    schema_cache.invalidate()
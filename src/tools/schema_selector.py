@@ -0,0 +1,210 @@
+import os
+import re
+import math
+import threading
+from collections import Counter
+from typing import List, Dict, Tuple, Optional, Set
+
+from src.tools.schema import SchemaSnapshot, TableInfo, render_table
+
+# ───────────────────────────────────────────────────────────────
+# Settings
+# ───────────────────────────────────────────────────────────────
+
+# Approximate token budget for the schema section of writer/checker prompts
+SCHEMA_CONTEXT_TOKEN_BUDGET = int(os.getenv("SCHEMA_CONTEXT_TOKEN_BUDGET", "2000"))
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Table names count more than column names, which count more than comments
+TABLE_NAME_WEIGHT = 3
+COLUMN_NAME_WEIGHT = 1
+COMMENT_WEIGHT = 1
+
+# Share of a table's score inherited by its foreign-key neighbours
+FK_NEIGHBOUR_DECAY = 0.5
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English/SQL text)."""
+    return len(text) // 4 + 1
+
+# ───────────────────────────────────────────────────────────────
+# Tokenization
+# ───────────────────────────────────────────────────────────────
+
+_SPLIT = re.compile(r"[^A-Za-z0-9]+")
+_CAMEL = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+def _stem(token: str) -> str:
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Splits identifiers and prose into lowercase, lightly stemmed terms:
+    "orderItems", "order_items" and "order items" all become ["order", "item"].
+    """
+    if not text:
+        return []
+    terms = []
+    for part in _SPLIT.split(_CAMEL.sub(" ", text)):
+        if part:
+            terms.append(_stem(part.lower()))
+    return terms
+
+# ───────────────────────────────────────────────────────────────
+# BM25 index over tables
+# ───────────────────────────────────────────────────────────────
+
+def _table_terms(table: TableInfo) -> List[str]:
+    # Drop the schema qualifier so "sales.orders" matches "orders"
+    terms = tokenize(table.name.split(".")[-1]) * TABLE_NAME_WEIGHT
+    terms += tokenize(table.comment) * COMMENT_WEIGHT
+    for column in table.columns:
+        terms += tokenize(column.name) * COLUMN_NAME_WEIGHT
+        terms += tokenize(column.comment) * COMMENT_WEIGHT
+    return terms
+
+class SchemaIndex:
+    """
+    BM25 index with one document per table. Built once per schema version
+    and reused for every request against that version.
+    """
+
+    def __init__(self, snapshot: SchemaSnapshot):
+        self.version = snapshot.version
+        self.tables: Dict[str, TableInfo] = {table.name: table for table in snapshot.tables}
+        self.postings: Dict[str, List[Tuple[str, int]]] = {}
+        self.lengths: Dict[str, int] = {}
+        self.column_terms: Dict[str, Dict[str, Set[str]]] = {}
+        self.neighbours: Dict[str, Set[str]] = {name: set() for name in self.tables}
+        self.rendered: Dict[str, str] = {}
+
+        for name, table in self.tables.items():
+            terms = _table_terms(table)
+            self.lengths[name] = len(terms)
+            for term, tf in Counter(terms).items():
+                self.postings.setdefault(term, []).append((name, tf))
+            self.column_terms[name] = {
+                column.name: set(tokenize(column.name)) | set(tokenize(column.comment))
+                for column in table.columns
+            }
+            self.rendered[name] = render_table(table)
+
+            for fk in table.foreign_keys:
+                if fk.ref_table in self.neighbours:
+                    self.neighbours[name].add(fk.ref_table)
+                    self.neighbours[fk.ref_table].add(name)
+
+        count = len(self.tables) or 1
+        self.avg_length = (sum(self.lengths.values()) / count) or 1.0
+        self.idf = {
+            term: math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def score(self, query_terms: List[str]) -> Dict[str, float]:
+        """Returns the BM25 score of every table with at least one matching term."""
+        scores: Dict[str, float] = {}
+        for term in query_terms:
+            for name, tf in self.postings.get(term, ()):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[name] / self.avg_length)
+                scores[name] = scores.get(name, 0.0) + self.idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def rank(self, query: str) -> List[Tuple[str, float]]:
+        """
+        Ranks tables against the query, then pulls in the FK neighbours of
+        matched tables (with a decayed score) so join paths stay available.
+        """
+        scores = self.score(tokenize(query))
+
+        for name, value in list(scores.items()):
+            for neighbour in self.neighbours[name]:
+                inherited = value * FK_NEIGHBOUR_DECAY
+                if scores.get(neighbour, 0.0) < inherited:
+                    scores[neighbour] = inherited
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def render_pruned(self, name: str, query_terms: Set[str]) -> str:
+        """Renders a table keeping only key columns and columns matching the query."""
+        table = self.tables[name]
+        keys = set(table.primary_key)
+        for fk in table.foreign_keys:
+            keys.update(fk.columns)
+
+        kept = [
+            column for column in table.columns
+            if column.name in keys or self.column_terms[name][column.name] & query_terms
+        ]
+        omitted = len(table.columns) - len(kept)
+        pruned = table.model_copy(update={"columns": kept})
+        text = render_table(pruned)
+        if omitted:
+            text += f"\n  ... {omitted} more columns"
+        return text
+
+# ───────────────────────────────────────────────────────────────
+# Per-version index cache
+# ───────────────────────────────────────────────────────────────
+
+_index: Optional[SchemaIndex] = None
+_index_lock = threading.Lock()
+
+def get_schema_index(snapshot: SchemaSnapshot) -> SchemaIndex:
+    """Returns the BM25 index for this snapshot, rebuilding it when the version changes."""
+    global _index
+    index = _index
+    if index is None or index.version != snapshot.version:
+        with _index_lock:
+            if _index is None or _index.version != snapshot.version:
+                _index = SchemaIndex(snapshot)
+            index = _index
+    return index
+
+# ───────────────────────────────────────────────────────────────
+# Schema context selection
+# ───────────────────────────────────────────────────────────────
+
+def select_schema_context(
+    snapshot: SchemaSnapshot,
+    query: str,
+    token_budget: Optional[int] = None,
+) -> str:
+    """
+    Returns the part of the schema relevant to `query` within `token_budget`.
+    Small schemas are returned whole; otherwise tables are added in BM25
+    rank order, falling back to a pruned rendering (keys + matching columns)
+    when the full table no longer fits.
+    """
+    budget = token_budget or SCHEMA_CONTEXT_TOKEN_BUDGET
+    if estimate_tokens(snapshot.text) <= budget:
+        return snapshot.text
+
+    index = get_schema_index(snapshot)
+    ranked = [name for name, _ in index.rank(query)]
+    if not ranked:
+        # Nothing matched: fall back to the largest tables, which are the likeliest fact tables
+        ranked = [t.name for t in sorted(snapshot.tables, key=lambda t: -t.row_estimate)]
+
+    query_terms = set(tokenize(query))
+    blocks: List[str] = []
+    used = 0
+    for name in ranked:
+        text = index.rendered[name]
+        cost = estimate_tokens(text)
+        if used + cost > budget:
+            text = index.render_pruned(name, query_terms)
+            cost = estimate_tokens(text)
+            if used + cost > budget:
+                continue
+        blocks.append(text)
+        used += cost
+
+    return "\n".join(blocks)
@@ -0,0 +1,162 @@
+import json
+from typing import List, Dict, Any, Optional
+
+import psycopg
+from pydantic import BaseModel, Field
+
+from src.tools.db import get_read_connection, get_async_read_connection
+from src.tools.telemetry import timed
+
+# ───────────────────────────────────────────────────────────────
+# Output schema
+# ───────────────────────────────────────────────────────────────
+
+class PlanCheck(BaseModel):
+    ok: bool = Field(description="PostgreSQL parsed, analyzed and planned the query.")
+    error: Optional[str] = Field(default=None, description="PostgreSQL error message if planning failed.")
+    sqlstate: Optional[str] = Field(default=None, description="SQLSTATE code of the error, e.g. 42P01.")
+    relations: List[str] = Field(default_factory=list, description="Schema-qualified base tables the plan reads.")
+    estimated_rows: Optional[float] = None
+    startup_cost: Optional[float] = None
+    total_cost: Optional[float] = None
+
+    def summary(self) -> str:
+        if not self.ok:
+            return f"PostgreSQL error ({self.sqlstate}): {self.error}"
+        return (
+            f"~{self.estimated_rows:.0f} rows, cost {self.total_cost:.0f}, "
+            f"reads {', '.join(self.relations) or 'no tables'}"
+        )
+
+# ───────────────────────────────────────────────────────────────
+# EXPLAIN plan parsing
+# ───────────────────────────────────────────────────────────────
+
+def _collect_relations(plan: Dict[str, Any], found: set) -> None:
+    if "Relation Name" in plan:
+        found.add(f"{plan.get('Schema', 'public')}.{plan['Relation Name']}")
+    for child in plan.get("Plans", []):
+        _collect_relations(child, found)
+
+def plan_from_explain(explain_rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Returns the top plan node from EXPLAIN (FORMAT JSON) output rows."""
+    plan_json = next(iter(explain_rows[0].values()))
+    if isinstance(plan_json, str):
+        plan_json = json.loads(plan_json)
+    return plan_json[0]["Plan"]
+
+def relations_from_explain(explain_rows: List[Dict[str, Any]]) -> List[str]:
+    """Extracts schema-qualified base tables from EXPLAIN (VERBOSE, FORMAT JSON) output."""
+    found: set = set()
+    _collect_relations(plan_from_explain(explain_rows), found)
+    return sorted(found)
+
+def strip_statement(query: str) -> str:
+    """Removes surrounding whitespace and trailing semicolons so the query can be wrapped."""
+    return query.strip().rstrip(";").rstrip()
+
+def explain_sql(query: str) -> str:
+    # VERBOSE adds the schema of each relation; without ANALYZE nothing is executed
+    return f"EXPLAIN (VERBOSE, FORMAT JSON) {strip_statement(query)}"
+
+# Binary results force the extended query protocol, which executes exactly one statement
+# whatever the text contains (the simple protocol would run "SELECT 1; COMMIT; DROP ...")
+def run_explain(conn: psycopg.Connection, query: str) -> List[Dict[str, Any]]:
+    return conn.execute(explain_sql(query), binary=True).fetchall()
+
+async def arun_explain(conn: psycopg.AsyncConnection, query: str) -> List[Dict[str, Any]]:
+    cur = await conn.execute(explain_sql(query), binary=True)
+    return await cur.fetchall()
+
+NOT_A_SINGLE_READ = "Only a single read-only SELECT statement can be validated or executed."
+
+def _screen(query: str) -> Optional[PlanCheck]:
+    # Imported here: guardrails imports PlanCheck from this module
+    from src.tools.guardrails import is_modifying_query
+
+    if is_modifying_query(query):
+        return PlanCheck(ok=False, error=NOT_A_SINGLE_READ)
+    return None
+
+def _plan_check(explain_rows: List[Dict[str, Any]]) -> PlanCheck:
+    plan = plan_from_explain(explain_rows)
+    return PlanCheck(
+        ok=True,
+        relations=relations_from_explain(explain_rows),
+        estimated_rows=plan.get("Plan Rows"),
+        startup_cost=plan.get("Startup Cost"),
+        total_cost=plan.get("Total Cost"),
+    )
+
+def _failed_check(error: psycopg.Error) -> PlanCheck:
+    diag = error.diag
+    message = diag.message_primary or str(error)
+    if diag.message_hint:
+        message += f" (hint: {diag.message_hint})"
+    return PlanCheck(ok=False, error=message, sqlstate=error.sqlstate)
+
+# ───────────────────────────────────────────────────────────────
+# Database-backed validation
+# ───────────────────────────────────────────────────────────────
+
+def explain_on(conn: psycopg.Connection, query: str) -> PlanCheck:
+    """
+    Plans the query on an already checked-out connection, inside the
+    caller's transaction. A failed check leaves that transaction aborted.
+    Multi-statement or modifying SQL is rejected without being sent.
+    """
+    rejected = _screen(query)
+    if rejected is not None:
+        return rejected
+    try:
+        with timed("db", operation="explain"):
+            rows = run_explain(conn, query)
+    except psycopg.OperationalError:
+        raise  # Connection problems are not the query's fault
+    except psycopg.DatabaseError as e:
+        return _failed_check(e)
+    return _plan_check(rows)
+
+async def aexplain_on(conn: psycopg.AsyncConnection, query: str) -> PlanCheck:
+    """
+    Async variant of explain_on.
+    """
+    rejected = _screen(query)
+    if rejected is not None:
+        return rejected
+    try:
+        with timed("db", operation="explain"):
+            rows = await arun_explain(conn, query)
+    except psycopg.OperationalError:
+        raise
+    except psycopg.DatabaseError as e:
+        return _failed_check(e)
+    return _plan_check(rows)
+
+def explain_query(query: str) -> PlanCheck:
+    """
+    Asks PostgreSQL to parse, analyze and plan the query without running it.
+    Syntax errors, unknown tables/columns, type mismatches and ambiguous
+    references surface here in about a millisecond. Runs in a read-only
+    transaction that is always rolled back. Screened before a connection is
+    even checked out.
+    """
+    rejected = _screen(query)
+    if rejected is not None:
+        return rejected
+    with get_read_connection() as conn:
+        with conn.transaction(force_rollback=True):
+            conn.execute("SET TRANSACTION READ ONLY")
+            return explain_on(conn, query)
+
+async def aexplain_query(query: str) -> PlanCheck:
+    """
+    Async variant of explain_query.
+    """
+    rejected = _screen(query)
+    if rejected is not None:
+        return rejected
+    async with get_async_read_connection() as conn:
+        async with conn.transaction(force_rollback=True):
+            await conn.execute("SET TRANSACTION READ ONLY")
+            return await aexplain_on(conn, query)
@@ -0,0 +1,304 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+from uuid import uuid4
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, Tuple, List, Callable, Iterator
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# ───────────────────────────────────────────────────────────────
+# Settings
+# ───────────────────────────────────────────────────────────────
+
+# Fraction of requests whose events are logged; warnings and errors are always logged
+TELEMETRY_LOG_SAMPLE_RATE = float(os.getenv("TELEMETRY_LOG_SAMPLE_RATE", "0.1"))
+TELEMETRY_LOG_LEVEL = os.getenv("TELEMETRY_LOG_LEVEL", "INFO").upper()
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+HOPS_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+
+# ───────────────────────────────────────────────────────────────
+# Metrics registry (Prometheus text exposition)
+# ───────────────────────────────────────────────────────────────
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.series: Dict[Labels, List[float]] = {}  # labels -> bucket counts + [sum, count]
+
+    def observe(self, value: float, labels: Labels) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0.0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.series.items()):
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', repr(float(bound))))} {count:.0f}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', '+Inf'))} {series[-1]:.0f}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {series[-1]:.0f}")
+        return lines
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.series: Dict[Labels, float] = {}
+
+    def inc(self, value: float, labels: Labels) -> None:
+        self.series[labels] = self.series.get(labels, 0.0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+# A collector returns (name, help, type, labels, value) samples read at scrape time
+Sample = Tuple[str, str, str, Dict[str, Any], float]
+
+class MetricsRegistry:
+    """
+    In-process histograms and counters, plus collectors that report
+    existing stats (cache hit rates, pool usage) when /metrics is scraped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Callable[[], List[Sample]]] = []
+
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = SECONDS_BUCKETS) -> None:
+        self._metrics.setdefault(name, Histogram(name, help, buckets))
+
+    def counter(self, name: str, help: str) -> None:
+        self._metrics.setdefault(name, Counter(name, help))
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._metrics[name].observe(value, _labels(labels))
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        with self._lock:
+            self._metrics[name].inc(value, _labels(labels))
+
+    def totals(self, name: str) -> Dict[Labels, Tuple[float, float]]:
+        """(sum, count) per label set of a histogram, or (value, 1) for a counter."""
+        with self._lock:
+            metric = self._metrics[name]
+            if isinstance(metric, Histogram):
+                return {labels: (series[-2], series[-1]) for labels, series in metric.series.items()}
+            return {labels: (value, 1.0) for labels, value in metric.series.items()}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._metrics
+
+    def register_collector(self, collector: Callable[[], List[Sample]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            lines = [line for metric in self._metrics.values() for line in metric.render()]
+
+        declared = set()
+        for collector in self._collectors:
+            for name, help, kind, labels, value in collector():
+                if name not in declared:
+                    lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                    declared.add(name)
+                lines.append(f"{name}{_format_labels(_labels(labels))} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+metrics.histogram("agent_request_seconds", "Wall time of one /chat turn or graph invocation.")
+metrics.histogram("agent_graph_hops", "Graph nodes executed per request.", HOPS_BUCKETS)
+metrics.histogram("agent_node_seconds", "Wall time per graph node.")
+metrics.histogram("agent_llm_seconds", "LLM call latency per agent.")
+metrics.counter("agent_llm_tokens_total", "LLM tokens per agent and kind (prompt/completion).")
+metrics.histogram("agent_db_seconds", "Database time per operation (connect, explain, fetch, export).")
+metrics.histogram("agent_db_rows", "Rows returned per database operation.", ROWS_BUCKETS)
+
+# ───────────────────────────────────────────────────────────────
+# Structured, sampled logging
+# ───────────────────────────────────────────────────────────────
+
+logger = logging.getLogger("agent_workflow")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(TELEMETRY_LOG_LEVEL)
+    logger.propagate = False
+
+class Trace:
+    """Per-request context: id, sampling decision and graph hop count."""
+
+    __slots__ = ("trace_id", "sampled", "hops", "started")
+
+    def __init__(self, sampled: bool):
+        self.trace_id = uuid4().hex[:16]
+        self.sampled = sampled
+        self.hops = 0
+        self.started = time.perf_counter()
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("agent_trace", default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+def log_event(event: str, level: int = logging.INFO, **fields) -> None:
+    """
+    Emits one JSON log line. Events of sampled requests are logged in full;
+    warnings and errors are logged regardless of sampling.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    trace = current_trace()
+    sampled = trace.sampled if trace is not None else random.random() < TELEMETRY_LOG_SAMPLE_RATE
+    if level < logging.WARNING and not sampled:
+        return
+    record = {"ts": round(time.time(), 3), "event": event, "level": logging.getLevelName(level)}
+    if trace is not None:
+        record["trace_id"] = trace.trace_id
+    record.update(fields)
+    logger.log(level, json.dumps(record, default=str))
+
+@contextmanager
+def trace_request(**fields) -> Iterator[Trace]:
+    """
+    Opens a request trace for the current context. On exit records the
+    request's wall time and hop count and logs a summary event.
+    """
+    trace = Trace(sampled=random.random() < TELEMETRY_LOG_SAMPLE_RATE)
+    token = _current_trace.set(trace)
+    error = None
+    try:
+        yield trace
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        seconds = time.perf_counter() - trace.started
+        mode = fields.get("mode", "default")
+        metrics.observe("agent_request_seconds", seconds, mode=mode)
+        metrics.observe("agent_graph_hops", trace.hops, mode=mode)
+        log_event(
+            "request", logging.ERROR if error else logging.INFO,
+            seconds=round(seconds, 4), hops=trace.hops, error=str(error) if error else None, **fields,
+        )
+        _current_trace.reset(token)
+
+def record_hop() -> None:
+    trace = current_trace()
+    if trace is not None:
+        trace.hops += 1
+
+# ───────────────────────────────────────────────────────────────
+# Timing spans
+# ───────────────────────────────────────────────────────────────
+
+def observe(kind: str, seconds: float, rows: Optional[int] = None, **labels) -> None:
+    """Records a finished span into agent_<kind>_seconds (and agent_<kind>_rows)."""
+    metrics.observe(f"agent_{kind}_seconds", seconds, **labels)
+    if rows is not None and f"agent_{kind}_rows" in metrics:
+        metrics.observe(f"agent_{kind}_rows", rows, **labels)
+
+@contextmanager
+def timed(kind: str, **labels) -> Iterator[Dict[str, Any]]:
+    """
+    Times the block into agent_<kind>_seconds{labels}. The yielded dict
+    collects extra fields for the log event; a "rows" entry is also
+    recorded in agent_<kind>_rows when that histogram exists.
+    """
+    span: Dict[str, Any] = {}
+    started = time.perf_counter()
+    error = None
+    try:
+        yield span
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        observe(kind, seconds, span.get("rows"), **labels)
+        log_event(
+            kind, logging.WARNING if error else logging.DEBUG if kind == "db" else logging.INFO,
+            seconds=round(seconds, 4), error=str(error) if error else None, **labels, **span,
+        )
+
+# ───────────────────────────────────────────────────────────────
+# LLM latency and token usage
+# ───────────────────────────────────────────────────────────────
+
+def _token_usage(response) -> Tuple[int, int]:
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            if metadata:
+                return metadata.get("input_tokens", 0), metadata.get("output_tokens", 0)
+    return 0, 0
+
+class LLMTelemetry(BaseCallbackHandler):
+    """
+    Callback handler attached to an agent's chat model: records call latency
+    and prompt/completion tokens under the agent's name.
+    """
+
+    run_inline = True  # Keep the request's trace context under ainvoke
+
+    def __init__(self, agent: str):
+        self.agent = agent
+        self._started: Dict[Any, float] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        started = self._started.pop(run_id, None)
+        seconds = time.perf_counter() - started if started is not None else 0.0
+        prompt_tokens, completion_tokens = _token_usage(response)
+        metrics.observe("agent_llm_seconds", seconds, agent=self.agent)
+        metrics.inc("agent_llm_tokens_total", prompt_tokens, agent=self.agent, kind="prompt")
+        metrics.inc("agent_llm_tokens_total", completion_tokens, agent=self.agent, kind="completion")
+        log_event(
+            "llm", agent=self.agent, seconds=round(seconds, 4),
+            prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        started = self._started.pop(run_id, None)
+        seconds = time.perf_counter() - started if started is not None else 0.0
+        metrics.observe("agent_llm_seconds", seconds, agent=self.agent)
+        log_event("llm", logging.WARNING, agent=self.agent, seconds=round(seconds, 4), error=str(error))
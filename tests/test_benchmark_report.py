@@ -0,0 +1,34 @@
+from src.benchmarks.report import compare, percentile
+
+def report(p50=100.0, p95=200.0, p99=300.0, throughput=10.0, rss=500.0):
+    return {
+        "latency_ms": {"p50": p50, "p95": p95, "p99": p99},
+        "throughput_rps": throughput,
+        "peak_rss_mb": rss,
+    }
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 95) == 95.0
+    assert percentile(values, 100) == 100.0
+    assert percentile(values, 0) == 1.0
+    assert percentile([3.0], 99) == 3.0
+
+def test_percentile_of_nothing():
+    assert percentile([], 50) is None
+
+def test_compare_within_tolerance():
+    assert compare(report(p95=209.0, throughput=9.1, rss=540.0), report(), tolerance=0.1) == []
+
+def test_compare_lists_each_regression():
+    regressions = compare(report(p99=400.0, throughput=5.0, rss=800.0), report(), tolerance=0.1)
+    assert regressions == [
+        "latency p99: 300.0ms -> 400.0ms",
+        "throughput: 10.00 -> 5.00 req/s",
+        "peak RSS: 500.0MB -> 800.0MB",
+    ]
+
+def test_compare_skips_metrics_missing_from_the_baseline():
+    baseline = {"latency_ms": {"p50": None}, "throughput_rps": None}
+    assert compare(report(), baseline, tolerance=0.1) == []
@@ -0,0 +1,67 @@
+import pytest
+
+from src.tools.guardrails import is_modifying_query
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM orders",
+    "select id, created_at from orders where status = 'delete me';",
+    "SELECT copy, lock, created FROM audit",
+    "WITH recent AS (SELECT * FROM orders) SELECT count(*) FROM recent",
+    "SELECT 'a;b' AS x",
+    "SELECT $$; DROP TABLE orders; $$",
+    'SELECT "update" FROM t',
+    "SELECT 1 -- ; DROP TABLE orders",
+    "SELECT /* ; DELETE FROM t */ 1",
+    "(SELECT 1)",
+    "SELECT date '2024-01-01'",
+])
+def test_read_only_queries_pass(query):
+    assert not is_modifying_query(query)
+
+@pytest.mark.parametrize("query", [
+    "DELETE FROM orders",
+    "  update orders set total = 0",
+    "DROP TABLE orders",
+    "SET statement_timeout = 0",
+    "COPY orders TO PROGRAM 'id'",
+    "CALL refresh_everything()",
+    "(INSERT INTO t VALUES (1))",
+])
+def test_modifying_statements_are_rejected(query):
+    assert is_modifying_query(query)
+
+@pytest.mark.parametrize("query", [
+    "SELECT 1; SELECT 2",
+    "SELECT 1; COMMIT; DROP TABLE orders",
+    "SELECT E'\\''; DROP TABLE orders; --'",
+    "SELECT 'a\\'; DROP TABLE orders; --'",
+])
+def test_multiple_statements_are_rejected(query):
+    assert is_modifying_query(query)
+
+@pytest.mark.parametrize("query", [
+    "COMMIT",
+    "end",
+    "BEGIN",
+    "START TRANSACTION READ WRITE",
+    "ROLLBACK",
+    "ABORT",
+    "SAVEPOINT s",
+    "RELEASE SAVEPOINT s",
+    "PREPARE p AS DELETE FROM orders",
+    "EXECUTE p",
+    "DEALLOCATE ALL",
+    "LISTEN chan",
+    "NOTIFY chan",
+])
+def test_transaction_and_session_control_is_rejected(query):
+    assert is_modifying_query(query)
+
+@pytest.mark.parametrize("query", [
+    "WITH gone AS (DELETE FROM orders RETURNING *) SELECT * FROM gone",
+    "with x as (insert into t values (1) returning id) select id from x",
+    "WITH x AS (UPDATE t SET a = 1 RETURNING a) SELECT a FROM x",
+    "WITH x AS (MERGE INTO t USING s ON t.id = s.id WHEN MATCHED THEN DELETE) SELECT 1",
+])
+def test_writes_inside_with_are_rejected(query):
+    assert is_modifying_query(query)
@@ -0,0 +1,57 @@
+from src.tools.history import STEPS_PREFIX, compact_history, prompt_history
+
+def turn(i, size=40):
+    return [
+        {"role": "user", "content": f"question {i} " + "x" * size},
+        {"role": "assistant", "content": "Decision: postgresql_writer"},
+        {"role": "assistant", "content": f"answer {i} " + "y" * size},
+    ]
+
+def test_history_within_budget_is_unchanged():
+    history = turn(1)
+    compacted = compact_history(history, summary="earlier", offset=4, budget=1000)
+    assert compacted.messages == history
+    assert compacted.summary == "earlier"
+    assert compacted.offset == 4
+
+def test_older_turns_are_folded_into_the_summary():
+    history = turn(1) + turn(2) + turn(3)
+    compacted = compact_history(history, budget=60)
+    assert compacted.offset == len(history) - len(compacted.messages)
+    assert compacted.messages == history[compacted.offset:]
+    assert "question 1" in compacted.summary
+    assert "Decision:" not in compacted.summary
+
+def test_current_turn_is_never_folded():
+    history = turn(1) + turn(2, size=4000)
+    compacted = compact_history(history, budget=10)
+    assert compacted.messages == history[3:]
+    assert compacted.offset == 3
+
+def test_compaction_is_incremental():
+    history = turn(1) + turn(2) + turn(3)
+    first = compact_history(history, budget=60)
+    again = compact_history(first.messages, first.summary, first.offset, budget=60)
+    assert again == first
+
+def test_prompt_history_replaces_decisions_with_one_progress_note():
+    history = turn(1) + [
+        {"role": "user", "content": "question 2"},
+        {"role": "assistant", "content": "Decision: postgresql_writer"},
+        {"role": "assistant", "content": "Decision: postgresql_checker"},
+    ]
+    messages = prompt_history(history, summary="- user: question 0")
+    assert messages[0]["role"] == "system" and "question 0" in messages[0]["content"]
+    contents = [m["content"] for m in messages]
+    assert not any(c.startswith("Decision:") for c in contents)
+    assert contents.count("question 2") == 1
+    assert contents[-1] == STEPS_PREFIX + "postgresql_writer, postgresql_checker"
+
+def test_prompt_history_collapses_repeated_user_entries():
+    # Sessions saved before the user input was recorded once per turn repeat it on every hop
+    history = [{"role": "user", "content": "question"}] * 3 + [{"role": "assistant", "content": "answer"}]
+    assert prompt_history(history) == history[2:]
+
+def test_prompt_history_without_pending_steps():
+    history = turn(1)[:1] + turn(1)[2:]
+    assert prompt_history(history) == history
@@ -0,0 +1,43 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from src.tools.pagination import choose_sort_key, decode_cursor, encode_cursor
+
+QUERY = "SELECT id, created_at, total FROM orders"
+SORT_KEY = ["created_at", "id"]
+
+def test_cursor_round_trip():
+    row = {"id": 7, "created_at": datetime(2024, 3, 1, 12, 30), "total": Decimal("9.50")}
+    cursor = encode_cursor(QUERY, SORT_KEY, row)
+    assert decode_cursor(cursor, QUERY, SORT_KEY) == ["2024-03-01 12:30:00", "7"]
+
+def test_cursor_keeps_null_keys():
+    cursor = encode_cursor(QUERY, SORT_KEY, {"id": 7, "created_at": None})
+    assert decode_cursor(cursor, QUERY, SORT_KEY) == [None, "7"]
+
+def test_cursor_ignores_trailing_semicolon():
+    cursor = encode_cursor(QUERY, SORT_KEY, {"id": 1, "created_at": None})
+    assert decode_cursor(cursor, QUERY + " ;\n", SORT_KEY) == [None, "1"]
+
+def test_cursor_from_another_query_is_rejected():
+    cursor = encode_cursor(QUERY, SORT_KEY, {"id": 1, "created_at": None})
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "SELECT id, created_at FROM refunds", SORT_KEY)
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, QUERY, ["id"])
+
+@pytest.mark.parametrize("cursor", ["not a cursor", "", "e30="])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, QUERY, SORT_KEY)
+
+def test_sort_key_prefers_returned_primary_key():
+    columns = [("id", 23), ("name", 25), ("payload", 3802)]
+    assert choose_sort_key(columns, ["id"]) == ["id"]
+    assert choose_sort_key(columns) == ["id", "name"]
+
+def test_sort_key_requires_a_sortable_column():
+    with pytest.raises(ValueError):
+        choose_sort_key([("payload", 3802), ("x", 23), ("x", 23)])
@@ -0,0 +1,20 @@
+from src.tools.result_cache import fingerprint
+
+def test_formatting_and_comments_share_a_key():
+    a = fingerprint("SELECT id, total FROM orders WHERE status = 'paid';")
+    b = fingerprint("select id,\n  total -- amount\nfrom ORDERS /* all */ where status = 'paid'")
+    assert a.key == b.key
+    assert a.template == "select id , total from orders where status = ?"
+    assert a.literals == ["'paid'"]
+
+def test_literal_values_stay_in_the_key():
+    assert fingerprint("SELECT * FROM t WHERE id = 1").key != fingerprint("SELECT * FROM t WHERE id = 2").key
+    assert fingerprint("SELECT 'A'").key != fingerprint("SELECT 'a'").key
+
+def test_quoted_identifiers_keep_their_case():
+    assert fingerprint('SELECT "Total" FROM t').key != fingerprint('SELECT "total" FROM t').key
+
+def test_volatile_functions_are_flagged():
+    assert fingerprint("SELECT * FROM events WHERE at > now() - interval '1 day'").volatile
+    assert fingerprint("SELECT random()").volatile
+    assert not fingerprint("SELECT count(*) FROM events").volatile
@@ -0,0 +1,33 @@
+import json
+
+from src.api.streaming import JsonFieldStream
+
+def feed_all(stream, chunks):
+    return "".join(stream.feed(chunk) for chunk in chunks)
+
+def test_extracts_field_across_chunks():
+    stream = JsonFieldStream("insights")
+    text = feed_all(stream, ['{"key_findings": ["a"], "ins', 'ights": "Sales gr', 'ew 12%', '", "next": "x"}'])
+    assert text == "Sales grew 12%"
+    assert stream.done
+
+def test_ignores_other_fields_until_the_key_appears():
+    stream = JsonFieldStream("sql_query")
+    assert stream.feed('{"explanation": "counts rows", ') == ""
+    assert stream.feed('"sql_query": "SELECT 1"}') == "SELECT 1"
+
+def test_holds_back_escapes_split_across_chunks():
+    stream = JsonFieldStream("sql_query")
+    value = 'SELECT "id"\nFROM t WHERE note = \'é\' -- \U0001F600'
+    encoded = json.dumps({"sql_query": value})
+    assert feed_all(stream, list(encoded)) == value
+
+def test_stops_after_the_closing_quote():
+    stream = JsonFieldStream("insights")
+    assert stream.feed('{"insights": "done"') == "done"
+    assert stream.feed(', "insights": "again"}') == ""
+
+def test_invalid_escape_ends_the_stream():
+    stream = JsonFieldStream("insights")
+    assert stream.feed('{"insights": "ok \\x') == "ok "
+    assert stream.done